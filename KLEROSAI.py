@@ -23,6 +23,7 @@ tcs.set_subscribed_user_ids(chat_ids)
 
 arbisense = SingletonArbiSense.getInstance()
 arbisense.set_telegram_connection_service(tcs)
+arbisense.enable_metrics_endpoint()
 arbisense.start()
 
 ns = NewScout(ts, tcs)
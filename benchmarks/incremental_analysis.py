@@ -0,0 +1,67 @@
+import argparse
+import itertools
+import random
+import statistics
+import time
+import numpy as np
+from benchmarks.spread_engine import build_market, VOLUME_THRESHOLD, ARBITRAGE_PERCENTAGE_THRESHOLD, ABSURD_PERCENTAGE_THRESHOLD
+from src.logic.SpreadEngine import SpreadEngine
+from src.services.PriceMatrixService import PriceMatrix
+
+# Per-cycle CPU of the spread calculation when every symbol is recomputed against recomputing only the
+# symbols the PriceMatrix marked dirty, for cycles where a growing share of the tickers changed.
+#
+# python -m benchmarks.incremental_analysis
+
+SCENARIOS = [(5, 2000), (12, 10000)]
+CHANGED_SHARES = [0.0, 0.01, 0.1, 0.5]
+
+def publish_cycle(price_matrix: PriceMatrix, random_generator, changed_share: float):
+    # Every exchange republishes its full ticker list, changed_share of the quotes moved since the last cycle
+    prices, quote_volumes, timestamps = price_matrix.get_view()
+    for column, exchange in enumerate(price_matrix.get_exchanges()):
+        symbol_ids = np.flatnonzero(~np.isnan(prices[:, column]))
+        cycle_prices = prices[symbol_ids, column].copy()
+        cycle_quote_volumes = quote_volumes[symbol_ids, column].copy()
+        changed = np.array([random_generator.random() < changed_share for _ in range(len(symbol_ids))], dtype=bool)
+        cycle_prices[changed] *= 1.0005
+        price_matrix.update_columns(exchange, symbol_ids, cycle_prices, cycle_quote_volumes, timestamps[symbol_ids, column])
+    return
+
+def calculate(spread_engine: SpreadEngine, price_matrix: PriceMatrix, market_pair_indices: list, symbol_ids):
+    prices, quote_volumes, timestamps = price_matrix.get_view()
+    return spread_engine.calculate(prices, quote_volumes, market_pair_indices, VOLUME_THRESHOLD, ARBITRAGE_PERCENTAGE_THRESHOLD, ABSURD_PERCENTAGE_THRESHOLD, symbol_ids)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full against dirty symbol spread recomputation CPU")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random_generator = random.Random(args.seed)
+    for exchange_count, symbol_count in SCENARIOS:
+        exchanges, market_data = build_market(exchange_count, symbol_count, random_generator)
+        market_pairs = list(itertools.combinations(exchanges, 2))
+        market_pair_indices = list(range(len(market_pairs)))
+        price_matrix = PriceMatrix(exchanges, symbol_count)
+        for exchange, usdt_pairs in market_data.items():
+            price_matrix.update(exchange, usdt_pairs)
+        price_matrix.take_dirty_symbol_ids()
+        spread_engine = SpreadEngine(exchanges, market_pairs)
+
+        print(f"{exchange_count:>2} exchanges x {symbol_count:>5} symbols")
+        for changed_share in CHANGED_SHARES:
+            full_times = []
+            incremental_times = []
+            dirty_counts = []
+            for _ in range(args.cycles):
+                publish_cycle(price_matrix, random_generator, changed_share)
+                start_time = time.process_time()
+                calculate(spread_engine, price_matrix, market_pair_indices, None)
+                full_times.append((time.process_time() - start_time) * 1000)
+                start_time = time.process_time()
+                dirty_symbol_ids = price_matrix.take_dirty_symbol_ids()
+                calculate(spread_engine, price_matrix, market_pair_indices, dirty_symbol_ids)
+                incremental_times.append((time.process_time() - start_time) * 1000)
+                dirty_counts.append(len(dirty_symbol_ids))
+            print(f"    {changed_share * 100:5.1f}% changed, {statistics.median(dirty_counts):>6.0f} dirty symbols: full {statistics.median(full_times):8.2f} ms  incremental {statistics.median(incremental_times):8.2f} ms")
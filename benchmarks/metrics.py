@@ -0,0 +1,70 @@
+import argparse
+import statistics
+import threading
+import time
+from src.utils.metrics import MetricsRegistry
+
+# Per call cost of recording into the metrics registry on the hot paths, a histogram observation on its own,
+# one timed with the two perf_counter() calls the services wrap around their work, a counter increment, a labels()
+# lookup and an observation with other threads recording into the same series. Recording must stay under a
+# microsecond.
+#
+# python -m benchmarks.metrics
+# python -m benchmarks.metrics --calls 2000000 --threads 8
+
+HOT_PATH_BUDGET_IN_NS = 1000
+
+def measure_in_ns(function, calls: int, runs: int):
+    run_times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        for _ in range(calls):
+            function()
+        run_times.append((time.perf_counter() - start_time) / calls * 1e9)
+    return statistics.median(run_times)
+
+def measure_contended_in_ns(histogram, calls: int, thread_count: int):
+    # Wall time per observation while thread_count threads observe at once, the GIL serializes them anyway
+    def observe_values():
+        for _ in range(calls):
+            histogram.observe(0.003)
+        return
+
+    threads = [threading.Thread(target=observe_values) for _ in range(thread_count)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - start_time) / (calls * thread_count) * 1e9
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metrics registry recording cost")
+    parser.add_argument("--calls", type=int, default=500000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    histogram_family = registry.histogram("benchmark_duration_seconds", "Benchmark durations", MetricsRegistry.LATENCY_BUCKETS, ("exchange",))
+    histogram = histogram_family.labels("BINANCE")
+    counter = registry.counter("benchmark_total", "Benchmark count").labels()
+
+    def timed_observe():
+        start_time = time.perf_counter()
+        histogram.observe(time.perf_counter() - start_time)
+        return
+
+    baseline = measure_in_ns(lambda: None, args.calls, args.runs)
+    results = {
+        "histogram.observe": measure_in_ns(lambda: histogram.observe(0.003), args.calls, args.runs) - baseline,
+        "timed histogram.observe": measure_in_ns(timed_observe, args.calls, args.runs) - baseline,
+        "counter.inc": measure_in_ns(lambda: counter.inc(), args.calls, args.runs) - baseline,
+        "labels + observe": measure_in_ns(lambda: histogram_family.labels("BINANCE").observe(0.003), args.calls, args.runs) - baseline,
+        f"observe, {args.threads} threads": measure_contended_in_ns(histogram, args.calls, args.threads)
+    }
+    for name, cost_in_ns in results.items():
+        print(f"{name:<28} {cost_in_ns:8.0f} ns  {'ok' if cost_in_ns < HOT_PATH_BUDGET_IN_NS else 'over budget'}")
+    render_start_time = time.perf_counter()
+    exposition = registry.render()
+    print(f"render                       {(time.perf_counter() - render_start_time) * 1e6:8.0f} us  {len(exposition)} bytes")
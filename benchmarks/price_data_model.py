@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from src.models.PriceDataModel import PriceDataModel
+
+# Memory and instantiation cost of the slotted PriceDataModel against the previous __dict__ based model,
+# and the import time of the model module now that pandas is only loaded by pretty_timestamp().
+#
+# python -m benchmarks.price_data_model
+# python -m benchmarks.price_data_model --records 100000 --import-runs 10
+
+# The model as it was before, kept here for the comparison
+class PreviousPriceDataModel:
+
+    def __init__(self,
+                    symbol: str,
+                    price: float,
+                    exchange: str,
+                    timestamp: str,
+                    volume: float = None):
+        self.symbol = symbol
+        self.price = float(price)
+        self.exchange = exchange
+        self.timestamp = timestamp
+        self.volume = float(volume)
+        return
+
+    def pretty_timestamp(self):
+        return pd.to_datetime(int(self.timestamp), unit='ms')
+
+# Symbols are shared between records like the services' interned symbols, so the measured memory is the records' own
+SYMBOLS = ["SYMBOL" + str(index) + "USDT" for index in range(5000)]
+
+def build_records(model_class, count: int):
+    timestamp = int(time.time() * 1000)
+    return [model_class(SYMBOLS[index % len(SYMBOLS)], 1.5 + index, "BINANCE", timestamp, 1000.0 + index) for index in range(count)]
+
+def measure_memory_in_bytes(model_class, count: int):
+    tracemalloc.start()
+    records = build_records(model_class, count)
+    current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current_bytes
+
+def measure_instantiation_in_ms(model_class, count: int, runs: int):
+    run_times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        build_records(model_class, count)
+        run_times.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(run_times)
+
+def measure_import_in_ms(statement: str, runs: int):
+    # A fresh interpreter per run, so nothing is already in sys.modules
+    run_times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", "import time; start_time = time.perf_counter(); " + statement + "; print((time.perf_counter() - start_time) * 1000)"],
+                                capture_output=True, text=True, check=True).stdout
+        run_times.append(float(output))
+    return statistics.median(run_times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PriceDataModel memory, instantiation and import time")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for label, model_class in (("previous", PreviousPriceDataModel), ("slotted", PriceDataModel)):
+        memory_in_bytes = measure_memory_in_bytes(model_class, args.records)
+        instantiation_in_ms = measure_instantiation_in_ms(model_class, args.records, args.runs)
+        print(f"{label:<9} {memory_in_bytes / args.records:7.1f} bytes per record  {instantiation_in_ms:8.2f} ms per {args.records} records")
+
+    model_import_in_ms = measure_import_in_ms("import src.models.PriceDataModel", args.import_runs)
+    pandas_import_in_ms = measure_import_in_ms("import pandas", args.import_runs)
+    print(f"import src.models.PriceDataModel {model_import_in_ms:8.2f} ms")
+    print(f"import pandas (previous cost of the model import) {pandas_import_in_ms:8.2f} ms")
@@ -0,0 +1,100 @@
+import argparse
+import itertools
+import random
+import statistics
+import time
+from src.logic.SpreadEngine import SpreadEngine
+from src.models.PriceDataModel import PriceDataModel
+from src.services.PriceMatrixService import PriceMatrix
+
+# Per-cycle CPU of the cross exchange spread calculation over every market pair, comparing the previous
+# per symbol loop over the exchanges' PriceDataModel dicts with the batched SpreadEngine pass over the
+# PriceMatrix arrays. Both must find exactly the same opportunities.
+#
+# python -m benchmarks.spread_engine
+# python -m benchmarks.spread_engine --cycles 50
+
+SCENARIOS = [(5, 2000), (12, 10000)]
+
+VOLUME_THRESHOLD = 100000
+ARBITRAGE_PERCENTAGE_THRESHOLD = 1
+ABSURD_PERCENTAGE_THRESHOLD = 10
+
+def build_market(exchange_count: int, symbol_count: int, random_generator):
+    # Every exchange lists about 70% of the symbols, prices scatter tightly around a reference price
+    # and about one quote in a hundred is off by a few percent
+    exchanges = ["EXCHANGE" + str(index) for index in range(exchange_count)]
+    reference_prices = [random_generator.uniform(0.001, 50000) for _ in range(symbol_count)]
+    market_data = {}
+    for exchange in exchanges:
+        usdt_pairs = {}
+        for symbol_id, reference_price in enumerate(reference_prices):
+            if random_generator.random() < 0.7:
+                deviation = random_generator.gauss(0, 0.03) if random_generator.random() < 0.01 else random_generator.gauss(0, 0.001)
+                price = reference_price * (1 + deviation)
+                volume = random_generator.uniform(0, 2000000) / price
+                usdt_pairs[symbol_id] = PriceDataModel(str(symbol_id), price, exchange, 1736886400000, volume)
+        market_data[exchange] = usdt_pairs
+    return exchanges, market_data
+
+# The per market pair loop ArbiSense ran before the SpreadEngine
+def calculate_previous(market_data: dict, market_pairs: list):
+    opportunities = []
+    for index, (first_market, second_market) in enumerate(market_pairs):
+        first_market_pairs = market_data[first_market]
+        second_market_pairs = market_data[second_market]
+        for symbol_id in first_market_pairs.keys() & second_market_pairs.keys():
+            first_market_common_pair = first_market_pairs.get(symbol_id, None)
+            second_market_common_pair = second_market_pairs.get(symbol_id, None)
+            if first_market_common_pair.volume_in_quote_currency() > VOLUME_THRESHOLD and second_market_common_pair.volume_in_quote_currency() > VOLUME_THRESHOLD:
+                arbitrage_percentage = (first_market_common_pair.price - second_market_common_pair.price) / first_market_common_pair.price * 100
+                if arbitrage_percentage < 0 and abs(arbitrage_percentage) > ARBITRAGE_PERCENTAGE_THRESHOLD and abs(arbitrage_percentage) < ABSURD_PERCENTAGE_THRESHOLD:
+                    opportunities.append((index, symbol_id, second_market, first_market, second_market_common_pair.price, first_market_common_pair.price, abs(arbitrage_percentage)))
+                elif arbitrage_percentage > 0 and arbitrage_percentage > ARBITRAGE_PERCENTAGE_THRESHOLD and arbitrage_percentage < ABSURD_PERCENTAGE_THRESHOLD:
+                    opportunities.append((index, symbol_id, first_market, second_market, first_market_common_pair.price, second_market_common_pair.price, arbitrage_percentage))
+    return opportunities
+
+def calculate_with_engine(spread_engine: SpreadEngine, price_matrix: PriceMatrix, market_pair_indices: list):
+    prices, quote_volumes, timestamps = price_matrix.get_view()
+    market_pair_positions, symbol_ids, high_columns, low_columns, high_prices, low_prices, percentages, net_percentages = spread_engine.calculate(
+        prices, quote_volumes, market_pair_indices, VOLUME_THRESHOLD, ARBITRAGE_PERCENTAGE_THRESHOLD, ABSURD_PERCENTAGE_THRESHOLD)
+    exchanges = price_matrix.get_exchanges()
+    return [(index, symbol_id, exchanges[high_column], exchanges[low_column], high_price, low_price, percentage)
+            for index, symbol_id, high_column, low_column, high_price, low_price, percentage
+            in zip(market_pair_positions.tolist(), symbol_ids.tolist(), high_columns.tolist(), low_columns.tolist(), high_prices.tolist(), low_prices.tolist(), percentages.tolist())]
+
+def measure_cpu_in_ms(function, cycles: int):
+    cycle_times = []
+    for _ in range(cycles):
+        start_time = time.process_time()
+        function()
+        cycle_times.append((time.process_time() - start_time) * 1000)
+    return statistics.median(cycle_times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spread calculation CPU of the previous per symbol loop and the SpreadEngine")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random_generator = random.Random(args.seed)
+    for exchange_count, symbol_count in SCENARIOS:
+        exchanges, market_data = build_market(exchange_count, symbol_count, random_generator)
+        market_pairs = list(itertools.combinations(exchanges, 2))
+        market_pair_indices = list(range(len(market_pairs)))
+
+        price_matrix = PriceMatrix(exchanges, symbol_count)
+        for exchange, usdt_pairs in market_data.items():
+            price_matrix.update(exchange, usdt_pairs)
+        spread_engine = SpreadEngine(exchanges, market_pairs)
+
+        previous_opportunities = calculate_previous(market_data, market_pairs)
+        engine_opportunities = calculate_with_engine(spread_engine, price_matrix, market_pair_indices)
+        assert sorted(previous_opportunities) == engine_opportunities, (exchange_count, symbol_count)
+
+        previous_median = measure_cpu_in_ms(lambda: calculate_previous(market_data, market_pairs), args.cycles)
+        engine_median = measure_cpu_in_ms(lambda: calculate_with_engine(spread_engine, price_matrix, market_pair_indices), args.cycles)
+        print(f"{exchange_count:>2} exchanges x {symbol_count:>5} symbols, {len(market_pairs):>2} market pairs, {len(engine_opportunities):>5} opportunities")
+        print(f"    previous  median {previous_median:9.2f} ms per cycle")
+        print(f"    engine    median {engine_median:9.2f} ms per cycle")
+        print(f"    speedup   {previous_median / engine_median:.1f}x")
@@ -0,0 +1,223 @@
+import argparse
+import gc
+import json
+import multiprocessing
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.ticker_decoding import build_synthetic_payload, DECODERS
+from src.data.Exchanges import Exchanges
+from src.models.PriceDataModel import PriceDataModel
+from src.utils.fileutils import FileUtils
+from src.utils.responserecorder import ResponseRecorder
+
+# Per-stage time and allocations of the ingestion and analysis hot paths, on synthetic markets of several sizes
+# and optionally on the latest ticker and symbol rules responses of response recordings. Every market runs in a
+# fresh interpreter, so the symbol registry and price matrix singletons only hold that market.
+#
+# Stages: decode.<EXCHANGE> (ticker decoder), ingest.<EXCHANGE> (a service processing its ticker response into
+# PriceDataModels and the price matrix), price_data_model, is_symbol_trading, price_matrix.update,
+# analysis.full (every market pair and symbol) and analysis.incremental (1% of the symbols dirty).
+#
+# Results can be saved as a baseline, later runs flag the stages whose minimum time or allocation peak grew
+# beyond the baseline by more than the tolerance and exit with status 1.
+#
+# python -m benchmarks.suite --save-baseline
+# python -m benchmarks.suite --sizes 1000 5000 --recording session.jsonl.gz --tolerance 0.1
+
+DEFAULT_SIZES = [1000, 5000, 20000]
+DEFAULT_BASELINE_PATH = "benchmarks/suite_baseline.json"
+QUOTES = ["USDT", "BTC", "ETH", "EUR"]
+REFERENCE_VALUES = {"USDT": 1.0, "BTC": 100000.0, "ETH": 3000.0, "EUR": 1.08}
+DASHED_EXCHANGES = [Exchanges.KUCOIN.value, Exchanges.OKX.value]
+
+def build_synthetic_market(ticker_count: int, seed: int):
+    # Every exchange lists the same pairs plus the conversion pairs of the quotes, prices scatter by 0.2% around
+    # a common value and about one quote in a hundred is off by a few percent. Returns
+    # {exchange: (rules payload, ticker payload)}
+    random_generator = random.Random(seed)
+    pairs = [("A" + str(index), QUOTES[index % len(QUOTES)]) for index in range(ticker_count)]
+    pairs += [(quote, "USDT") for quote in QUOTES if quote != "USDT"]
+    values = [random_generator.uniform(0.001, 500) if base not in REFERENCE_VALUES else REFERENCE_VALUES[base] for base, quote in pairs]
+    market = {}
+    for exchange in Exchanges:
+        last_prices = [value / REFERENCE_VALUES[quote] * random_generator.gauss(1, 0.002) * (random_generator.uniform(1.02, 1.05) if random_generator.random() < 0.01 else 1) for value, (base, quote) in zip(values, pairs)]
+        market[exchange.value] = (build_rules_payload(exchange.value, pairs), build_synthetic_payload(exchange.value, len(pairs), random_generator, pairs, last_prices))
+    return market
+
+def build_rules_payload(exchange: str, pairs: list):
+    separator = "-" if exchange in DASHED_EXCHANGES else ""
+    if exchange == Exchanges.BINANCE.value:
+        payload = {"symbols": [{"symbol": base + quote, "status": "TRADING", "baseAsset": base, "quoteAsset": quote, "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.00000100"}]} for base, quote in pairs]}
+    elif exchange == Exchanges.BYBIT.value:
+        payload = {"retCode": 0, "result": {"list": [{"symbol": base + quote, "status": "Trading", "baseCoin": base, "quoteCoin": quote, "priceFilter": {"tickSize": "0.000001"}} for base, quote in pairs]}}
+    elif exchange == Exchanges.KRAKEN.value:
+        payload = {"error": [], "result": {base + quote: {"status": "online", "base": base, "quote": quote, "tick_size": "0.000001", "wsname": base + "/" + quote, "fees": [[0, 0.4]]} for base, quote in pairs}}
+    elif exchange == Exchanges.KUCOIN.value:
+        payload = {"code": "200000", "data": [{"symbol": base + separator + quote, "enableTrading": True, "baseCurrency": base, "quoteCurrency": quote, "priceIncrement": "0.000001", "feeCategory": 1, "takerFeeCoefficient": "1"} for base, quote in pairs]}
+    else:
+        payload = {"code": "0", "data": [{"instId": base + separator + quote, "state": "live", "baseCcy": base, "quoteCcy": quote, "tickSz": "0.000001"} for base, quote in pairs]}
+    return json.dumps(payload).encode("utf-8")
+
+def load_recorded_market(recording_paths: list):
+    # The latest ticker and symbol rules responses of every exchange, the rules are None when the recording has none
+    endpoints = get_endpoints()
+    market = {}
+    for record in ResponseRecorder.read_merged_records(recording_paths):
+        if record["kind"] != ResponseRecorder.RESPONSE or record["exchange"] not in endpoints:
+            continue
+        ticker_path, rules_path = endpoints[record["exchange"]]
+        rules_payload, ticker_payload = market.get(record["exchange"], (None, None))
+        if record["url"].endswith(ticker_path):
+            ticker_payload = record["body"].encode("utf-8")
+        elif record["url"].endswith(rules_path):
+            rules_payload = record["body"].encode("utf-8")
+        market[record["exchange"]] = (rules_payload, ticker_payload)
+    return {exchange: payloads for exchange, payloads in market.items() if payloads[1] is not None}
+
+def get_endpoints():
+    from src.services.BinanceIntegrationService import BinanceEndpoints
+    from src.services.ByBitIntegrationService import ByBitEndpoints
+    from src.services.KrakenIntegrationService import KrakenEndpoints
+    from src.services.KuCoinIntegrationService import KuCoinEndpoints
+    from src.services.OKXIntegrationService import OKXEndpoints
+    return {
+        Exchanges.BINANCE.value: (BinanceEndpoints._24HR_TICKER_PRICE_CHANGE, BinanceEndpoints._EXCHANGE_INFO),
+        Exchanges.BYBIT.value: (ByBitEndpoints._TICKERS, ByBitEndpoints._INSTRUMENTS_INFO),
+        Exchanges.KRAKEN.value: (KrakenEndpoints._TICKER, KrakenEndpoints._ASSET_PAIRS),
+        Exchanges.KUCOIN.value: (KuCoinEndpoints._ALL_TICKERS, KuCoinEndpoints._EXCHANGE_INFO),
+        Exchanges.OKX.value: (OKXEndpoints._TICKERS, OKXEndpoints._SPOT_INTRSUMENTS_INFO)
+    }
+
+def measure(function, repeats: int):
+    # Median and minimum wall time in milliseconds with the garbage collector paused, then one more call under
+    # tracemalloc for the peak and the retained allocations in KiB
+    times = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            function()
+            times.append((time.perf_counter() - start_time) * 1000)
+    finally:
+        gc.enable()
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    function()
+    end_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "peak_kib": (peak_memory - start_memory) / 1024,
+        "retained_kib": (end_memory - start_memory) / 1024
+    }
+
+def measure_market(market: dict, repeats: int, seed: int):
+    # Runs in a fresh interpreter, returns {stage: measurement}
+    from src.logic.ArbiSense import ArbiSense
+    arbisense = ArbiSense()
+    endpoints = get_endpoints()
+    services = arbisense.exchange_services
+    for exchange, (rules_payload, ticker_payload) in market.items():
+        if rules_payload is not None:
+            services[exchange].process_recorded_response(endpoints[exchange][1], rules_payload)
+        else:
+            services[exchange].load_cached_rulebook()
+
+    results = {}
+    for exchange, (rules_payload, ticker_payload) in market.items():
+        symbol_ids = services[exchange].trading_symbol_ids
+        results["decode." + exchange] = measure(lambda: DECODERS[exchange](ticker_payload, symbol_ids), repeats)
+    for exchange, (rules_payload, ticker_payload) in market.items():
+        results["ingest." + exchange] = measure(lambda: services[exchange].process_recorded_response(endpoints[exchange][0], ticker_payload), repeats)
+
+    tickers = [ticker for exchange, (rules_payload, ticker_payload) in market.items() for ticker in DECODERS[exchange](ticker_payload, services[exchange].trading_symbol_ids)[0]]
+    results["price_data_model"] = measure(lambda: [PriceDataModel(symbol, price, Exchanges.BINANCE.value, 1736899200000, volume) for symbol_id, symbol, price, volume in tickers], repeats)
+    symbols = [(services[exchange], symbol) for exchange in market for symbol in services[exchange].symbol_index]
+    results["is_symbol_trading"] = measure(lambda: [service.is_symbol_trading(symbol) for service, symbol in symbols], repeats)
+    pairs_dictionaries = {exchange: services[exchange].get_pairs_dictionary() for exchange in market}
+
+    def update_price_matrix():
+        for exchange, pairs_dictionary in pairs_dictionaries.items():
+            arbisense.price_matrix.update(exchange, pairs_dictionary)
+        return
+
+    results["price_matrix.update"] = measure(update_price_matrix, repeats)
+
+    arbisense.analyzed_exchanges = list(market.keys())
+    all_market_pair_indices = list(range(len(arbisense.market_pairs_list)))
+    no_symbol_ids = np.zeros(0, dtype=np.int64)
+    symbol_count = arbisense.price_matrix.get_symbol_count()
+    dirty_symbol_ids = np.unique(np.random.default_rng(seed).integers(0, symbol_count, max(1, symbol_count // 100)))
+
+    def analyze_full():
+        arbisense.opportunity_table = {}
+        return arbisense._calculate_arbitrage_percentages(all_market_pair_indices, no_symbol_ids)
+
+    results["analysis.full"] = measure(analyze_full, repeats)
+    results["analysis.incremental"] = measure(lambda: arbisense._calculate_arbitrage_percentages([], dirty_symbol_ids), repeats)
+    results["symbols"] = symbol_count
+    results["opportunities"] = len(analyze_full())
+    return results
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float, min_delta_in_ms: float):
+    # Returns the (key, metric, baseline value, value) tuples that regressed. Times are compared by their minimum,
+    # which shifts far less between runs than the median on a busy machine
+    regressions = []
+    for key, measurement in results.items():
+        baseline_measurement = baseline.get(key)
+        if baseline_measurement is None:
+            continue
+        if measurement["min_ms"] > baseline_measurement["min_ms"] * (1 + tolerance) and measurement["min_ms"] - baseline_measurement["min_ms"] > min_delta_in_ms:
+            regressions.append((key, "min_ms", baseline_measurement["min_ms"], measurement["min_ms"]))
+        if measurement["peak_kib"] > baseline_measurement["peak_kib"] * (1 + tolerance) and measurement["peak_kib"] - baseline_measurement["peak_kib"] > 1:
+            regressions.append((key, "peak_kib", baseline_measurement["peak_kib"], measurement["peak_kib"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage time and allocations of the ingestion and analysis hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Synthetic tickers per exchange")
+    parser.add_argument("--recording", nargs="+", default=None, help="Response recordings to take the latest payloads from")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown or allocation growth, 0.25 is 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Smaller slowdowns are never flagged")
+    args = parser.parse_args()
+
+    markets = [(str(size), lambda size=size: build_synthetic_market(size, args.seed)) for size in args.sizes]
+    if args.recording is not None:
+        markets.append(("recorded", lambda: load_recorded_market(args.recording)))
+
+    baseline = {}
+    if FileUtils.path_file(args.baseline):
+        baseline = FileUtils.read_json_from_file(args.baseline)["results"]
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    print(f"{'market':<10} {'stage':<22} {'median ms':>10} {'min ms':>10} {'peak KiB':>10} {'kept KiB':>10} {'vs base':>10}")
+    for market_name, build_market in markets:
+        with context.Pool(1) as pool:
+            market_results = pool.apply(measure_market, (build_market(), args.repeats, args.seed))
+        print(f"{market_name:<10} {market_results.pop('symbols')} symbols, {market_results.pop('opportunities')} opportunities")
+        for stage, measurement in market_results.items():
+            key = market_name + "/" + stage
+            results[key] = measurement
+            baseline_min = baseline[key]["min_ms"] if key in baseline else None
+            change = f"{(measurement['min_ms'] / baseline_min - 1) * 100:+9.1f}%" if baseline_min else f"{'-':>10}"
+            print(f"{'':<10} {stage:<22} {measurement['median_ms']:10.3f} {measurement['min_ms']:10.3f} {measurement['peak_kib']:10.1f} {measurement['retained_kib']:10.1f} {change}")
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+    for key, metric, baseline_value, value in regressions:
+        print(f"\033[91mREGRESSION {key} {metric}: {baseline_value:.3f} -> {value:.3f}\033[0m")
+    if args.save_baseline:
+        FileUtils.write_json_to_file(args.baseline, {"python": sys.version.split()[0], "platform": platform.platform(), "results": results})
+        print("Baseline saved to " + args.baseline)
+    if len(regressions) > 0 and not args.save_baseline:
+        sys.exit(1)
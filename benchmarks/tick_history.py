@@ -0,0 +1,73 @@
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from src.models.PriceDataModel import PriceDataModel
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.services.TickHistoryService import TickHistory
+
+# Append, flush and range query cost of the TickHistory on a simulated day of 2 second snapshots, written into a
+# temporary folder that is removed afterwards.
+#
+# python -m benchmarks.tick_history
+
+EXCHANGES = ["BINANCE", "BYBIT", "KRAKEN", "KUCOIN", "OKX"]
+START_TIME = 1736899200000
+
+def build_snapshot(exchange: str, symbol_count: int, timestamp: int, random_generator):
+    # The tick history stores the canonical pair of every symbol id, so the synthetic symbols are registered
+    symbol_registry = SingletonSymbolRegistry.getInstance()
+    snapshot = {}
+    for index in range(symbol_count):
+        symbol = "S" + str(index) + "USDT"
+        symbol_id = symbol_registry.register_symbol(exchange, symbol, "S" + str(index), "USDT")
+        snapshot[symbol_id] = PriceDataModel(symbol, random_generator.uniform(0.01, 100), exchange, timestamp, random_generator.uniform(0, 1e6))
+    return snapshot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tick history append and range query cost")
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--snapshots", type=int, default=1800)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random_generator = random.Random(args.seed)
+    folder_path = tempfile.mkdtemp(prefix="tick_history_")
+    try:
+        tick_history = TickHistory()
+        tick_history.start(folder_path)
+        snapshot = build_snapshot(EXCHANGES[0], args.symbols, START_TIME, random_generator)
+        append_times = []
+        flush_times = []
+        for index in range(args.snapshots):
+            timestamp = START_TIME + index * 2000
+            snapshot = {symbol_id: PriceDataModel(model.symbol, model.price, model.exchange, timestamp, model.volume) for symbol_id, model in snapshot.items()}
+            for exchange in EXCHANGES:
+                start_time = time.perf_counter()
+                tick_history.append(exchange, snapshot)
+                append_times.append((time.perf_counter() - start_time) * 1000)
+            if index % 10 == 9:
+                start_time = time.perf_counter()
+                tick_history.flush()
+                flush_times.append((time.perf_counter() - start_time) * 1000)
+        tick_history.stop()
+        row_count = args.snapshots * args.symbols * len(EXCHANGES)
+        print(f"{row_count:,} rows: append {statistics.median(append_times):.3f} ms per snapshot  flush of 10 snapshots x {len(EXCHANGES)} exchanges {statistics.median(flush_times):.2f} ms")
+
+        end_time = START_TIME + args.snapshots * 2000
+        for range_in_seconds in (60, 600, args.snapshots * 2):
+            query_times = []
+            for _ in range(20):
+                range_start_time = random_generator.randint(START_TIME, max(START_TIME, end_time - range_in_seconds * 1000))
+                start_time = time.perf_counter()
+                ranges = tick_history.query(EXCHANGES[0], range_start_time, range_start_time + range_in_seconds * 1000)
+                query_times.append((time.perf_counter() - start_time) * 1000)
+            rows = sum(len(day_range[0]) for day_range in ranges)
+            start_time = time.perf_counter()
+            tick_history.query_symbol(EXCHANGES[0], next(iter(snapshot)), range_start_time, range_start_time + range_in_seconds * 1000)
+            symbol_time = (time.perf_counter() - start_time) * 1000
+            print(f"    {range_in_seconds:>5} s range, {rows:>9,} rows: query {statistics.median(query_times):7.3f} ms  single symbol {symbol_time:8.2f} ms")
+    finally:
+        shutil.rmtree(folder_path)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from src.data.Exchanges import Exchanges
+from src.models.PriceDataModel import PriceDataModel
+from src.utils.fileutils import FileUtils
+from src.utils.tickerdecoders import TickerDecoders
+
+# Per-cycle parse CPU of the five full-market ticker payloads, comparing the previous response.json()
+# and field by field float() conversion with the byte level TickerDecoders.
+#
+# Recorded payloads can be used by pointing --payload-dir at a folder holding binance_tickers.json,
+# bybit_tickers.json, kraken_tickers.json, kucoin_tickers.json and okx_tickers.json (raw response bodies).
+# Missing exchanges fall back to synthetic payloads shaped like the real responses.
+#
+# python -m benchmarks.ticker_decoding
+# python -m benchmarks.ticker_decoding --payload-dir recorded/ --cycles 200
+
+SYNTHETIC_TICKER_COUNTS = {
+    Exchanges.BINANCE.value: 3000,
+    Exchanges.BYBIT.value: 700,
+    Exchanges.KRAKEN.value: 1100,
+    Exchanges.KUCOIN.value: 1300,
+    Exchanges.OKX.value: 750
+}
+
+def random_decimal(random_generator):
+    return f"{random_generator.uniform(0.0001, 70000):.8f}"
+
+def build_synthetic_payload(exchange: str, ticker_count: int, random_generator, pairs: list = None, last_prices: list = None):
+    # pairs (base, quote) and their last prices can be given, otherwise ticker_count made up pairs get random prices
+    quotes = ["USDT", "BTC", "ETH", "EUR"]
+    if pairs is None:
+        pairs = [("A" + str(index), quotes[index % len(quotes)]) for index in range(ticker_count)]
+
+    def last_price(index: int):
+        return random_decimal(random_generator) if last_prices is None else f"{last_prices[index]:.8f}"
+
+    if exchange == Exchanges.BINANCE.value:
+        payload = [{
+            "symbol": base + quote, "priceChange": random_decimal(random_generator), "priceChangePercent": "1.250",
+            "weightedAvgPrice": random_decimal(random_generator), "prevClosePrice": random_decimal(random_generator),
+            "lastPrice": last_price(index), "lastQty": random_decimal(random_generator),
+            "bidPrice": random_decimal(random_generator), "bidQty": random_decimal(random_generator),
+            "askPrice": random_decimal(random_generator), "askQty": random_decimal(random_generator),
+            "openPrice": random_decimal(random_generator), "highPrice": random_decimal(random_generator),
+            "lowPrice": random_decimal(random_generator), "volume": random_decimal(random_generator),
+            "quoteVolume": random_decimal(random_generator), "openTime": 1736800000000, "closeTime": 1736886400000,
+            "firstId": 1, "lastId": 1000, "count": 1000
+        } for index, (base, quote) in enumerate(pairs)]
+    elif exchange == Exchanges.BYBIT.value:
+        payload = {"retCode": 0, "retMsg": "OK", "result": {"category": "spot", "list": [{
+            "symbol": base + quote, "bid1Price": random_decimal(random_generator), "bid1Size": random_decimal(random_generator),
+            "ask1Price": random_decimal(random_generator), "ask1Size": random_decimal(random_generator),
+            "lastPrice": last_price(index), "prevPrice24h": random_decimal(random_generator),
+            "price24hPcnt": "0.0125", "highPrice24h": random_decimal(random_generator), "lowPrice24h": random_decimal(random_generator),
+            "turnover24h": random_decimal(random_generator), "volume24h": random_decimal(random_generator), "usdIndexPrice": ""
+        } for index, (base, quote) in enumerate(pairs)]}, "time": 1736886400000}
+    elif exchange == Exchanges.KRAKEN.value:
+        payload = {"error": [], "result": {base + quote: {
+            "a": [random_decimal(random_generator), "1", "1.000"], "b": [random_decimal(random_generator), "1", "1.000"],
+            "c": [last_price(index), random_decimal(random_generator)],
+            "v": [random_decimal(random_generator), random_decimal(random_generator)],
+            "p": [random_decimal(random_generator), random_decimal(random_generator)], "t": [100, 1000],
+            "l": [random_decimal(random_generator), random_decimal(random_generator)],
+            "h": [random_decimal(random_generator), random_decimal(random_generator)], "o": random_decimal(random_generator)
+        } for index, (base, quote) in enumerate(pairs)}}
+    elif exchange == Exchanges.KUCOIN.value:
+        payload = {"code": "200000", "data": {"time": 1736886400000, "ticker": [{
+            "symbol": base + "-" + quote, "symbolName": base + "-" + quote, "buy": random_decimal(random_generator),
+            "bestBidSize": random_decimal(random_generator), "sell": random_decimal(random_generator),
+            "bestAskSize": random_decimal(random_generator), "changeRate": "0.0125", "changePrice": random_decimal(random_generator),
+            "high": random_decimal(random_generator), "low": random_decimal(random_generator), "vol": random_decimal(random_generator),
+            "volValue": random_decimal(random_generator), "last": last_price(index),
+            "averagePrice": random_decimal(random_generator), "takerFeeRate": "0.001", "makerFeeRate": "0.001",
+            "takerCoefficient": "1", "makerCoefficient": "1"
+        } for index, (base, quote) in enumerate(pairs)]}}
+    else:
+        payload = {"code": "0", "msg": "", "data": [{
+            "instType": "SPOT", "instId": base + "-" + quote, "last": last_price(index),
+            "lastSz": random_decimal(random_generator), "askPx": random_decimal(random_generator), "askSz": random_decimal(random_generator),
+            "bidPx": random_decimal(random_generator), "bidSz": random_decimal(random_generator), "open24h": random_decimal(random_generator),
+            "high24h": random_decimal(random_generator), "low24h": random_decimal(random_generator),
+            "volCcy24h": random_decimal(random_generator), "vol24h": random_decimal(random_generator),
+            "ts": "1736886400000", "sodUtc0": random_decimal(random_generator), "sodUtc8": random_decimal(random_generator)
+        } for index, (base, quote) in enumerate(pairs)]}
+    return json.dumps(payload).encode("utf-8")
+
+def native_symbols(exchange: str, content: bytes):
+    data = json.loads(content)
+    if exchange == Exchanges.BINANCE.value:
+        return [ticker["symbol"] for ticker in data]
+    if exchange == Exchanges.BYBIT.value:
+        return [ticker["symbol"] for ticker in data["result"]["list"]]
+    if exchange == Exchanges.KRAKEN.value:
+        return list(data["result"])
+    if exchange == Exchanges.KUCOIN.value:
+        return [ticker["symbol"] for ticker in data["data"]["ticker"]]
+    return [ticker["instId"] for ticker in data["data"]]
+
+# The parsing the integration services did before the decoders, response.json() decodes the body
+# text and Kraken decoded it twice through response.text and json.loads
+def parse_previous(exchange: str, content: bytes, symbol_ids: dict):
+    data_retrieval_time = int(round(time.time() * 1000))
+    models = []
+    if exchange == Exchanges.BINANCE.value:
+        for item in json.loads(content.decode("utf-8")):
+            if symbol_ids.get(item["symbol"]) is not None:
+                models.append(PriceDataModel(item["symbol"], item["lastPrice"], exchange, data_retrieval_time, item["volume"]))
+    elif exchange == Exchanges.BYBIT.value:
+        for item in json.loads(content.decode("utf-8"))["result"]["list"]:
+            if symbol_ids.get(item["symbol"]) is not None:
+                models.append(PriceDataModel(item["symbol"], float(item.get("lastPrice") or 0), exchange, data_retrieval_time, float(item.get("volume24h") or 0)))
+    elif exchange == Exchanges.KRAKEN.value:
+        text = content.decode("utf-8")
+        json.loads(text)
+        result = json.loads(text)["result"]
+        for symbol in result:
+            if symbol_ids.get(symbol) is not None:
+                models.append(PriceDataModel(symbol, float(result[symbol]["c"][0]), exchange, data_retrieval_time, float(result[symbol]["v"][0])))
+    elif exchange == Exchanges.KUCOIN.value:
+        for item in json.loads(content.decode("utf-8"))["data"]["ticker"]:
+            if symbol_ids.get(item["symbol"]) is not None:
+                models.append(PriceDataModel(item["symbol"], float(item["last"] or 0), exchange, data_retrieval_time, float(item["vol"] or 0)))
+    else:
+        for item in json.loads(content.decode("utf-8"))["data"]:
+            if symbol_ids.get(item["instId"]) is not None:
+                models.append(PriceDataModel(item["instId"], float(item["last"] or 0), exchange, data_retrieval_time, float(item["vol24h"] or 0)))
+    return models
+
+DECODERS = {
+    Exchanges.BINANCE.value: TickerDecoders.decode_binance_tickers,
+    Exchanges.BYBIT.value: TickerDecoders.decode_bybit_tickers,
+    Exchanges.KRAKEN.value: TickerDecoders.decode_kraken_tickers,
+    Exchanges.KUCOIN.value: TickerDecoders.decode_kucoin_tickers,
+    Exchanges.OKX.value: TickerDecoders.decode_okx_tickers
+}
+
+def parse_with_decoders(exchange: str, content: bytes, symbol_ids: dict):
+    data_retrieval_time = int(round(time.time() * 1000))
+    tickers, server_timestamp = DECODERS[exchange](content, symbol_ids)
+    return [PriceDataModel(symbol, price, exchange, data_retrieval_time, volume, server_timestamp)
+            for symbol_id, symbol, price, volume in tickers]
+
+def measure_cycle_cpu_in_ms(parse_function, payloads: dict, symbol_ids: dict, cycles: int):
+    cycle_times = []
+    for _ in range(cycles):
+        start_time = time.process_time()
+        for exchange, content in payloads.items():
+            parse_function(exchange, content, symbol_ids[exchange])
+        cycle_times.append((time.process_time() - start_time) * 1000)
+    return statistics.median(cycle_times), min(cycle_times)
+
+def load_payloads(payload_dir: str, seed: int):
+    random_generator = random.Random(seed)
+    payloads = {}
+    sources = {}
+    for exchange, ticker_count in SYNTHETIC_TICKER_COUNTS.items():
+        recorded_path = FileUtils.join_paths(payload_dir, exchange.lower() + "_tickers.json") if payload_dir else None
+        if recorded_path is not None and FileUtils.path_file(recorded_path):
+            with open(recorded_path, 'rb') as file:
+                payloads[exchange] = file.read()
+            sources[exchange] = "recorded"
+        else:
+            payloads[exchange] = build_synthetic_payload(exchange, ticker_count, random_generator)
+            sources[exchange] = "synthetic"
+    return payloads, sources
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-cycle ticker parse CPU before and after the TickerDecoders")
+    parser.add_argument("--payload-dir", default=None)
+    parser.add_argument("--cycles", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    payloads, sources = load_payloads(args.payload_dir, args.seed)
+    # Only the USDT pairs are tracked by the services, the same holds here
+    symbol_ids = {}
+    for exchange, content in payloads.items():
+        tracked_symbols = [symbol for symbol in native_symbols(exchange, content) if "USDT" in symbol]
+        symbol_ids[exchange] = {symbol: index for index, symbol in enumerate(tracked_symbols)}
+        print(f"{exchange:<8} {sources[exchange]:<9} {len(content):>9} bytes {len(tracked_symbols):>5} tracked tickers")
+
+    for exchange, content in payloads.items():
+        previous_models = parse_previous(exchange, content, symbol_ids[exchange])
+        decoded_models = parse_with_decoders(exchange, content, symbol_ids[exchange])
+        assert [(model.symbol, model.price, model.volume) for model in previous_models] == [(model.symbol, model.price, model.volume) for model in decoded_models], exchange
+
+    previous_median, previous_min = measure_cycle_cpu_in_ms(parse_previous, payloads, symbol_ids, args.cycles)
+    decoded_median, decoded_min = measure_cycle_cpu_in_ms(parse_with_decoders, payloads, symbol_ids, args.cycles)
+    print(f"previous  median {previous_median:8.2f} ms  min {previous_min:8.2f} ms per cycle")
+    print(f"decoders  median {decoded_median:8.2f} ms  min {decoded_min:8.2f} ms per cycle")
+    print(f"speedup   {previous_median / decoded_median:.2f}x")
@@ -0,0 +1,78 @@
+import argparse
+import random
+import statistics
+import time
+from src.data.Exchanges import Exchanges
+from src.logic.TriangularArbitrageEngine import TriangularArbitrageEngine
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+
+# Graph build time and per-cycle CPU of the TriangularArbitrageEngine on a synthetic exchange, recomputing the
+# whole graph against recomputing only the triangles of the pairs whose price changed.
+#
+# python -m benchmarks.triangular_arbitrage
+
+QUOTES = ["USDT", "USDC", "BTC", "ETH", "BNB", "EUR", "TRY", "FDUSD"]
+SCENARIOS = [1000, 3000]
+CHANGED_SHARES = [0.01, 0.1, 0.5]
+
+def build_exchange(pair_count: int, random_generator):
+    # Every base is listed against a few quotes at its USD value with 0.01% noise, 1% of the pairs are off by up to 2%
+    usd_values = {quote: random_generator.uniform(0.5, 60000) for quote in QUOTES}
+    usd_values["USDT"] = usd_values["USDC"] = usd_values["FDUSD"] = 1.0
+    symbol_registry = SingletonSymbolRegistry.getInstance()
+    tickers = []
+    base_index = 0
+    while len(tickers) < pair_count:
+        base = "COIN" + str(base_index)
+        base_index += 1
+        usd_values[base] = random_generator.uniform(0.001, 500)
+        for quote in random_generator.sample(QUOTES, random_generator.randint(1, 4)):
+            symbol = base + quote
+            symbol_id = symbol_registry.register_symbol(Exchanges.BINANCE.value, symbol, base, quote)
+            price = usd_values[base] / usd_values[quote] * random_generator.gauss(1, 0.0001)
+            if random_generator.random() < 0.01:
+                price *= random_generator.uniform(0.98, 1.02)
+            tickers.append((symbol_id, symbol, price, 0.0))
+    for first_index, first_quote in enumerate(QUOTES):
+        for second_quote in QUOTES[first_index + 1:]:
+            symbol = second_quote + first_quote
+            symbol_id = symbol_registry.register_symbol(Exchanges.BINANCE.value, symbol, second_quote, first_quote)
+            tickers.append((symbol_id, symbol, usd_values[second_quote] / usd_values[first_quote], 0.0))
+    return tickers
+
+def move_prices(tickers: list, random_generator, changed_share: float):
+    return [(symbol_id, symbol, price * random_generator.gauss(1, 0.0001) if random_generator.random() < changed_share else price, volume) for symbol_id, symbol, price, volume in tickers]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triangular arbitrage graph build and recomputation CPU")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random_generator = random.Random(args.seed)
+    for pair_count in SCENARIOS:
+        tickers = build_exchange(pair_count, random_generator)
+        engine = TriangularArbitrageEngine(Exchanges.BINANCE.value)
+        start_time = time.process_time()
+        engine.update_prices(tickers)
+        build_time = (time.process_time() - start_time) * 1000
+        start_time = time.process_time()
+        opportunity_events = engine.calculate()
+        first_pass_time = (time.process_time() - start_time) * 1000
+        print(f"{engine.get_pair_count():>5} pairs, {engine.get_triangle_count():>6} triangles: graph build {build_time:8.2f} ms  first pass {first_pass_time:8.2f} ms  {len(opportunity_events)} opportunities")
+
+        for changed_share in CHANGED_SHARES:
+            full_times = []
+            incremental_times = []
+            for _ in range(args.cycles):
+                tickers = move_prices(tickers, random_generator, changed_share)
+                start_time = time.process_time()
+                engine.update_prices(tickers)
+                engine.calculate()
+                incremental_times.append((time.process_time() - start_time) * 1000)
+                start_time = time.process_time()
+                engine.clear()
+                engine.update_prices(tickers)
+                engine.calculate()
+                full_times.append((time.process_time() - start_time) * 1000)
+            print(f"    {changed_share * 100:5.1f}% changed: full {statistics.median(full_times):8.2f} ms  incremental {statistics.median(incremental_times):8.2f} ms")
@@ -0,0 +1,6 @@
+import enum
+
+class CircuitStates(enum.Enum):
+    HEALTHY = "HEALTHY"
+    DEGRADED = "DEGRADED"
+    OPEN = "OPEN"
@@ -0,0 +1,6 @@
+import enum
+
+class OpportunityEvents(enum.Enum):
+    ADDED = "ADDED"
+    UPDATED = "UPDATED"
+    REMOVED = "REMOVED"
@@ -4,8 +4,27 @@ from src.services.KrakenIntegrationService import KrakenIntegrationService
 from src.services.KuCoinIntegrationService import KuCoinIntegrationService
 from src.services.OKXIntegrationService import OKXIntegrationService
 from src.services.TelegramConnectionService import TelegramConnectionService
+from src.services.HttpTransportService import SingletonHttpTransport
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.services.PriceUpdateNotifierService import SingletonPriceUpdateNotifier
+from src.services.PriceMatrixService import SingletonPriceMatrix
+from src.services.TickHistoryService import SingletonTickHistory
+from src.services.MetricsServerService import MetricsServerService
+from src.utils.clock import SingletonClock
+from src.utils.responserecorder import SingletonResponseRecorder
+from src.utils.metrics import PipelineMetrics
+from src.logic.SpreadEngine import SpreadEngine
+from src.logic.QuoteNormalizer import QuoteNormalizer
+from src.logic.DepthVerifier import DepthVerifier
+from src.logic.TriangularArbitrageEngine import TriangularArbitrageEngine
 from src.data.Exchanges import Exchanges
+from src.data.CircuitStates import CircuitStates
+from src.data.OpportunityEvents import OpportunityEvents
+from src.models.ArbitrageSnapshotModel import ArbitrageSnapshotModel
+from types import MappingProxyType
+import numpy as np
 import threading
+import time
 
 class SingletonArbiSense:
     __instance = None
@@ -29,24 +48,35 @@ class ArbiSense:
     DEFAULT_VOLUME_THRESHOLD = 100000
     DEFAULT_ARBITRAGE_PERCENTAGE_THRESHOLD = 1
     DEFAULT_ABSURD_PERCENTAGE_THRESHOLD = 10
+    DEFAULT_STALE_DATA_THRESHOLD_IN_SECONDS = 10
+    DEFAULT_MAX_QUOTE_SKEW_IN_SECONDS = 5
 
     def __init__(self):
         self.retrieve_period_in_seconds = self.DEFAULT_PERIOD
         self.retrieve_time_out_in_seconds = self.retrieve_period_in_seconds + 1
+        self.stale_data_threshold_in_seconds = self.DEFAULT_STALE_DATA_THRESHOLD_IN_SECONDS
+        self.symbol_registry = SingletonSymbolRegistry.getInstance()
+        self.price_update_notifier = SingletonPriceUpdateNotifier.getInstance()
+        self.price_matrix = SingletonPriceMatrix.getInstance()
+        self.tick_history = SingletonTickHistory.getInstance()
+        self.tick_history_settings = None
+        self.clock = SingletonClock.getInstance()
+        self.response_recorder = SingletonResponseRecorder.getInstance()
+        self.recording_path = None
+        self.metrics_server = MetricsServerService()
+        self.metrics_endpoint_settings = None
         self._initialie_exchange_services()
+        self.analysis_cycle_duration_metric = PipelineMetrics.analysis_cycle_duration().labels()
+        self.opportunities_per_cycle_metric = PipelineMetrics.opportunities_per_cycle().labels()
+        self.quote_staleness_metrics = {exchange: PipelineMetrics.quote_staleness().labels(exchange) for exchange in self.exchange_services}
+        for exchange in self.exchange_services:
+            PipelineMetrics.clock_offset().labels(exchange).set_function(self.clock.get_offset_estimator(exchange).get_offset_in_ms)
 
         self.cross_arbitrage_analyzer_thread = None
         self.cross_arbitrage_analyzer_thread_running = False
         self.cross_arbitrage_analyzer_thread = threading.Thread(target=self.process)
         self.cross_arbitrage_analyzed_event = threading.Event()
 
-        self.binance_usdt_pairs = None
-        self.bybit_usdt_pairs = None
-        self.kraken_usdt_pairs = None
-        self.kucoin_usdt_pairs = None
-        self.okx_usdt_pairs = None
-
-        self.common_pairs = []
         self.market_pairs_list = [
             (Exchanges.BINANCE.value, Exchanges.KUCOIN.value),
             (Exchanges.BINANCE.value, Exchanges.OKX.value),
@@ -59,11 +89,31 @@ class ArbiSense:
             (Exchanges.OKX.value, Exchanges.KRAKEN.value),
             (Exchanges.BYBIT.value, Exchanges.KRAKEN.value)
         ]
+        self.spread_engine = SpreadEngine(self.price_matrix.get_exchanges(), self.market_pairs_list)
+        # Every quote currency is analyzed, volumes are compared in the reference asset
+        self.quote_normalizer = QuoteNormalizer()
+        self.analyzed_exchanges = []
+        # Opportunities keyed by (market pair index, symbol id), only the rows of changed symbols and of the
+        # market pairs whose exchanges went stale or fresh again are recomputed
+        self.opportunity_table = {}
+        self.opportunity_listeners = []
+        self.depth_verifier = DepthVerifier(self.exchange_services)
+        self.depth_verification_enabled = False
+        # Intra-exchange triangle detection, one engine per exchange fed with all of the exchange's trading pairs
+        self.triangular_arbitrage_engines = {}
+        self.triangular_opportunities = ()
+        self.triangular_opportunity_listeners = []
+        self.last_status_print_time = 0
 
         self.volume_threshold = self.DEFAULT_VOLUME_THRESHOLD
         self.arbitrage_percentage_threshold = self.DEFAULT_ARBITRAGE_PERCENTAGE_THRESHOLD
+        # Opportunities whose legs were quoted further apart in time are skipped, None compares every pair of quotes.
+        # The symbols skipped for it are rechecked on every pass, the quote that catches up may not change the price
+        self.max_quote_skew_in_seconds = self.DEFAULT_MAX_QUOTE_SKEW_IN_SECONDS
+        self.skewed_symbol_ids = np.zeros(0, dtype=np.intp)
 
-        self.arbitrage_percentages = []
+        # Replaced as a whole after every calculation, readers hold on to the snapshot they fetched
+        self.arbitrage_snapshot = ArbitrageSnapshotModel(0, self.clock.time(), (), ())
 
         return
     
@@ -73,29 +123,79 @@ class ArbiSense:
     def _send_message_through_telegram(self):
         if self.tcs:
             message = ""
-            for percentage_data in self.arbitrage_percentages:
+            for percentage_data in self.get_arbitrage_snapshot().opportunities:
                 message += f"{percentage_data['symbol']} {percentage_data['first_market']} {percentage_data['first_market_price']} {percentage_data['second_market']} {percentage_data['second_market_price']} {percentage_data['arbitrage_percentage']:.2f}%\n"
             self.tcs.send_message(message)
         return
     
     def process(self):
         self._start_exchange_services()
-        if self._wait_for_price_retrievals():
-            self._get_pairs_from_services()
-            self._detect_common_pairs()
-            pass
+        last_seen_generation = self.price_update_notifier.get_generation()
         while self.cross_arbitrage_analyzer_thread_running:
-            if self._wait_for_price_retrievals():
-                # Prints "Cross Arbitrage Analyzer: All Exchanges Price Retrieved" in green using ansi escape codes
-                self._get_pairs_from_services()
-                self._calculate_arbitrage_percentages()
-                self.cross_arbitrage_analyzed_event.set()
-                print("\033[92mCross Arbitrage Analyzer: All Exchanges Price Retrieved\033[0m")
-                pass
-            else:
-                self._clear_service_events()
+            # Wakes as soon as any exchange publishes, updates published during the calculation are picked up by the next wait
+            generation, updated_exchanges = self.price_update_notifier.wait_for_update(last_seen_generation, self.retrieve_time_out_in_seconds)
+            last_seen_generation = generation
+            self.analyze(updated_exchanges)
+        return
+    
+    def analyze(self, updated_exchanges: list, print_status: bool = True):
+        # One pass over what the exchanges published since the previous one, run by the analyzer thread and by the
+        # replay engine
+        cycle_start_time = time.perf_counter()
+        fresh_exchanges = self._get_fresh_exchanges()
+        affected_market_pair_indices = self._refresh_market_data(fresh_exchanges)
+        dirty_symbol_ids = self.price_matrix.take_dirty_symbol_ids()
+        if len(self.skewed_symbol_ids) > 0:
+            dirty_symbol_ids = np.union1d(dirty_symbol_ids, self.skewed_symbol_ids)
+        if len(affected_market_pair_indices) > 0 or len(dirty_symbol_ids) > 0:
+            opportunity_events = self._calculate_arbitrage_percentages(affected_market_pair_indices, dirty_symbol_ids)
+            if len(opportunity_events) > 0:
+                self._publish_arbitrage_snapshot(fresh_exchanges)
+                self._notify_opportunity_listeners(opportunity_events)
+                if self.depth_verification_enabled:
+                    self.depth_verifier.submit(self.arbitrage_snapshot)
+        if len(self.triangular_arbitrage_engines) > 0:
+            self._calculate_triangular_arbitrage(fresh_exchanges)
+        self.analysis_cycle_duration_metric.observe(time.perf_counter() - cycle_start_time)
+        self.opportunities_per_cycle_metric.observe(len(self.opportunity_table))
+        if len(updated_exchanges) == 0:
+            if print_status:
                 print("\033[91mCross Arbitrage Analyzer: Price Retrieval Timeout\033[0m")
-                pass
+        elif len(fresh_exchanges) >= 2:
+            self.cross_arbitrage_analyzed_event.set()
+            if print_status:
+                self._print_analysis_status(fresh_exchanges)
+        return
+    
+    def _print_analysis_status(self, fresh_exchanges: list):
+        # Updates can arrive many times per second in streaming mode, the status line is printed once per period
+        current_time = self.clock.monotonic()
+        if current_time - self.last_status_print_time < self.retrieve_period_in_seconds:
+            return
+        self.last_status_print_time = current_time
+        if len(fresh_exchanges) == len(self.exchange_services):
+            # Prints "Cross Arbitrage Analyzer: All Exchanges Price Retrieved" in green using ansi escape codes
+            print("\033[92mCross Arbitrage Analyzer: All Exchanges Price Retrieved\033[0m")
+        else:
+            print("\033[93mCross Arbitrage Analyzer: Partial Analysis, skipped " + ", ".join(self._get_skipped_exchanges(fresh_exchanges)) + "\033[0m")
+        return
+    
+    def _publish_arbitrage_snapshot(self, fresh_exchanges: list):
+        opportunities = tuple(self.opportunity_table[key] for key in sorted(self.opportunity_table))
+        self.arbitrage_snapshot = ArbitrageSnapshotModel(self.arbitrage_snapshot.version + 1, self.clock.time(), opportunities, tuple(fresh_exchanges))
+        return
+    
+    def get_arbitrage_snapshot(self):
+        return self.arbitrage_snapshot
+    
+    def add_opportunity_listener(self, listener):
+        # listener is called from the analyzer thread with a list of (OpportunityEvents, opportunity) tuples
+        self.opportunity_listeners.append(listener)
+        return
+    
+    def _notify_opportunity_listeners(self, opportunity_events: list):
+        for listener in self.opportunity_listeners:
+            listener(opportunity_events)
         return
     
     def clear_cross_arbitrage_analyzed_event(self):
@@ -105,7 +205,82 @@ class ArbiSense:
     def wait_for_cross_arbitrage_analyzed_event(self, timeout=None):
         return self.cross_arbitrage_analyzed_event.wait(timeout)
     
+    def enable_depth_verification(self, top_k: int = DepthVerifier.DEFAULT_TOP_K, notional_sizes: tuple = DepthVerifier.DEFAULT_NOTIONAL_SIZES):
+        # Must be called before start(), every new arbitrage snapshot is then handed to the depth verifier
+        self.depth_verifier.set_top_k(top_k)
+        self.depth_verifier.set_notional_sizes(notional_sizes)
+        self.depth_verification_enabled = True
+        return
+    
+    def get_depth_verifications(self):
+        return self.depth_verifier.get_verifications()
+    
+    def enable_triangular_arbitrage(self, profit_percentage_threshold: float = TriangularArbitrageEngine.DEFAULT_PROFIT_PERCENTAGE_THRESHOLD):
+        # Must be called before start(), the services then hand the trading pairs of their ticker responses to
+        # their exchange's engine
+        for exchange, service in self.exchange_services.items():
+            if exchange not in self.triangular_arbitrage_engines:
+                self.triangular_arbitrage_engines[exchange] = TriangularArbitrageEngine(exchange, profit_percentage_threshold)
+                service.add_ticker_listener(self.triangular_arbitrage_engines[exchange].update_prices)
+            else:
+                self.triangular_arbitrage_engines[exchange].set_profit_percentage_threshold(profit_percentage_threshold)
+        return
+    
+    def get_triangular_opportunities(self):
+        return self.triangular_opportunities
+    
+    def add_triangular_opportunity_listener(self, listener):
+        # listener is called from the analyzer thread with a list of (OpportunityEvents, opportunity) tuples
+        self.triangular_opportunity_listeners.append(listener)
+        return
+    
+    def _calculate_triangular_arbitrage(self, fresh_exchanges: list):
+        # Engines of exchanges whose data went stale drop their opportunities until the exchange is fresh again
+        opportunity_events = []
+        for exchange, engine in self.triangular_arbitrage_engines.items():
+            if exchange in fresh_exchanges:
+                opportunity_events += engine.calculate()
+            else:
+                opportunity_events += engine.clear()
+        if len(opportunity_events) == 0:
+            return
+        self.triangular_opportunities = tuple(opportunity for engine in self.triangular_arbitrage_engines.values() for opportunity in engine.get_opportunities())
+        for listener in self.triangular_opportunity_listeners:
+            listener(opportunity_events)
+        return
+    
+    def enable_tick_history(self, folder_path: str = None, compress_rotated_days: bool = False):
+        # Must be called before start(), every snapshot the services publish is then appended to the tick history
+        self.tick_history_settings = (folder_path, compress_rotated_days)
+        return
+    
+    def get_tick_history(self):
+        return self.tick_history
+    
+    def enable_response_recording(self, recording_path: str):
+        # Must be called before start(), every exchange response and stream message is then written to the
+        # recording so the session can be replayed with the ReplayEngine
+        self.recording_path = recording_path
+        return
+    
+    def enable_metrics_endpoint(self, host: str = MetricsServerService.DEFAULT_HOST, port: int = MetricsServerService.DEFAULT_PORT):
+        # Must be called before start(), the pipeline metrics are then served in the Prometheus text format on
+        # http://host:port/metrics
+        self.metrics_endpoint_settings = (host, port)
+        return
+    
+    def get_metrics_server(self):
+        return self.metrics_server
+    
     def start(self):
+        if self.metrics_endpoint_settings is not None:
+            self.metrics_server.start(*self.metrics_endpoint_settings)
+        if self.recording_path is not None:
+            self.response_recorder.start(self.recording_path)
+        if self.tick_history_settings is not None:
+            self.tick_history.start(*self.tick_history_settings)
+        if self.depth_verification_enabled:
+            self.depth_verifier.start()
         self.cross_arbitrage_analyzer_thread_running = True
         self.cross_arbitrage_analyzer_thread.start()
         return
@@ -113,83 +288,90 @@ class ArbiSense:
     def stop(self):
         self.cross_arbitrage_analyzer_thread_running = False
         self.cross_arbitrage_analyzer_thread.join()
+        self.depth_verifier.stop()
         self._stop_exchange_services()
+        self.tick_history.stop()
+        self.response_recorder.stop()
+        self.metrics_server.stop()
         return
     
-    def _detect_common_pairs(self):
-        markets = {
-            Exchanges.BINANCE.value: self.binance_usdt_pairs.keys(),
-            Exchanges.BYBIT.value: self.bybit_usdt_pairs.keys(),
-            Exchanges.KRAKEN.value: self.kraken_usdt_pairs.keys(),
-            Exchanges.KUCOIN.value: self.kucoin_usdt_pairs.keys(),
-            Exchanges.OKX.value: self.okx_usdt_pairs.keys()
-        }
-        self.common_pairs = []
-        for exchange1, exchange2 in self.market_pairs_list:
-            pairs1 = set(markets.get(exchange1, []))
-            pairs2 = set(markets.get(exchange2, []))
-            common_pairs = list(pairs1.intersection(pairs2))
-            self.common_pairs.append(common_pairs)
-            #print(f"Common pairs between {exchange1} and {exchange2}: {common_pairs}")
-        return
+    def _calculate_arbitrage_percentages(self, market_pair_indices: list, dirty_symbol_ids):
+        # Market pairs in market_pair_indices are recomputed for every symbol, the other analyzed market pairs
+        # only for the dirty symbols. Returns the opportunity events in (market pair index, symbol id) order
+        prices, quote_volumes, timestamps = self.price_matrix.get_view()
+        taker_fees = self.price_matrix.get_taker_fees()[:len(prices)]
+        quote_timestamps = self.price_matrix.get_quote_timestamps()[:len(prices)]
+        quote_rates = self.quote_normalizer.get_quote_rates(prices)
+        if len(dirty_symbol_ids) > 0:
+            dirty_symbol_ids = self.quote_normalizer.expand_dirty_symbol_ids(dirty_symbol_ids, len(prices))
+        analyzed_market_pair_indices = [index for index, (first_market, second_market) in enumerate(self.market_pairs_list) if first_market in self.analyzed_exchanges and second_market in self.analyzed_exchanges]
+        full_market_pair_indices = [index for index in market_pair_indices if index in analyzed_market_pair_indices]
+        dirty_market_pair_indices = [index for index in analyzed_market_pair_indices if index not in market_pair_indices]
 
-    def _get_related_data_for_market(self, market):
-        if market == Exchanges.BINANCE.value:
-            return self.binance_usdt_pairs
-        elif market == Exchanges.BYBIT.value:
-            return self.bybit_usdt_pairs
-        elif market == Exchanges.KRAKEN.value:
-            return self.kraken_usdt_pairs
-        elif market == Exchanges.KUCOIN.value:
-            return self.kucoin_usdt_pairs
-        elif market == Exchanges.OKX.value:
-            return self.okx_usdt_pairs
-        else:
-            return None
+        stale_keys = [key for key in self.opportunity_table if key[0] in market_pair_indices]
+        if len(dirty_symbol_ids) > 0 and len(dirty_market_pair_indices) > 0:
+            dirty_symbols = set(dirty_symbol_ids.tolist())
+            stale_keys += [key for key in self.opportunity_table if key[1] in dirty_symbols and key[0] in dirty_market_pair_indices]
+        calculations = [(full_market_pair_indices, None), (dirty_market_pair_indices, dirty_symbol_ids)]
 
-    def _calculate_arbitrage_percentages(self):
-        self.arbitrage_percentages = []
-        for i in range(len(self.market_pairs_list)):
-            first_market, second_market = self.market_pairs_list[i]
-            common_market_pairs = self.common_pairs[i]
-            for symbol in common_market_pairs:
-                first_market_pairs = self._get_related_data_for_market(first_market)
-                second_market_pairs = self._get_related_data_for_market(second_market)
-                first_market_common_pair = first_market_pairs.get(symbol, None)
-                second_market_common_pair = second_market_pairs.get(symbol, None)
-                over_threshold_pairs = {}
-                if first_market_common_pair and second_market_common_pair:
-                    first_market_common_pair_volume = first_market_common_pair.volume_in_quote_currency()
-                    second_market_common_pair_volume = second_market_common_pair.volume_in_quote_currency()
-                    if first_market_common_pair_volume > self.volume_threshold and second_market_common_pair_volume > self.volume_threshold:
-                        first_market_common_pair_price = first_market_common_pair.price
-                        second_market_common_pair_price = second_market_common_pair.price
-                        arbitrage_percentage = (first_market_common_pair_price - second_market_common_pair_price) / first_market_common_pair_price * 100
-                        if arbitrage_percentage < 0 and abs(arbitrage_percentage) > self.arbitrage_percentage_threshold and abs(arbitrage_percentage) < self.DEFAULT_ABSURD_PERCENTAGE_THRESHOLD:
-                            over_threshold_pairs["first_market"] = second_market
-                            over_threshold_pairs["second_market"] = first_market
-                            over_threshold_pairs["symbol"] = symbol
-                            over_threshold_pairs["first_market_price"] = second_market_common_pair.price
-                            over_threshold_pairs["second_market_price"] = first_market_common_pair.price
-                            over_threshold_pairs["arbitrage_percentage"] = abs(arbitrage_percentage)
-                            self.arbitrage_percentages.append(over_threshold_pairs)
-                        elif arbitrage_percentage > 0 and arbitrage_percentage > self.arbitrage_percentage_threshold and arbitrage_percentage < self.DEFAULT_ABSURD_PERCENTAGE_THRESHOLD:
-                            over_threshold_pairs["first_market"] = first_market
-                            over_threshold_pairs["second_market"] = second_market
-                            over_threshold_pairs["symbol"] = symbol
-                            over_threshold_pairs["first_market_price"] = first_market_common_pair.price
-                            over_threshold_pairs["second_market_price"] = second_market_common_pair.price
-                            over_threshold_pairs["arbitrage_percentage"] = arbitrage_percentage
-                            self.arbitrage_percentages.append(over_threshold_pairs)
-        return
-    
-    def _get_pairs_from_services(self):
-        self.binance_usdt_pairs = self.binance_integration_service.get_usdt_pairs_and_clear_event()
-        self.bybit_usdt_pairs = self.bybit_integration_service.get_usdt_pairs_and_clear_event()
-        self.kraken_usdt_pairs = self.kraken_integration_service.get_usdt_pairs_and_clear_event()
-        self.kucoin_usdt_pairs = self.kucoin_integration_service.get_refined_usdt_pairs_and_clear_event()
-        self.okx_usdt_pairs = self.okx_integration_service.get_refined_usdt_pairs_and_clear_event()
-        return
+        exchanges = self.price_matrix.get_exchanges()
+        updated_rows = {}
+        skewed_symbol_ids = [np.zeros(0, dtype=np.intp)]
+        for calculation_market_pair_indices, symbol_ids in calculations:
+            if len(calculation_market_pair_indices) == 0 or (symbol_ids is not None and len(symbol_ids) == 0):
+                continue
+            opportunities = self.spread_engine.calculate(
+                prices,
+                quote_volumes,
+                calculation_market_pair_indices,
+                self.volume_threshold,
+                self.arbitrage_percentage_threshold,
+                self.DEFAULT_ABSURD_PERCENTAGE_THRESHOLD,
+                symbol_ids,
+                taker_fees,
+                quote_rates
+            )
+            if self.max_quote_skew_in_seconds is not None:
+                opportunities, calculation_skewed_symbol_ids = SpreadEngine.filter_quote_skew(opportunities, quote_timestamps, self.max_quote_skew_in_seconds * 1000)
+                skewed_symbol_ids.append(calculation_skewed_symbol_ids)
+            for market_pair_index, symbol_id, high_column, low_column, high_price, low_price, arbitrage_percentage, net_arbitrage_percentage in zip(*(column.tolist() for column in opportunities)):
+                updated_rows[(market_pair_index, symbol_id)] = MappingProxyType({
+                    "first_market": exchanges[high_column],
+                    "second_market": exchanges[low_column],
+                    "symbol": self.symbol_registry.get_canonical_symbol(symbol_id),
+                    "symbol_id": symbol_id,
+                    "first_market_price": high_price,
+                    "second_market_price": low_price,
+                    "first_market_reference_price": float(high_price * quote_rates[symbol_id, high_column]),
+                    "second_market_reference_price": float(low_price * quote_rates[symbol_id, low_column]),
+                    "arbitrage_percentage": arbitrage_percentage,
+                    "net_arbitrage_percentage": net_arbitrage_percentage
+                })
+
+        self.skewed_symbol_ids = np.unique(np.concatenate(skewed_symbol_ids))
+
+        opportunity_events = []
+        for key in stale_keys:
+            if key not in updated_rows:
+                opportunity_events.append((key, OpportunityEvents.REMOVED, self.opportunity_table.pop(key)))
+        for key, opportunity in updated_rows.items():
+            previous_opportunity = self.opportunity_table.get(key)
+            if previous_opportunity is None:
+                opportunity_events.append((key, OpportunityEvents.ADDED, opportunity))
+            elif previous_opportunity != opportunity:
+                opportunity_events.append((key, OpportunityEvents.UPDATED, opportunity))
+            else:
+                continue
+            self.opportunity_table[key] = opportunity
+        opportunity_events.sort(key=lambda opportunity_event: opportunity_event[0])
+        return [(event, opportunity) for key, event, opportunity in opportunity_events]
+    
+    def _refresh_market_data(self, fresh_exchanges: list):
+        # Price changes arrive as dirty symbols from the price matrix, here only the exchanges that went stale or
+        # fresh again are looked at, returns the indices of the market pairs that involve any of them
+        changed_exchanges = [exchange for exchange in self.exchange_services if (exchange in fresh_exchanges) != (exchange in self.analyzed_exchanges)]
+        self.analyzed_exchanges = fresh_exchanges
+        return [index for index, (first_market, second_market) in enumerate(self.market_pairs_list) if first_market in changed_exchanges or second_market in changed_exchanges]
     
     def _initialie_exchange_services(self):
         self.binance_integration_service = BinanceIntegrationService()
@@ -202,6 +384,13 @@ class ArbiSense:
         self.kucoin_integration_service.set_sleep_duration(self.retrieve_period_in_seconds)
         self.okx_integration_service = OKXIntegrationService()
         self.okx_integration_service.set_sleep_duration(self.retrieve_period_in_seconds)
+        self.exchange_services = {
+            Exchanges.BINANCE.value: self.binance_integration_service,
+            Exchanges.BYBIT.value: self.bybit_integration_service,
+            Exchanges.KRAKEN.value: self.kraken_integration_service,
+            Exchanges.KUCOIN.value: self.kucoin_integration_service,
+            Exchanges.OKX.value: self.okx_integration_service
+        }
         return
     
     def _start_exchange_services(self):
@@ -212,24 +401,43 @@ class ArbiSense:
         self.okx_integration_service.start_price_retrieval_thread()
         return
     
-    def _wait_for_price_retrievals(self):
-        self.binance_integration_service.wait_for_price_retrieved_event(self.retrieve_time_out_in_seconds)
-        self.bybit_integration_service.wait_for_price_retrieved_event(self.retrieve_time_out_in_seconds)
-        self.kraken_integration_service.wait_for_price_retrieved_event(self.retrieve_time_out_in_seconds)
-        self.kucoin_integration_service.wait_for_price_retrieved_event(self.retrieve_time_out_in_seconds)
-        self.okx_integration_service.wait_for_price_retrieved_event(self.retrieve_time_out_in_seconds)
-        return (self.binance_integration_service.is_price_retrieved_event_set() and
-                self.bybit_integration_service.is_price_retrieved_event_set() and
-                self.kraken_integration_service.is_price_retrieved_event_set() and
-                self.kucoin_integration_service.is_price_retrieved_event_set() and
-                self.okx_integration_service.is_price_retrieved_event_set())
+    def _get_fresh_exchanges(self):
+        fresh_exchanges = []
+        for exchange, service in self.exchange_services.items():
+            price_data_age_in_seconds = service.get_price_data_age_in_seconds()
+            # Exchanges that have not published yet have no quotes to be stale
+            if service.get_pair_count() > 0:
+                self.quote_staleness_metrics[exchange].observe(price_data_age_in_seconds)
+            if service.get_health_state() != CircuitStates.OPEN and price_data_age_in_seconds <= self.stale_data_threshold_in_seconds:
+                fresh_exchanges.append(exchange)
+        return fresh_exchanges
+    
+    def _get_skipped_exchanges(self, fresh_exchanges: list):
+        skipped_exchanges = []
+        for exchange, service in self.exchange_services.items():
+            if exchange not in fresh_exchanges:
+                health_state = service.get_health_state()
+                skipped_exchanges.append(exchange + (" (stale)" if health_state == CircuitStates.HEALTHY else " (" + health_state.value + ")"))
+        return skipped_exchanges
+    
+    def get_exchange_health_states(self):
+        return {exchange: service.get_health_state() for exchange, service in self.exchange_services.items()}
+    
+    def enable_streaming_mode(self, stream_urls: dict = None):
+        # Must be called before start(), the REST polling path stays active whenever a stream is down
+        stream_urls = stream_urls or {}
+        self.binance_integration_service.enable_streaming(stream_urls.get(Exchanges.BINANCE.value))
+        self.bybit_integration_service.enable_streaming(stream_urls.get(Exchanges.BYBIT.value))
+        self.kraken_integration_service.enable_streaming(stream_urls.get(Exchanges.KRAKEN.value))
+        self.kucoin_integration_service.enable_streaming(stream_urls.get(Exchanges.KUCOIN.value))
+        self.okx_integration_service.enable_streaming(stream_urls.get(Exchanges.OKX.value))
+        return
     
-    def _clear_service_events(self):
-        self.binance_integration_service.clear_price_retrieved_event()
-        self.bybit_integration_service.clear_price_retrieved_event()
-        self.kraken_integration_service.clear_price_retrieved_event()
-        self.kucoin_integration_service.clear_price_retrieved_event()
-        self.okx_integration_service.clear_price_retrieved_event()
+    def set_exchange_base_urls(self, base_urls: dict):
+        # Must be called before start(), points the REST requests of the given exchanges at other hosts such as
+        # the local exchange simulator, keyed by exchange
+        for exchange, base_url in base_urls.items():
+            self.exchange_services[exchange].set_base_url(base_url)
         return
     
     def _stop_exchange_services(self):
@@ -238,5 +446,6 @@ class ArbiSense:
         self.kraken_integration_service.stop_price_retrieval_thread()
         self.kucoin_integration_service.stop_price_retrieval_thread()
         self.okx_integration_service.stop_price_retrieval_thread()
+        SingletonHttpTransport.getInstance().close()
         return
     
\ No newline at end of file
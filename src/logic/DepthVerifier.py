@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from src.utils.logger import SingletonLogger
+import math
+import threading
+import traceback
+
+class DepthVerifier:
+
+    DEFAULT_TOP_K = 5
+    # In the reference asset of the opportunities' reference prices (USDT)
+    DEFAULT_NOTIONAL_SIZES = (1000, 5000, 25000)
+
+    # Second stage after the price filter: fetches the L2 order books of the top-K opportunities of the latest
+    # arbitrage snapshot on both of their exchanges and checks how much of the spread can actually be traded.
+    # Requests only go out while the exchange's rate limiter has the budget for them, candidates that do not
+    # fit are left unverified until a later snapshot. Notional sizes are converted into each pair's own quote
+    # currency with the rate implied by its reference price, candidates without a rate are not verified.
+    def __init__(self,
+                    exchange_services: dict,
+                    top_k: int = DEFAULT_TOP_K,
+                    notional_sizes: tuple = DEFAULT_NOTIONAL_SIZES):
+        self.logger = SingletonLogger.getInstance()
+        self.exchange_services = exchange_services
+        self.top_k = top_k
+        self.notional_sizes = tuple(notional_sizes)
+        # Created by start() so it is sized for the top_k set until then
+        self.executor = None
+
+        self.pending_snapshot = None
+        self.pending_snapshot_condition = threading.Condition()
+        self.verifications = ()
+        self.verifier_thread = None
+        self.verifier_thread_running = False
+        return
+
+    def set_top_k(self, top_k: int):
+        self.top_k = top_k
+        return
+
+    def set_notional_sizes(self, notional_sizes: tuple):
+        self.notional_sizes = tuple(notional_sizes)
+        return
+
+    def start(self):
+        if self.verifier_thread is not None:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.top_k * 2, thread_name_prefix="depth")
+        self.verifier_thread_running = True
+        self.verifier_thread = threading.Thread(target=self._verify_latest_snapshots, daemon=True)
+        self.verifier_thread.start()
+        return
+
+    def stop(self):
+        if self.verifier_thread is None:
+            return
+        self.pending_snapshot_condition.acquire()
+        self.verifier_thread_running = False
+        self.pending_snapshot_condition.notify_all()
+        self.pending_snapshot_condition.release()
+        self.verifier_thread.join()
+        self.verifier_thread = None
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        return
+
+    def submit(self, arbitrage_snapshot):
+        # Only the latest snapshot is kept, a snapshot replaced before the verifier got to it is skipped
+        self.pending_snapshot_condition.acquire()
+        self.pending_snapshot = arbitrage_snapshot
+        self.pending_snapshot_condition.notify_all()
+        self.pending_snapshot_condition.release()
+        return
+
+    def get_verifications(self):
+        return self.verifications
+
+    def _verify_latest_snapshots(self):
+        while True:
+            self.pending_snapshot_condition.acquire()
+            self.pending_snapshot_condition.wait_for(lambda: self.pending_snapshot is not None or not self.verifier_thread_running)
+            arbitrage_snapshot = self.pending_snapshot
+            self.pending_snapshot = None
+            self.pending_snapshot_condition.release()
+            if not self.verifier_thread_running:
+                return
+            try:
+                self.verifications = self.verify(arbitrage_snapshot.opportunities)
+            except Exception as e:
+                self.logger.log_critical("Depth verification failed: " + str(e) + str(traceback.format_exc()))
+
+    def verify(self, opportunities: tuple):
+        candidates = self._select_candidates(opportunities)
+        order_book_keys = list(dict.fromkeys(key for opportunity in candidates for key in ((opportunity["first_market"], opportunity["symbol_id"]), (opportunity["second_market"], opportunity["symbol_id"]))))
+        order_books = dict(zip(order_book_keys, self.executor.map(lambda key: self.exchange_services[key[0]].fetch_order_book(key[1]), order_book_keys)))
+
+        verifications = []
+        for opportunity in candidates:
+            # first_market quotes the higher price, the base is bought on second_market and sold on first_market
+            sell_order_book = order_books[(opportunity["first_market"], opportunity["symbol_id"])]
+            buy_order_book = order_books[(opportunity["second_market"], opportunity["symbol_id"])]
+            if sell_order_book is None or buy_order_book is None:
+                continue
+            quote_rate = self._get_quote_rate(opportunity)
+            executable_quantity, executable_notional, executable_profit = self.calculate_executable_size(buy_order_book.asks, sell_order_book.bids)
+            verifications.append(MappingProxyType({
+                "symbol": opportunity["symbol"],
+                "symbol_id": opportunity["symbol_id"],
+                "buy_market": opportunity["second_market"],
+                "sell_market": opportunity["first_market"],
+                "arbitrage_percentage": opportunity["arbitrage_percentage"],
+                "executable_quantity": executable_quantity,
+                "executable_notional": executable_notional,
+                "executable_profit": executable_profit,
+                "executable_reference_notional": executable_notional * quote_rate,
+                "executable_reference_profit": executable_profit * quote_rate,
+                "notional_spreads": MappingProxyType({notional: self.calculate_notional_spread(buy_order_book.asks, sell_order_book.bids, notional / quote_rate) for notional in self.notional_sizes})
+            }))
+        return tuple(verifications)
+
+    def _select_candidates(self, opportunities: tuple):
+        # Highest ticker spreads first, each candidate reserves its two order book requests from the budget
+        # still available on its exchanges
+        available_tokens = {}
+        candidates = []
+        for opportunity in sorted(opportunities, key=lambda opportunity: opportunity["arbitrage_percentage"], reverse=True):
+            if len(candidates) == self.top_k:
+                break
+            if self._get_quote_rate(opportunity) is None:
+                continue
+            markets = (opportunity["first_market"], opportunity["second_market"])
+            for market in markets:
+                if market not in available_tokens:
+                    available_tokens[market] = self.exchange_services[market].rate_limiter.get_available_tokens()
+            if all(available_tokens[market] >= self.exchange_services[market].get_order_book_weight() for market in markets):
+                for market in markets:
+                    available_tokens[market] -= self.exchange_services[market].get_order_book_weight()
+                candidates.append(opportunity)
+        return candidates
+
+    @staticmethod
+    def _get_quote_rate(opportunity):
+        # Value of one unit of the pair's quote currency in the reference asset, None while it is unknown
+        price = opportunity["second_market_price"]
+        reference_price = opportunity["second_market_reference_price"]
+        if price <= 0 or not math.isfinite(reference_price) or reference_price <= 0:
+            return None
+        return reference_price / price
+
+    @staticmethod
+    def calculate_executable_size(asks: list, bids: list):
+        # Walks the asks of the buy side against the bids of the sell side while the bid is still above the ask,
+        # returns the base quantity, the quote spent on it and the quote profit of selling it
+        ask_index = 0
+        bid_index = 0
+        ask_quantity_left = asks[0][1] if len(asks) > 0 else 0
+        bid_quantity_left = bids[0][1] if len(bids) > 0 else 0
+        quantity = 0.0
+        cost = 0.0
+        proceeds = 0.0
+        while ask_index < len(asks) and bid_index < len(bids) and bids[bid_index][0] > asks[ask_index][0]:
+            traded_quantity = min(ask_quantity_left, bid_quantity_left)
+            quantity += traded_quantity
+            cost += traded_quantity * asks[ask_index][0]
+            proceeds += traded_quantity * bids[bid_index][0]
+            ask_quantity_left -= traded_quantity
+            bid_quantity_left -= traded_quantity
+            if ask_quantity_left <= 0:
+                ask_index += 1
+                ask_quantity_left = asks[ask_index][1] if ask_index < len(asks) else 0
+            if bid_quantity_left <= 0:
+                bid_index += 1
+                bid_quantity_left = bids[bid_index][1] if bid_index < len(bids) else 0
+        return quantity, cost, proceeds - cost
+
+    @staticmethod
+    def calculate_notional_spread(asks: list, bids: list, notional: float):
+        # Volume-weighted spread of buying notional worth of base on the asks and selling it on the bids, in the
+        # same convention as the ticker spread (relative to the sell side). None when either book is too thin
+        quantity = 0.0
+        cost = 0.0
+        for price, level_quantity in asks:
+            traded_quantity = min(level_quantity, (notional - cost) / price)
+            quantity += traded_quantity
+            cost += traded_quantity * price
+            if cost >= notional * (1 - 1e-9):
+                break
+        if quantity == 0 or cost < notional * (1 - 1e-9):
+            return None
+        quantity_left = quantity
+        proceeds = 0.0
+        for price, level_quantity in bids:
+            traded_quantity = min(level_quantity, quantity_left)
+            proceeds += traded_quantity * price
+            quantity_left -= traded_quantity
+            if quantity_left <= quantity * 1e-9:
+                break
+        if quantity_left > quantity * 1e-9:
+            return None
+        return (proceeds - cost) / proceeds * 100
@@ -86,7 +86,7 @@ class NewScout:
             if current_time - arbitrage_scout_timer > self.arbitrage_notify_period * 60 * 1000:
                 arbitrage_analyzed = self.arbisense.wait_for_cross_arbitrage_analyzed_event(int((self.arbisense.DEFAULT_PERIOD * 1.5) * 1000))
                 if arbitrage_analyzed:
-                    arb_percentages = self.arbisense.arbitrage_percentages
+                    arb_percentages = self.arbisense.get_arbitrage_snapshot().opportunities
                     if len(arb_percentages) > 0 and not self.telegram_connection_service.is_sleeping_for_retry_after:
                         arbitrage_message = self._form_arbitrage_message(arb_percentages)
                         self.telegram_connection_service.send_message(arbitrage_message)
@@ -0,0 +1,85 @@
+import warnings
+import numpy as np
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+
+class QuoteNormalizer:
+
+    DEFAULT_REFERENCE_ASSET = "USDT"
+
+    # Converts price matrix rows quoted in any currency into a common reference asset with the cross rates of the
+    # same price snapshot. The quote currency of every row and the conversion pair of every quote, (quote, reference)
+    # or the inverted (reference, quote), are looked up once when new symbols show up, so a conversion is two gathers
+    # on the price matrix. An exchange that does not list a quote's conversion pair borrows the median rate of the
+    # exchanges that do.
+    def __init__(self, reference_asset: str = DEFAULT_REFERENCE_ASSET):
+        self.symbol_registry = SingletonSymbolRegistry.getInstance()
+        self.reference_asset = reference_asset
+
+        self.quote_assets = []
+        self.quote_indices = {}
+        self.row_quote_indices = np.zeros(0, dtype=np.intp)
+        # Per quote, the symbol id of its conversion pair or -1 while none is registered
+        self.quote_rate_symbol_ids = np.zeros(0, dtype=np.int64)
+        self.quote_rate_inverted = np.zeros(0, dtype=bool)
+        self.indexed_symbol_count = 0
+        return
+
+    def get_reference_asset(self):
+        return self.reference_asset
+
+    def get_quote_rates(self, prices: np.ndarray):
+        # Value of one unit of each row's quote in the reference asset, in the shape of prices (symbols × exchanges).
+        # NaN where no exchange quotes the conversion pair
+        self._index_new_symbols(len(prices))
+        quote_rates = np.full((len(self.quote_assets), prices.shape[1]), np.nan)
+        resolved_mask = (self.quote_rate_symbol_ids >= 0) & (self.quote_rate_symbol_ids < len(prices))
+        with np.errstate(divide="ignore"):
+            resolved_prices = prices[self.quote_rate_symbol_ids[resolved_mask]]
+            quote_rates[resolved_mask] = np.where(self.quote_rate_inverted[resolved_mask][:, None], 1 / resolved_prices, resolved_prices)
+        quote_rates[~np.isfinite(quote_rates) | (quote_rates <= 0)] = np.nan
+        reference_index = self.quote_indices.get(self.reference_asset)
+        if reference_index is not None:
+            quote_rates[reference_index] = 1.0
+        with warnings.catch_warnings():
+            # Quotes no exchange can convert stay NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            median_rates = np.nanmedian(quote_rates, axis=1) if prices.shape[1] > 0 else np.zeros(len(self.quote_assets))
+        quote_rates = np.where(np.isnan(quote_rates), median_rates[:, None], quote_rates)
+        return quote_rates[self.row_quote_indices[:len(prices)]]
+
+    def expand_dirty_symbol_ids(self, dirty_symbol_ids: np.ndarray, symbol_count: int):
+        # A changed conversion pair changes the reference value of every row in its quote, those rows are added
+        self._index_new_symbols(symbol_count)
+        dirty_quote_mask = np.isin(self.quote_rate_symbol_ids, dirty_symbol_ids)
+        if not dirty_quote_mask.any():
+            return dirty_symbol_ids
+        return np.union1d(dirty_symbol_ids, np.flatnonzero(dirty_quote_mask[self.row_quote_indices[:symbol_count]]))
+
+    def _index_new_symbols(self, symbol_count: int):
+        if symbol_count <= self.indexed_symbol_count:
+            return
+        new_quote_indices = np.empty(symbol_count - self.indexed_symbol_count, dtype=np.intp)
+        for position, symbol_id in enumerate(range(self.indexed_symbol_count, symbol_count)):
+            base, quote = self.symbol_registry.get_canonical_pair(symbol_id)
+            quote_index = self.quote_indices.get(quote)
+            if quote_index is None:
+                quote_index = len(self.quote_assets)
+                self.quote_assets.append(quote)
+                self.quote_indices[quote] = quote_index
+            new_quote_indices[position] = quote_index
+        self.row_quote_indices = np.concatenate((self.row_quote_indices, new_quote_indices))
+        self.indexed_symbol_count = symbol_count
+
+        # New symbols can be the conversion pair of a quote that had none so far
+        quote_rate_symbol_ids = np.full(len(self.quote_assets), -1, dtype=np.int64)
+        quote_rate_inverted = np.zeros(len(self.quote_assets), dtype=bool)
+        for quote_index, quote in enumerate(self.quote_assets):
+            symbol_id = self.symbol_registry.get_symbol_id_for_pair(quote, self.reference_asset)
+            if symbol_id is None:
+                symbol_id = self.symbol_registry.get_symbol_id_for_pair(self.reference_asset, quote)
+                quote_rate_inverted[quote_index] = symbol_id is not None
+            if symbol_id is not None and symbol_id < symbol_count:
+                quote_rate_symbol_ids[quote_index] = symbol_id
+        self.quote_rate_symbol_ids = quote_rate_symbol_ids
+        self.quote_rate_inverted = quote_rate_inverted
+        return
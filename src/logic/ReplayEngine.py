@@ -0,0 +1,73 @@
+import time
+import traceback
+from src.utils.clock import SingletonClock
+from src.utils.logger import SingletonLogger
+from src.utils.responserecorder import ResponseRecorder
+
+class ReplayEngine:
+
+    # Drives an ArbiSense from recordings of the ResponseRecorder instead of the live exchanges. Every record goes
+    # through its exchange service's own parsers on a simulated clock set to the time it was recorded at and is
+    # followed by an analysis pass, so the snapshots, listeners and engines see the updates of the recorded session
+    # in the same order. Without a speed the replay runs as fast as the analysis allows, with one the gaps between
+    # the records are waited out divided by the speed.
+    def __init__(self, arbisense, recording_paths: list, speed: float = None):
+        self.arbisense = arbisense
+        self.recording_paths = recording_paths
+        self.speed = speed
+        self.clock = SingletonClock.getInstance()
+        self.logger = SingletonLogger.getInstance()
+        self.replayed_record_count = 0
+        self.failed_record_count = 0
+        return
+
+    def run(self, start_time: float = None, end_time: float = None):
+        # start_time and end_time are recording times in epoch seconds, returns the number of replayed records
+        exchange_services = self.arbisense.exchange_services
+        for service in exchange_services.values():
+            if service.symbol_index is None:
+                service.load_cached_rulebook()
+        first_record_time = None
+        first_wall_time = None
+        try:
+            for record in ResponseRecorder.read_merged_records(self.recording_paths):
+                record_time = record["time"]
+                if start_time is not None and record_time < start_time:
+                    continue
+                if end_time is not None and record_time >= end_time:
+                    break
+                service = exchange_services.get(record["exchange"])
+                if service is None:
+                    continue
+                if self.speed is not None:
+                    # Paced against the first record so the sleeps do not add up their overshoot
+                    if first_record_time is None:
+                        first_record_time = record_time
+                        first_wall_time = time.monotonic()
+                    sleep_duration = first_wall_time + (record_time - first_record_time) / self.speed - time.monotonic()
+                    if sleep_duration > 0:
+                        time.sleep(sleep_duration)
+                self.clock.set_simulated_time(record_time)
+                self._replay_record(service, record)
+                self.arbisense.analyze([record["exchange"]], print_status=False)
+        finally:
+            self.clock.use_system_time()
+        return self.replayed_record_count
+
+    def get_replayed_record_count(self):
+        return self.replayed_record_count
+
+    def get_failed_record_count(self):
+        return self.failed_record_count
+
+    def _replay_record(self, service, record: dict):
+        try:
+            if record["kind"] == ResponseRecorder.RESPONSE:
+                service.process_recorded_response(record["url"], record["body"].encode("utf-8"))
+            else:
+                service.process_recorded_stream_message(record["body"])
+            self.replayed_record_count += 1
+        except Exception as e:
+            self.failed_record_count += 1
+            self.logger.log_critical("Replay of a " + record["exchange"] + " record failed: " + str(e) + str(traceback.format_exc()))
+        return
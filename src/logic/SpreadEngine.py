@@ -0,0 +1,89 @@
+import numpy as np
+
+class SpreadEngine:
+
+    # Computes the spreads of every requested market pair over every symbol in one batched pass on the
+    # PriceMatrix arrays. A symbol is only compared on a market pair when both exchanges quote it, which
+    # is what the common pair detection did, since missing prices are NaN and missing volumes are zero.
+    def __init__(self, exchanges: list, market_pairs: list):
+        self.exchanges = list(exchanges)
+        self.market_pairs = list(market_pairs)
+        self.first_columns = np.array([self.exchanges.index(first_market) for first_market, second_market in self.market_pairs], dtype=np.intp)
+        self.second_columns = np.array([self.exchanges.index(second_market) for first_market, second_market in self.market_pairs], dtype=np.intp)
+        return
+
+    def calculate(self,
+                    prices: np.ndarray,
+                    quote_volumes: np.ndarray,
+                    market_pair_indices: list,
+                    volume_threshold: float,
+                    arbitrage_percentage_threshold: float,
+                    absurd_percentage_threshold: float,
+                    symbol_ids: np.ndarray = None,
+                    taker_fees: np.ndarray = None,
+                    quote_rates: np.ndarray = None):
+        # symbol_ids limits the pass to those rows of the matrix, all symbols are compared when it is None.
+        # With taker_fees the arbitrage threshold applies to the spread left after paying the taker fee on both
+        # legs, the absurd threshold always checks the gross spread of the quotes. quote_rates convert the quote
+        # volumes into the reference asset the volume threshold is given in, so rows quoted in other currencies are
+        # filtered on the same scale, rows without a rate never pass.
+        # Returns the opportunities sorted by market pair position and symbol id as
+        # (market_pair_indices, symbol_ids, high_columns, low_columns, high_prices, low_prices, percentages, net_percentages),
+        # the high side is the exchange quoting the higher price and percentages are always positive
+        market_pair_indices = np.asarray(market_pair_indices, dtype=np.intp)
+        if symbol_ids is not None:
+            prices = prices[symbol_ids]
+            quote_volumes = quote_volumes[symbol_ids]
+            taker_fees = taker_fees[symbol_ids] if taker_fees is not None else None
+            quote_rates = quote_rates[symbol_ids] if quote_rates is not None else None
+        if quote_rates is not None:
+            quote_volumes = quote_volumes * quote_rates
+        first_columns = self.first_columns[market_pair_indices]
+        second_columns = self.second_columns[market_pair_indices]
+
+        # Market pairs on the rows and symbols on the columns, so the hits come out grouped by market pair
+        first_prices = prices.T[first_columns]
+        second_prices = prices.T[second_columns]
+        volume_mask = (quote_volumes.T[first_columns] > volume_threshold) & (quote_volumes.T[second_columns] > volume_threshold)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percentages = (first_prices - second_prices) / first_prices * 100
+            absolute_percentages = np.abs(percentages)
+            if taker_fees is None:
+                net_percentages = absolute_percentages
+            else:
+                # Selling on the high side pays the fee out of the proceeds, buying on the low side adds it to the cost.
+                # Relative to the first market's price like the gross spread, so zero fees give the gross spread
+                first_fees = taker_fees.T[first_columns]
+                second_fees = taker_fees.T[second_columns]
+                reversed_pairs = percentages < 0
+                high_proceeds = np.where(reversed_pairs, second_prices * (1 - second_fees), first_prices * (1 - first_fees))
+                low_costs = np.where(reversed_pairs, first_prices * (1 + first_fees), second_prices * (1 + second_fees))
+                net_percentages = (high_proceeds - low_costs) / first_prices * 100
+        opportunity_mask = volume_mask & (percentages != 0) & (net_percentages > arbitrage_percentage_threshold) & (absolute_percentages < absurd_percentage_threshold)
+
+        pair_positions, rows = np.nonzero(opportunity_mask)
+        reversed_mask = percentages[pair_positions, rows] < 0
+        first_hit_columns = first_columns[pair_positions]
+        second_hit_columns = second_columns[pair_positions]
+        first_hit_prices = first_prices[pair_positions, rows]
+        second_hit_prices = second_prices[pair_positions, rows]
+        return (market_pair_indices[pair_positions],
+                rows if symbol_ids is None else symbol_ids[rows],
+                np.where(reversed_mask, second_hit_columns, first_hit_columns),
+                np.where(reversed_mask, first_hit_columns, second_hit_columns),
+                np.where(reversed_mask, second_hit_prices, first_hit_prices),
+                np.where(reversed_mask, first_hit_prices, second_hit_prices),
+                absolute_percentages[pair_positions, rows],
+                net_percentages[pair_positions, rows])
+
+    @staticmethod
+    def filter_quote_skew(opportunities: tuple, quote_timestamps: np.ndarray, max_quote_skew_in_ms: float):
+        # Drops the opportunities of calculate() whose two legs were quoted further apart in time than
+        # max_quote_skew_in_ms, a spread between a fresh quote and one from seconds earlier may just be the price
+        # moving in between. quote_timestamps has the layout of the whole price matrix. Returns the remaining
+        # opportunities in the same layout and the symbol ids of the dropped ones
+        market_pair_indices, symbol_ids, high_columns, low_columns = opportunities[:4]
+        quote_skews = np.abs(quote_timestamps[symbol_ids, high_columns] - quote_timestamps[symbol_ids, low_columns])
+        in_sync_mask = quote_skews <= max_quote_skew_in_ms
+        return tuple(column[in_sync_mask] for column in opportunities), symbol_ids[~in_sync_mask]
@@ -0,0 +1,204 @@
+import math
+import threading
+import numpy as np
+from types import MappingProxyType
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.services.PriceMatrixService import SingletonPriceMatrix
+from src.data.OpportunityEvents import OpportunityEvents
+
+class TriangularArbitrageEngine:
+
+    DEFAULT_PROFIT_PERCENTAGE_THRESHOLD = 0.1
+    DEFAULT_ABSURD_PERCENTAGE_THRESHOLD = 10
+    DEFAULT_PAIR_CAPACITY = 1024
+
+    # Currency graph of one exchange built from all of its trading pairs. Currencies are the nodes and every pair is
+    # an edge, walking base -> quote multiplies by the price and quote -> base divides by it, so with log prices as
+    # edge weights a cycle A -> B -> C -> A is profitable when its weights add up to more than zero (a negative cycle
+    # of the -log weights). Cycles are kept to the triangles of the graph, which are enumerated once when a pair
+    # first shows up, and every triangle is indexed under its three pairs so a price update only recomputes the
+    # triangles that go through the changed pairs.
+    def __init__(self,
+                    exchange: str,
+                    profit_percentage_threshold: float = DEFAULT_PROFIT_PERCENTAGE_THRESHOLD,
+                    absurd_percentage_threshold: float = DEFAULT_ABSURD_PERCENTAGE_THRESHOLD,
+                    pair_capacity: int = DEFAULT_PAIR_CAPACITY):
+        self.exchange = exchange
+        self.profit_percentage_threshold = profit_percentage_threshold
+        self.absurd_percentage_threshold = absurd_percentage_threshold
+        self.symbol_registry = SingletonSymbolRegistry.getInstance()
+        self.price_matrix = SingletonPriceMatrix.getInstance()
+        self.exchange_column = self.price_matrix.get_exchange_index(exchange)
+        self.engine_lock = threading.Lock()
+
+        # Pairs get dense columns in the order they are first seen
+        self.pair_columns = {}
+        self.pair_symbol_ids = np.zeros(pair_capacity, dtype=np.int64)
+        self.log_prices = np.full(pair_capacity, np.nan)
+        self.pair_count = 0
+
+        # currency -> {neighbour currency: (pair column, +1 when the currency is the pair's base, -1 otherwise)}
+        self.currency_edges = {}
+        self.triangle_currencies = []
+        self.triangle_column_list = []
+        self.triangle_direction_list = []
+        self.triangle_columns = np.zeros((0, 3), dtype=np.intp)
+        self.triangle_directions = np.zeros((0, 3))
+        self.triangle_arrays_outdated = False
+        self.pair_triangles = {}
+
+        self.dirty_columns = set()
+        # Opportunities keyed by triangle index
+        self.opportunity_table = {}
+        return
+
+    def set_profit_percentage_threshold(self, profit_percentage_threshold: float):
+        self.profit_percentage_threshold = profit_percentage_threshold
+        return
+
+    def update_prices(self, tickers: list):
+        # tickers are the (symbol_id, symbol, price, volume) records of the exchange's ticker decoder, pairs seen for the
+        # first time are added to the graph along with the triangles they close
+        count = len(tickers)
+        if count == 0:
+            return
+        self.engine_lock.acquire()
+        columns = np.empty(count, dtype=np.intp)
+        prices = np.empty(count)
+        for index, (symbol_id, symbol, price, volume) in enumerate(tickers):
+            column = self.pair_columns.get(symbol_id)
+            if column is None:
+                column = self._add_pair(symbol_id)
+            columns[index] = column
+            prices[index] = price
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_prices = np.where(prices > 0, np.log(prices), np.nan)
+        changed_mask = self.log_prices[columns] != log_prices
+        self.dirty_columns.update(columns[changed_mask].tolist())
+        self.log_prices[columns] = log_prices
+        self.engine_lock.release()
+        return
+
+    def calculate(self):
+        # Recomputes the triangles of the pairs changed since the previous call, returns the opportunity events
+        # in triangle order as (OpportunityEvents, opportunity) tuples
+        self.engine_lock.acquire()
+        triangle_lists = [self.pair_triangles[column] for column in self.dirty_columns if column in self.pair_triangles]
+        self.dirty_columns = set()
+        if len(triangle_lists) == 0:
+            self.engine_lock.release()
+            return []
+        if self.triangle_arrays_outdated:
+            self.triangle_columns = np.array(self.triangle_column_list, dtype=np.intp)
+            self.triangle_directions = np.array(self.triangle_direction_list, dtype=np.float64)
+            self.triangle_arrays_outdated = False
+        triangles = np.unique(np.concatenate(triangle_lists))
+        columns = self.triangle_columns[triangles]
+        log_sums = (self.log_prices[columns] * self.triangle_directions[triangles]).sum(axis=1)
+        symbol_ids = self.pair_symbol_ids[columns]
+        self.engine_lock.release()
+
+        taker_fees = self.price_matrix.get_taker_fees()
+        cycle_fees = np.zeros(columns.shape)
+        known_mask = symbol_ids < len(taker_fees)
+        cycle_fees[known_mask] = taker_fees[symbol_ids[known_mask], self.exchange_column]
+        with np.errstate(invalid="ignore"):
+            # Every leg pays the taker fee out of what it receives
+            net_log_sums = np.abs(log_sums) + np.log1p(-cycle_fees).sum(axis=1)
+            percentages = np.expm1(np.abs(log_sums)) * 100
+            net_percentages = np.expm1(net_log_sums) * 100
+            opportunity_mask = np.isfinite(log_sums) & (net_log_sums > math.log1p(self.profit_percentage_threshold / 100)) & (percentages < self.absurd_percentage_threshold)
+
+        updated_rows = {}
+        for position in np.flatnonzero(opportunity_mask).tolist():
+            triangle = int(triangles[position])
+            updated_rows[triangle] = self._build_opportunity(triangle, log_sums[position] > 0, float(percentages[position]), float(net_percentages[position]))
+
+        table_triangles = np.fromiter(self.opportunity_table.keys(), dtype=np.intp, count=len(self.opportunity_table))
+        stale_triangles = table_triangles[np.isin(table_triangles, triangles)].tolist()
+        opportunity_events = []
+        for triangle in stale_triangles:
+            if triangle not in updated_rows:
+                opportunity_events.append((triangle, OpportunityEvents.REMOVED, self.opportunity_table.pop(triangle)))
+        for triangle, opportunity in updated_rows.items():
+            previous_opportunity = self.opportunity_table.get(triangle)
+            if previous_opportunity is None:
+                opportunity_events.append((triangle, OpportunityEvents.ADDED, opportunity))
+            elif previous_opportunity != opportunity:
+                opportunity_events.append((triangle, OpportunityEvents.UPDATED, opportunity))
+            else:
+                continue
+            self.opportunity_table[triangle] = opportunity
+        opportunity_events.sort(key=lambda opportunity_event: opportunity_event[0])
+        return [(event, opportunity) for triangle, event, opportunity in opportunity_events]
+
+    def clear(self):
+        # Drops the opportunities, e.g. when the exchange's data went stale, and marks every pair so the next
+        # calculation starts from the whole graph. Returns the removal events
+        self.engine_lock.acquire()
+        self.dirty_columns = set(range(self.pair_count))
+        self.engine_lock.release()
+        opportunity_events = [(OpportunityEvents.REMOVED, self.opportunity_table[triangle]) for triangle in sorted(self.opportunity_table)]
+        self.opportunity_table = {}
+        return opportunity_events
+
+    def get_opportunities(self):
+        return tuple(self.opportunity_table[triangle] for triangle in sorted(self.opportunity_table))
+
+    def get_pair_count(self):
+        return self.pair_count
+
+    def get_triangle_count(self):
+        return len(self.triangle_currencies)
+
+    def _build_opportunity(self, triangle: int, forward: bool, percentage: float, net_percentage: float):
+        first_currency, second_currency, third_currency = self.triangle_currencies[triangle]
+        columns = self.triangle_column_list[triangle]
+        if not forward:
+            second_currency, third_currency = third_currency, second_currency
+            columns = (columns[2], columns[1], columns[0])
+        return MappingProxyType({
+            "exchange": self.exchange,
+            "path": (first_currency, second_currency, third_currency, first_currency),
+            "symbols": tuple(self.symbol_registry.get_canonical_symbol(int(self.pair_symbol_ids[column])) for column in columns),
+            "profit_percentage": percentage,
+            "net_profit_percentage": net_percentage
+        })
+
+    def _add_pair(self, symbol_id: int):
+        # Called with the engine lock held
+        base, quote = self.symbol_registry.get_canonical_pair(symbol_id)
+        column = self.pair_count
+        if column == len(self.log_prices):
+            self.pair_symbol_ids = np.concatenate((self.pair_symbol_ids, np.zeros(column, dtype=np.int64)))
+            self.log_prices = np.concatenate((self.log_prices, np.full(column, np.nan)))
+        self.pair_symbol_ids[column] = symbol_id
+        self.pair_columns[symbol_id] = column
+        self.pair_count += 1
+
+        base_edges = self.currency_edges.setdefault(base, {})
+        quote_edges = self.currency_edges.setdefault(quote, {})
+        if quote in base_edges:
+            # Another pair already links the two currencies, it keeps the edge
+            return column
+
+        # Every currency linked to both ends of the new pair closes a triangle base -> quote -> third -> base
+        new_triangles = []
+        for third_currency in base_edges.keys() & quote_edges.keys():
+            quote_column, quote_direction = quote_edges[third_currency]
+            third_column, third_direction = self.currency_edges[third_currency][base]
+            new_triangles.append(((base, quote, third_currency), (column, quote_column, third_column), (1, quote_direction, third_direction)))
+        base_edges[quote] = (column, 1)
+        quote_edges[base] = (column, -1)
+
+        for currencies, columns, directions in new_triangles:
+            triangle = len(self.triangle_currencies)
+            self.triangle_currencies.append(currencies)
+            self.triangle_column_list.append(columns)
+            self.triangle_direction_list.append(directions)
+            for triangle_column in columns:
+                self.pair_triangles.setdefault(triangle_column, []).append(triangle)
+        if len(new_triangles) > 0:
+            self.triangle_arrays_outdated = True
+            self.dirty_columns.add(column)
+        return column
@@ -0,0 +1,24 @@
+class ArbitrageSnapshotModel:
+
+    # One analysis result, published by replacing the reference so readers never see a half written result
+    __slots__ = ("version", "timestamp", "opportunities", "fresh_exchanges")
+
+    def __init__(self,
+                    version: int,
+                    timestamp: float,
+                    opportunities: tuple,
+                    fresh_exchanges: tuple):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "timestamp", timestamp)
+        object.__setattr__(self, "opportunities", opportunities)
+        object.__setattr__(self, "fresh_exchanges", fresh_exchanges)
+        return
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ArbitrageSnapshotModel is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ArbitrageSnapshotModel is immutable")
+
+    def __str__(self):
+        return f"Arbitrage snapshot v{self.version} with {len(self.opportunities)} opportunities from {', '.join(self.fresh_exchanges)}"
@@ -0,0 +1,27 @@
+class OrderBookModel:
+
+    # Top levels of one L2 order book, bids and asks are (price, quantity) tuples from the best level outwards
+    __slots__ = ("symbol", "exchange", "bids", "asks", "timestamp")
+
+    # timestamp is always in milliseconds
+    def __init__(self,
+                    symbol: str,
+                    exchange: str,
+                    bids: list,
+                    asks: list,
+                    timestamp: int):
+        self.symbol = symbol
+        self.exchange = exchange
+        self.bids = bids
+        self.asks = asks
+        self.timestamp = timestamp
+        return
+
+    def best_bid(self):
+        return self.bids[0][0] if len(self.bids) > 0 else None
+
+    def best_ask(self):
+        return self.asks[0][0] if len(self.asks) > 0 else None
+
+    def __str__(self):
+        return f"{self.symbol} order book in ({self.exchange}): {len(self.bids)} bids from {self.best_bid()}, {len(self.asks)} asks from {self.best_ask()}"
@@ -1,19 +1,23 @@
-import pandas as pd
-
 class PriceDataModel:
 
-    # timestamp is always in milliseconds
+    # One record per ticker per update, slotted so the thousands created every cycle carry no __dict__
+    __slots__ = ("symbol", "price", "exchange", "timestamp", "volume", "server_timestamp")
+
+    # timestamp is the local receive time from Clock.timestamp_in_ms(), server_timestamp the exchange's time of the
+    # response or stream message the record came from where the exchange sends one, both in epoch milliseconds
     def __init__(self,
                     symbol: str,
                     price: float,
                     exchange: str,
-                    timestamp: str,
-                    volume: float = None):
+                    timestamp: int,
+                    volume: float = None,
+                    server_timestamp: int = None):
         self.symbol = symbol
         self.price = float(price)
         self.exchange = exchange
         self.timestamp = timestamp
         self.volume = float(volume)
+        self.server_timestamp = server_timestamp
         return
     
     def setVolume(self, volume):
@@ -21,10 +25,12 @@ class PriceDataModel:
         return
     
     def pretty_timestamp(self):
+        # pandas is only loaded once a human-readable timestamp is actually asked for
+        import pandas as pd
         return pd.to_datetime(int(self.timestamp), unit='ms')
     
     def __str__(self):
         return f"{self.symbol} price at {self.pretty_timestamp()}: {self.price} with a volume of ({self.volume}) in ({self.exchange})"
     
     def volume_in_quote_currency(self):
-        return self.price * self.volume
\ No newline at end of file
+        return self.price * self.volume
@@ -0,0 +1,30 @@
+class SymbolRuleModel:
+
+    # Only the rulebook fields the services actually use, kept per symbol instead of the raw exchange JSON
+    __slots__ = ("symbol", "trading", "base", "quote", "tick_size", "taker_fee", "stream_symbol", "symbol_id")
+
+    def __init__(self,
+                    symbol: str,
+                    trading: bool,
+                    base: str,
+                    quote: str,
+                    tick_size: float,
+                    taker_fee: float = 0.0,
+                    stream_symbol: str = None,
+                    symbol_id: int = None):
+        self.symbol = symbol
+        self.trading = trading
+        self.base = base
+        self.quote = quote
+        self.tick_size = tick_size
+        # Fraction of the traded amount, 0.001 is 0.1%
+        self.taker_fee = taker_fee
+        self.stream_symbol = stream_symbol if stream_symbol is not None else symbol
+        self.symbol_id = symbol_id
+        return
+
+    def is_usdt_pair(self):
+        return self.base == "USDT" or self.quote == "USDT"
+
+    def __str__(self):
+        return f"{self.symbol} ({self.base}/{self.quote}) trading: {self.trading} tick size: {self.tick_size} taker fee: {self.taker_fee}"
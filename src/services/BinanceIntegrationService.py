@@ -1,34 +1,90 @@
-import requests
 from src.utils.logger import SingletonLogger
+from src.services.HttpTransportService import SingletonHttpTransport, HttpRequestFailedException
+from src.services.WebSocketStreamService import WebSocketStreamService
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.services.PriceUpdateNotifierService import SingletonPriceUpdateNotifier
+from src.services.PriceMatrixService import SingletonPriceMatrix
+from src.services.TickHistoryService import SingletonTickHistory
 from src.utils.fileutils import FileUtils
+from src.utils.rulebookcache import RulebookCache
+from src.utils.circuitbreaker import CircuitBreaker
+from src.utils.ratelimiter import RateLimiter
+from src.utils.tickerdecoders import TickerDecoders
+from src.utils.orderbookdecoders import OrderBookDecoders
+from src.utils.clock import SingletonClock
+from src.utils.metrics import PipelineMetrics
 from src.models.PriceDataModel import PriceDataModel
+from src.models.OrderBookModel import OrderBookModel
+from src.models.SymbolRuleModel import SymbolRuleModel
 from src.data.Exchanges import Exchanges
+from src.data.CircuitStates import CircuitStates
 import time
 import threading
 import traceback
+import json
+import orjson
+from types import MappingProxyType
 
 class BinanceEndpoints:
     _BASE_URL = "https://api.binance.com/api/v3"
     _EXCHANGE_INFO = "/exchangeInfo"
     _24HR_TICKER_PRICE_CHANGE = "/ticker/24hr"
+    _STREAM_URL = "wss://stream.binance.com:9443/ws"
+    _STREAM_ALL_MINI_TICKERS = "!miniTicker@arr"
+    _WEIGHT_LIMIT = 6000
+    _WEIGHT_LIMIT_WINDOW_IN_SECONDS = 60
+    _USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+    _EXCHANGE_INFO_WEIGHT = 20
+    _24HR_TICKER_PRICE_CHANGE_WEIGHT = 80
+    _DEPTH = "/depth"
+    _DEPTH_LIMIT = 20
+    _DEPTH_WEIGHT = 5
+    # exchangeInfo carries no fees, the base tier taker fee is used for every symbol
+    _DEFAULT_TAKER_FEE = 0.001
 
 class BinanceIntegrationService:
 
     INTERVAL_IN_SEC = 5
     def __init__(self):
         self.logger = SingletonLogger.getInstance()
+        self.http_transport = SingletonHttpTransport.getInstance()
+        self.rate_limiter = RateLimiter(Exchanges.BINANCE.value,
+                                        BinanceEndpoints._WEIGHT_LIMIT,
+                                        BinanceEndpoints._WEIGHT_LIMIT_WINDOW_IN_SECONDS,
+                                        used_weight_header=BinanceEndpoints._USED_WEIGHT_HEADER)
+        self.http_transport.set_rate_limiter(Exchanges.BINANCE.value, self.rate_limiter)
+        self.symbol_registry = SingletonSymbolRegistry.getInstance()
+        self.price_update_notifier = SingletonPriceUpdateNotifier.getInstance()
+        self.price_matrix = SingletonPriceMatrix.getInstance()
+        self.tick_history = SingletonTickHistory.getInstance()
+        self.clock = SingletonClock.getInstance()
+        self.clock_offset_estimator = self.clock.get_offset_estimator(Exchanges.BINANCE.value)
+        self.parse_duration_metric = PipelineMetrics.parse_duration().labels(Exchanges.BINANCE.value)
+        self.snapshot_size_metric = PipelineMetrics.snapshot_size().labels(Exchanges.BINANCE.value)
+        self.base_url = BinanceEndpoints._BASE_URL
         
         self.rulebooks_folder_path = FileUtils.join_paths(FileUtils.current_directory(), "rulebooks")
         FileUtils.create_directory_if_not_exists(self.rulebooks_folder_path)
         
-        self.rulebook_path = FileUtils.join_paths(self.rulebooks_folder_path, "binance_symbol_rules.json")
+        self.rulebook_path = FileUtils.join_paths(self.rulebooks_folder_path, "binance_symbol_rules.rulebook")
+        self.legacy_rulebook_path = FileUtils.join_paths(self.rulebooks_folder_path, "binance_symbol_rules.json")
+        self.rulebook_cache = RulebookCache(self.rulebook_path, self.legacy_rulebook_path, self._build_legacy_symbol_index)
 
-        self.exchange_info = None
+        self.symbol_index = None
+        self.trading_symbols = frozenset()
+        self.trading_symbol_ids = {}
+        self.exchange_info_update_time = 0
 
-        self.usdt_pairs_dictionary = {}
-        self.usdt_pairs_dictionary_lock = threading.Lock()
+        # Live pairs updated in place by the publishes, readers get a read-only copy made when they first ask for it
+        self.pairs_dictionary = {}
+        self.pairs_snapshot = MappingProxyType({})
+        self.pairs_dictionary_lock = threading.Lock()
+        self.last_price_update_time = 0
+        self.ticker_listeners = []
+        self.circuit_breaker = CircuitBreaker(Exchanges.BINANCE.value)
         
         self._initialize_price_retrieval_thread_params()
+        self._initialize_stream_params()
         return
     
     '''   THREAD MANAGEMENT   '''
@@ -47,7 +103,11 @@ class BinanceIntegrationService:
     
     def stop_price_retrieval_thread(self):
         self.price_retrieval_thread_running = False
+        self.rate_limiter.stop()
         self.price_retrieval_thread.join()
+        self.rulebook_cache.stop_refresh_thread()
+        if self.stream_service is not None:
+            self.stream_service.stop()
         self.price_retrieved_event.set()
         return
 
@@ -65,122 +125,325 @@ class BinanceIntegrationService:
         self.price_retrieved_event.wait(timeout)
         return
 
-    def get_usdt_pairs_and_clear_event(self):
-        usdt_pairs = self.get_usdt_pairs_dictionary()
+    def get_pairs_and_clear_event(self):
+        pairs = self.get_pairs_dictionary()
         self.clear_price_retrieved_event()
-        return usdt_pairs
+        return pairs
+
+    def _publish_price_update(self):
+        self.price_retrieved_event.set()
+        self.price_update_notifier.publish(Exchanges.BINANCE.value)
+        return
+
+    def get_health_state(self):
+        # A connected stream keeps the prices flowing even while the REST circuit is open
+        if self.is_streaming():
+            return CircuitStates.HEALTHY
+        return self.circuit_breaker.get_state()
+
+    def get_price_data_age_in_seconds(self):
+        return self.clock.monotonic() - self.last_price_update_time
 
     def set_sleep_duration(self, sleep_duration: int):
         self.price_retrieved_event_sleep_time = sleep_duration
         return
     
+    def set_base_url(self, base_url: str):
+        # REST base URL, e.g. a local exchange simulator, must be set before the price retrieval thread starts
+        self.base_url = base_url
+        return
+    
+    def _load_rulebook(self):
+        # Warm start from the cached rulebook, the exchange is only asked up front when there is no cache yet
+        cached_symbol_index = self.rulebook_cache.load()
+        if cached_symbol_index is not None:
+            self._load_symbol_index(cached_symbol_index)
+        else:
+            self.fetch_exchange_info()
+        self.rulebook_cache.start_refresh_thread(self.fetch_exchange_info)
+        return
+
     def _price_data_retrieval(self):
-        self.fetch_exchange_info()
+        self._load_rulebook()
+        self._start_stream_if_enabled()
         while self.price_retrieval_thread_running:
             current_time_in_ms = int(round(time.time() * 1000))
-            price_data_fetched = self.fetch_24hr_price_changes()
-            if price_data_fetched:
-                self.price_retrieved_event.set()
+            if not self.is_streaming():
+                price_data_fetched = self._fetch_prices_through_circuit_breaker()
+                if price_data_fetched:
+                    self._publish_price_update()
             end_time_in_ms = int(round(time.time() * 1000))
             time_diff = end_time_in_ms - current_time_in_ms
-            sleep_time = self.price_retrieved_event_sleep_time - (time_diff / 1000)
+            polling_interval = max(self.price_retrieved_event_sleep_time, self.rate_limiter.get_polling_interval(BinanceEndpoints._24HR_TICKER_PRICE_CHANGE_WEIGHT))
+            sleep_time = polling_interval - (time_diff / 1000)
             if sleep_time > 0:
                 time.sleep(sleep_time)
         return
 
+    def _fetch_prices_through_circuit_breaker(self):
+        if not self.circuit_breaker.allow_request():
+            return False
+        if self.symbol_index is None:
+            # The warm start found no rulebook and the first fetch failed, prices can't be mapped without it
+            self.fetch_exchange_info()
+        price_data_fetched = self.symbol_index is not None and self.fetch_24hr_price_changes()
+        if price_data_fetched:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+        return price_data_fetched
+
+    '''   STREAM MANAGEMENT   '''
+    def _initialize_stream_params(self):
+        self.stream_service = None
+        self.stream_url = BinanceEndpoints._STREAM_URL
+        return
+
+    def enable_streaming(self, stream_url: str = None):
+        if stream_url is not None:
+            self.stream_url = stream_url
+        self.stream_service = WebSocketStreamService(
+            Exchanges.BINANCE.value,
+            self._get_stream_url,
+            self._build_stream_subscription_messages,
+            self._handle_stream_message
+        )
+        return
+
+    def is_streaming(self):
+        return self.stream_service is not None and self.stream_service.is_streaming()
+
+    def _start_stream_if_enabled(self):
+        if self.stream_service is not None:
+            self.stream_service.start()
+        return
+
+    def _get_stream_url(self):
+        return self.stream_url
+
+    def _build_stream_subscription_messages(self):
+        return [json.dumps({"method": "SUBSCRIBE", "params": [BinanceEndpoints._STREAM_ALL_MINI_TICKERS], "id": 1})]
+
+    def _handle_stream_message(self, message: str):
+        data = orjson.loads(message)
+        if not isinstance(data, list):
+            return
+        data_retrieval_time = self.clock.timestamp_in_ms()
+        # Every mini ticker carries the event time of the push
+        server_timestamp = max((item.get("E", 0) for item in data), default=0) or None
+        self.clock_offset_estimator.add_sample(server_timestamp, data_retrieval_time)
+        updated_pairs = {}
+        for item in data:
+            symbol = item["s"]
+            symbol_id = self.trading_symbol_ids.get(symbol)
+            if symbol_id is not None:
+                symbol_price_data_model = PriceDataModel(
+                    symbol,
+                    item["c"],
+                    Exchanges.BINANCE.value,
+                    data_retrieval_time,
+                    item["v"],
+                    server_timestamp
+                )
+                updated_pairs[symbol_id] = symbol_price_data_model
+        self._publish_pairs(updated_pairs)
+        self._publish_stream_tickers(updated_pairs)
+        self._publish_price_update()
+        return
+    
     def _generic_exception_handler(self, e: Exception, log: str):
-        self.logger.log_critical(log + str(e), str(traceback.format_exc()))
+        self.logger.log_critical(log + str(e) + str(traceback.format_exc()))
         return
     
     def get_symbol_rules(self):
-        if self.exchange_info is None:
+        if self.symbol_index is None:
             raise RuntimeError("Exchange info not loaded yet")
-        return self.exchange_info["symbols"]
+        return self.symbol_index
     
     def is_symbol_trading(self, symbol):
-        if self.exchange_info is None:
+        if self.symbol_index is None:
             raise RuntimeError("Exchange info not loaded yet")
-        
-        for symbol_info in self.exchange_info["symbols"]:
-            if symbol_info["symbol"] == symbol:
-                return symbol_info['status'] == "TRADING"
-        return False
+        return symbol in self.trading_symbols
     
-    def save_exchange_info(self):
-        if self.exchange_info is None:
-            raise RuntimeError("Exchange info not loaded yet")
-        
-        FileUtils.write_json_to_file(self.rulebook_path, self.exchange_info)
+    def save_exchange_info(self, symbol_index: dict):
+        self.rulebook_cache.save_if_changed(symbol_index)
         return
     
-    def _update_usdt_pairs_dictionary(self,
-                                        symbol: str,
-                                        price_data_model: PriceDataModel):
-        self.usdt_pairs_dictionary_lock.acquire()
-        self.usdt_pairs_dictionary[symbol] = price_data_model
-        self.usdt_pairs_dictionary_lock.release()
+    def build_symbol_index(self, symbol_rules: list):
+        symbol_index = {}
+        for rule in symbol_rules:
+            tick_size = 0.0
+            for symbol_filter in rule.get("filters", []):
+                if symbol_filter["filterType"] == "PRICE_FILTER":
+                    tick_size = float(symbol_filter["tickSize"])
+            symbol_index[rule["symbol"]] = SymbolRuleModel(
+                rule["symbol"],
+                rule["status"] == "TRADING",
+                rule["baseAsset"],
+                rule["quoteAsset"],
+                tick_size,
+                BinanceEndpoints._DEFAULT_TAKER_FEE
+            )
+        return symbol_index
+
+    def _build_legacy_symbol_index(self, exchange_info):
+        # Older versions cached the whole exchangeInfo response, later ones only its symbols list
+        return self.build_symbol_index(exchange_info["symbols"] if isinstance(exchange_info, dict) else exchange_info)
+
+    def _load_symbol_index(self, symbol_index: dict):
+        self.symbol_registry.register_symbol_rules(Exchanges.BINANCE.value, symbol_index)
+        self.price_matrix.update_taker_fees(Exchanges.BINANCE.value, symbol_index)
+        self.trading_symbol_ids = {symbol: rule.symbol_id for symbol, rule in symbol_index.items() if rule.trading}
+        self.trading_symbols = frozenset(symbol for symbol, rule in symbol_index.items() if rule.trading)
+        self.symbol_index = symbol_index
+        return
+    
+    def _publish_pairs(self, updated_pairs: dict):
+        self.snapshot_size_metric.observe(len(updated_pairs))
+        # A publish only touches the updated pairs, the snapshot is copied again once a reader asks for it
+        self.pairs_dictionary_lock.acquire()
+        self.pairs_dictionary.update(updated_pairs)
+        self.pairs_snapshot = None
+        self.last_price_update_time = self.clock.monotonic()
+        self.pairs_dictionary_lock.release()
+        self.price_matrix.update(Exchanges.BINANCE.value, updated_pairs)
+        self.tick_history.append(Exchanges.BINANCE.value, updated_pairs)
+        return
+    
+    def get_pairs_dictionary(self):
+        # Readers keep the snapshot they fetched, it is copied at most once per publish
+        pairs_snapshot = self.pairs_snapshot
+        if pairs_snapshot is None:
+            self.pairs_dictionary_lock.acquire()
+            if self.pairs_snapshot is None:
+                self.pairs_snapshot = MappingProxyType(dict(self.pairs_dictionary))
+            pairs_snapshot = self.pairs_snapshot
+            self.pairs_dictionary_lock.release()
+        return pairs_snapshot
+
+    def get_pair_count(self):
+        return len(self.pairs_dictionary)
+    
+    def add_ticker_listener(self, listener):
+        # listener is called from the retrieval thread with the (symbol_id, symbol, price, volume) records of the
+        # trading pairs in a ticker response
+        self.ticker_listeners.append(listener)
         return
     
-    def get_usdt_pairs_dictionary(self):
-        copied_dict = {}
-        self.usdt_pairs_dictionary_lock.acquire()
-        copied_dict = self.usdt_pairs_dictionary.copy()
-        self.usdt_pairs_dictionary_lock.release()
-        return copied_dict
+    def _publish_tickers(self, tickers: list):
+        for listener in self.ticker_listeners:
+            listener(tickers)
+        return
+
+    def _publish_stream_tickers(self, updated_pairs: dict):
+        # Stream updates reach the ticker listeners as the same records the ticker decoder produces
+        if len(self.ticker_listeners) > 0:
+            self._publish_tickers([(symbol_id, price_data.symbol, price_data.price, price_data.volume) for symbol_id, price_data in updated_pairs.items()])
+        return
+    
+    def fetch_order_book(self, symbol_id: int, depth: int = BinanceEndpoints._DEPTH_LIMIT):
+        # Top levels of the L2 book of a canonical symbol, None when the symbol is not listed or the request failed
+        symbol = self.symbol_registry.get_native_symbol(Exchanges.BINANCE.value, symbol_id)
+        if symbol is None:
+            return None
+        end_point = self.base_url + BinanceEndpoints._DEPTH
+        params = {"symbol": symbol, "limit": depth}
+        try:
+            response = self.http_transport.get(end_point, params=params, label=Exchanges.BINANCE.value, weight=BinanceEndpoints._DEPTH_WEIGHT)
+            bids, asks = OrderBookDecoders.decode_binance_order_book(response.content)
+            return OrderBookModel(symbol, Exchanges.BINANCE.value, bids, asks, self.clock.timestamp_in_ms())
+        except HttpRequestFailedException as e:
+            self.logger.log_critical("Failed Binance API Call: " + str(e) + str(traceback.format_exc()))
+            return None
+        except Exception as e:
+            self._generic_exception_handler(e, "Error in fetch_order_book: ")
+            return None
+    
+    def get_order_book_weight(self):
+        return BinanceEndpoints._DEPTH_WEIGHT
     
     def fetch_ticker_info(self):
-        if self.exchange_info is None:
+        if self.symbol_index is None:
             self.fetch_exchange_info()
 
         return self.fetch_24hr_price_changes()
     
+    def _process_ticker_payload(self, content: bytes):
+        data_retrieval_time = self.clock.timestamp_in_ms()
+        parse_start_time = time.perf_counter()
+        tickers, server_timestamp = TickerDecoders.decode_binance_tickers(content, self.trading_symbol_ids)
+        self.clock_offset_estimator.add_sample(server_timestamp, data_retrieval_time)
+
+        updated_pairs = {}
+        for symbol_id, symbol, price, volume in tickers:
+            symbol_price_data_model = PriceDataModel(
+                symbol,
+                price,
+                Exchanges.BINANCE.value,
+                data_retrieval_time,
+                volume,
+                server_timestamp
+            )
+            updated_pairs[symbol_id] = symbol_price_data_model
+        self.parse_duration_metric.observe(time.perf_counter() - parse_start_time)
+        self._publish_pairs(updated_pairs)
+        self._publish_tickers(tickers)
+        return
+    
+    def _process_symbol_rules_payload(self, content: bytes):
+        symbol_index = self.build_symbol_index(json.loads(content)["symbols"])
+        self._load_symbol_index(symbol_index)
+        return symbol_index
+    
+    '''   REPLAY   '''
+    def process_recorded_response(self, url: str, content: bytes):
+        # Recorded responses go through the same parsing as live ones, other endpoints (e.g. order books) are skipped
+        if url.endswith(BinanceEndpoints._24HR_TICKER_PRICE_CHANGE):
+            self._process_ticker_payload(content)
+            self._publish_price_update()
+        elif url.endswith(BinanceEndpoints._EXCHANGE_INFO):
+            self._process_symbol_rules_payload(content)
+        return
+    
+    def load_cached_rulebook(self):
+        # Replays start from the cached rulebook, a symbol rules response in the recording replaces it later on
+        cached_symbol_index = self.rulebook_cache.load()
+        if cached_symbol_index is not None:
+            self._load_symbol_index(cached_symbol_index)
+        return cached_symbol_index is not None
+    
+    def process_recorded_stream_message(self, message: str):
+        self._handle_stream_message(message)
+        return
+    
     def fetch_24hr_price_changes(self):
-        if self.exchange_info is None:
+        if self.symbol_index is None:
             raise RuntimeError("Exchange info not loaded yet")
         
-        end_point = BinanceEndpoints._BASE_URL + BinanceEndpoints._24HR_TICKER_PRICE_CHANGE
+        end_point = self.base_url + BinanceEndpoints._24HR_TICKER_PRICE_CHANGE
 
         try:
-            response = requests.get(end_point)
-            response.raise_for_status()
-            data = response.json()
-            
-            data_retrieval_time = int(round((time.time()  + (3 * 3600)) * 1000))
-
-            for item in data:
-                try:
-                    index_of_usdt = item["symbol"].index("USDT")
-                    if self.is_symbol_trading(item["symbol"]):
-                        symbol_price_data_model = PriceDataModel(
-                            item["symbol"],
-                            item["lastPrice"],
-                            Exchanges.BINANCE.value,
-                            data_retrieval_time,
-                            item["volume"]
-            )
-                        self._update_usdt_pairs_dictionary(item["symbol"], symbol_price_data_model)
-                except ValueError:
-                    pass
+            response = self.http_transport.get(end_point, label=Exchanges.BINANCE.value, weight=BinanceEndpoints._24HR_TICKER_PRICE_CHANGE_WEIGHT)
+            self._process_ticker_payload(response.content)
             return True
-        except requests.exceptions.RequestException as e:
-            self.logger.log_critical("Failed Binance API Call: " + str(e), str(traceback.format_exc()))
+        except HttpRequestFailedException as e:
+            self.logger.log_critical("Failed Binance API Call: " + str(e) + str(traceback.format_exc()))
             return False
         except Exception as e:
             self._generic_exception_handler(e, "Error getting 24hr price changes: ")
             return False
         
     def fetch_exchange_info(self):
-        end_point = BinanceEndpoints._BASE_URL + BinanceEndpoints._EXCHANGE_INFO
+        end_point = self.base_url + BinanceEndpoints._EXCHANGE_INFO
 
         try:
-            response = requests.get(end_point)
-            response.raise_for_status()
-            data = response.json()
-            self.exchange_info = data
-            self.exchange_info["program_update_timestamp"] = round(time.time() * 1000)
+            response = self.http_transport.get(end_point, label=Exchanges.BINANCE.value, weight=BinanceEndpoints._EXCHANGE_INFO_WEIGHT)
+            symbol_index = self._process_symbol_rules_payload(response.content)
+            self.exchange_info_update_time = self.clock.timestamp_in_ms()
+            self.save_exchange_info(symbol_index)
             return True
-        except requests.exceptions.RequestException as e:
-            self.logger.log_critical("Failed Binance API Call: " + str(e), str(traceback.format_exc()))
+        except HttpRequestFailedException as e:
+            self.logger.log_critical("Failed Binance API Call: " + str(e) + str(traceback.format_exc()))
             return False
         except Exception as e:
             self._generic_exception_handler(e, "Error getting exchange info: ")
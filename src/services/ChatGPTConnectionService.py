@@ -1,5 +1,7 @@
 from openai import OpenAI
+import time
 from src.utils.logger import SingletonLogger
+from src.utils.metrics import PipelineMetrics
 from src.services.AppDataService import AppDataService
 
 class AskQuestionFailedException(Exception):
@@ -13,12 +15,14 @@ class ChatGPTConnectionService:
     def __init__(self):
         self.client = OpenAI()
         self.logger = SingletonLogger.getInstance()
+        self.request_duration_metric = PipelineMetrics.gpt_request_duration().labels()
         
     def ask_question_to_gpt(self,
                             question: str):
         prompt = AppDataService.getGPTPrompt()["prompt"]
         print (str(prompt))
         try:
+            request_start_time = time.perf_counter()
             chat_completion = self.client.chat.completions.create(
                 model = "gpt-4o-mini",
                 messages = [
@@ -26,6 +30,7 @@ class ChatGPTConnectionService:
                     {"role": "user", "content": question},
                 ]
             )
+            self.request_duration_metric.observe(time.perf_counter() - request_start_time)
 
             return chat_completion.choices[0].message.content
         except Exception as e:
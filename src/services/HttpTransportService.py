@@ -0,0 +1,183 @@
+import httpx
+import importlib.util
+import threading
+import time
+from collections import deque
+from src.utils.logger import SingletonLogger
+from src.utils.ratelimiter import RateLimiter
+from src.utils.responserecorder import SingletonResponseRecorder
+from src.utils.metrics import PipelineMetrics
+
+class HttpRequestFailedException(Exception):
+    pass
+
+class SingletonHttpTransport:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonHttpTransport.__instance is None:
+            SingletonHttpTransport()
+        return SingletonHttpTransport.__instance
+
+    def __init__(self):
+        if SingletonHttpTransport.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonHttpTransport.__instance = HttpTransport()
+        return
+
+class HttpTransport:
+
+    DEFAULT_CONNECT_TIMEOUT_IN_SECONDS = 3
+    DEFAULT_READ_TIMEOUT_IN_SECONDS = 10
+    DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+    DEFAULT_KEEPALIVE_EXPIRY_IN_SECONDS = 60
+    LATENCY_HISTORY_LENGTH = 100
+    # 418 is Binance's status for an IP ban after repeated 429s
+    RATE_LIMITED_STATUS_CODES = (418, 429)
+
+    def __init__(self):
+        self.logger = SingletonLogger.getInstance()
+
+        # HTTP/2 needs the optional h2 package, plain keep-alive HTTP/1.1 is used otherwise
+        self.http2_enabled = importlib.util.find_spec("h2") is not None
+
+        self.connect_timeout_in_seconds = self.DEFAULT_CONNECT_TIMEOUT_IN_SECONDS
+        self.read_timeout_in_seconds = self.DEFAULT_READ_TIMEOUT_IN_SECONDS
+        self.max_connections_per_host = self.DEFAULT_MAX_CONNECTIONS_PER_HOST
+
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+
+        self.latencies = {}
+        self.latencies_lock = threading.Lock()
+
+        self.rate_limiters = {}
+        self.response_recorder = SingletonResponseRecorder.getInstance()
+        self.fetch_duration_metric = PipelineMetrics.fetch_duration()
+        self.fetch_failures_metric = PipelineMetrics.fetch_failures()
+        return
+
+    def set_timeouts(self, connect_timeout_in_seconds: float, read_timeout_in_seconds: float):
+        self.connect_timeout_in_seconds = connect_timeout_in_seconds
+        self.read_timeout_in_seconds = read_timeout_in_seconds
+        self._close_clients()
+        return
+
+    def set_max_connections_per_host(self, max_connections: int):
+        self.max_connections_per_host = max_connections
+        self._close_clients()
+        return
+
+    # Requests made under a label with a rate limiter take their weight from that limiter's budget first
+    def set_rate_limiter(self, label: str, rate_limiter: RateLimiter):
+        self.rate_limiters[label] = rate_limiter
+        return
+
+    def get_rate_limiter(self, label: str):
+        return self.rate_limiters.get(label)
+
+    def get(self, url: str, params: dict = None, label: str = None, weight: float = 1):
+        return self._request("GET", url, params=params, label=label, weight=weight)
+
+    def post(self, url: str, json: dict = None, label: str = None, weight: float = 1):
+        return self._request("POST", url, json=json, label=label, weight=weight)
+
+    def _request(self, method: str, url: str, params: dict = None, json: dict = None, label: str = None, weight: float = 1):
+        rate_limiter = self.rate_limiters.get(label)
+        if rate_limiter is not None and not rate_limiter.acquire(weight):
+            raise HttpRequestFailedException(rate_limiter.name + " rate limiter stopped, request to " + url + " not sent")
+        client = self._get_client_for_url(url)
+        start_time = time.perf_counter()
+        try:
+            response = client.request(method, url, params=params, json=json)
+            if rate_limiter is not None:
+                self._apply_rate_limit_feedback(rate_limiter, response)
+            response.raise_for_status()
+            self.response_recorder.record_response(label, url, params, response.content)
+        except httpx.HTTPError as e:
+            self.fetch_failures_metric.labels(label or client.base_url.host).inc()
+            raise HttpRequestFailedException(str(e))
+        finally:
+            latency_in_seconds = time.perf_counter() - start_time
+            self.fetch_duration_metric.labels(label or client.base_url.host).observe(latency_in_seconds)
+            self._record_latency(label or client.base_url.host, latency_in_seconds * 1000)
+        return response
+
+    def get_last_latency_in_ms(self, label: str):
+        self.latencies_lock.acquire()
+        history = self.latencies.get(label)
+        last_latency = history[-1] if history else None
+        self.latencies_lock.release()
+        return last_latency
+
+    def get_latency_report(self):
+        report = {}
+        self.latencies_lock.acquire()
+        for label, history in self.latencies.items():
+            if len(history) == 0:
+                continue
+            report[label] = {
+                "count": len(history),
+                "last_ms": history[-1],
+                "avg_ms": sum(history) / len(history),
+                "max_ms": max(history)
+            }
+        self.latencies_lock.release()
+        return report
+
+    def close(self):
+        self._close_clients()
+        return
+
+    def _apply_rate_limit_feedback(self, rate_limiter: RateLimiter, response: httpx.Response):
+        rate_limiter.update_from_headers(response.headers)
+        if response.status_code in self.RATE_LIMITED_STATUS_CODES:
+            retry_after = response.headers.get("Retry-After")
+            rate_limiter.block(float(retry_after) if retry_after is not None and retry_after.isdigit() else None)
+            self.logger.log_warning(rate_limiter.name + " rate limited with status " + str(response.status_code) + ", retry after " + str(retry_after))
+        return
+
+    def _record_latency(self, label: str, latency_in_ms: float):
+        self.latencies_lock.acquire()
+        history = self.latencies.get(label)
+        if history is None:
+            history = deque(maxlen=self.LATENCY_HISTORY_LENGTH)
+            self.latencies[label] = history
+        history.append(latency_in_ms)
+        self.latencies_lock.release()
+        return
+
+    def _get_client_for_url(self, url: str):
+        parsed_url = httpx.URL(url)
+        host_key = (parsed_url.scheme, parsed_url.host, parsed_url.port)
+        self.clients_lock.acquire()
+        client = self.clients.get(host_key)
+        if client is None:
+            client = self._create_client(parsed_url)
+            self.clients[host_key] = client
+        self.clients_lock.release()
+        return client
+
+    def _create_client(self, parsed_url: httpx.URL):
+        # gzip is always negotiated, br is added by httpx when the brotli package is installed
+        return httpx.Client(
+            base_url=f"{parsed_url.scheme}://{parsed_url.netloc.decode('ascii')}",
+            http2=self.http2_enabled,
+            timeout=httpx.Timeout(self.read_timeout_in_seconds, connect=self.connect_timeout_in_seconds),
+            limits=httpx.Limits(
+                max_connections=self.max_connections_per_host,
+                max_keepalive_connections=self.max_connections_per_host,
+                keepalive_expiry=self.DEFAULT_KEEPALIVE_EXPIRY_IN_SECONDS
+            )
+        )
+
+    def _close_clients(self):
+        self.clients_lock.acquire()
+        clients = list(self.clients.values())
+        self.clients = {}
+        self.clients_lock.release()
+        for client in clients:
+            client.close()
+        return
@@ -1,36 +1,87 @@
-import requests
 import time
 import traceback
 import threading
 import json
+import orjson
+from types import MappingProxyType
 from src.data.Exchanges import Exchanges
+from src.data.CircuitStates import CircuitStates
 from src.utils.logger import SingletonLogger
+from src.services.HttpTransportService import SingletonHttpTransport, HttpRequestFailedException
+from src.services.WebSocketStreamService import WebSocketStreamService
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.services.PriceUpdateNotifierService import SingletonPriceUpdateNotifier
+from src.services.PriceMatrixService import SingletonPriceMatrix
+from src.services.TickHistoryService import SingletonTickHistory
 from src.utils.fileutils import FileUtils
+from src.utils.rulebookcache import RulebookCache
+from src.utils.circuitbreaker import CircuitBreaker
+from src.utils.ratelimiter import RateLimiter
+from src.utils.tickerdecoders import TickerDecoders
+from src.utils.orderbookdecoders import OrderBookDecoders
+from src.utils.clock import SingletonClock
+from src.utils.metrics import PipelineMetrics
 from src.models.PriceDataModel import PriceDataModel
+from src.models.OrderBookModel import OrderBookModel
+from src.models.SymbolRuleModel import SymbolRuleModel
 
 class KrakenEndpoints:
     _BASE_URL = "https://api.kraken.com/0"
     _ASSET_PAIRS = "/public/AssetPairs"
     _TICKER = "/public/Ticker"
+    _STREAM_URL = "wss://ws.kraken.com"
+    _STREAM_TICKER_CHANNEL = "ticker"
+    _STREAM_MAX_PAIRS_PER_SUBSCRIPTION = 100
+    _STREAM_PING_INTERVAL_IN_SECONDS = 30
+    _WEIGHT_LIMIT = 1
+    _WEIGHT_LIMIT_WINDOW_IN_SECONDS = 1
+    _ASSET_PAIRS_WEIGHT = 1
+    _TICKER_WEIGHT = 1
+    _DEPTH = "/public/Depth"
+    _DEPTH_LIMIT = 20
+    _DEPTH_WEIGHT = 1
 
 class KrakenIntegrationService:
 
         INTERVAL_IN_SEC = 5
         def __init__(self):
             self.logger = SingletonLogger.getInstance()
+            self.http_transport = SingletonHttpTransport.getInstance()
+            self.rate_limiter = RateLimiter(Exchanges.KRAKEN.value,
+                                            KrakenEndpoints._WEIGHT_LIMIT,
+                                            KrakenEndpoints._WEIGHT_LIMIT_WINDOW_IN_SECONDS)
+            self.http_transport.set_rate_limiter(Exchanges.KRAKEN.value, self.rate_limiter)
+            self.symbol_registry = SingletonSymbolRegistry.getInstance()
+            self.price_update_notifier = SingletonPriceUpdateNotifier.getInstance()
+            self.price_matrix = SingletonPriceMatrix.getInstance()
+            self.tick_history = SingletonTickHistory.getInstance()
+            self.clock = SingletonClock.getInstance()
+            self.parse_duration_metric = PipelineMetrics.parse_duration().labels(Exchanges.KRAKEN.value)
+            self.snapshot_size_metric = PipelineMetrics.snapshot_size().labels(Exchanges.KRAKEN.value)
+            self.base_url = KrakenEndpoints._BASE_URL
 
             self.rulebooks_folder_path = FileUtils.join_paths(FileUtils.current_directory(), "rulebooks")
             FileUtils.create_directory_if_not_exists(self.rulebooks_folder_path)
 
-            self.rulebook_path = FileUtils.join_paths(self.rulebooks_folder_path, "kraken_symbol_spot_rules.json")
+            self.rulebook_path = FileUtils.join_paths(self.rulebooks_folder_path, "kraken_symbol_spot_rules.rulebook")
+            self.legacy_rulebook_path = FileUtils.join_paths(self.rulebooks_folder_path, "kraken_symbol_spot_rules.json")
+            self.rulebook_cache = RulebookCache(self.rulebook_path, self.legacy_rulebook_path, self.build_symbol_index)
 
-            self.spot_rules = None
+            self.symbol_index = None
+            self.trading_symbols = frozenset()
+            self.trading_symbol_ids = {}
             self.spot_rules_update_time = 0
 
-            self.usdt_pairs_dictionary = {}
-            self.usdt_pairs_dictionary_lock = threading.Lock()
+            # Live pairs updated in place by the publishes, readers get a read-only copy made when they first ask for it
+            self.pairs_dictionary = {}
+            self.pairs_snapshot = MappingProxyType({})
+            self.pairs_dictionary_lock = threading.Lock()
+            self.last_price_update_time = 0
+            self.ticker_listeners = []
+            self.circuit_breaker = CircuitBreaker(Exchanges.KRAKEN.value)
 
             self._initialize_price_retrieval_thread_params()
+            self._initialize_stream_params()
             return 
         
         '''    THREAD MANAGEMENT   '''
@@ -49,7 +100,11 @@ class KrakenIntegrationService:
         
         def stop_price_retrieval_thread(self):
             self.price_retrieval_thread_running = False
+            self.rate_limiter.stop()
             self.price_retrieval_thread.join()
+            self.rulebook_cache.stop_refresh_thread()
+            if self.stream_service is not None:
+                self.stream_service.stop()
             self.price_retrieved_event.set()
             return
         
@@ -67,111 +122,329 @@ class KrakenIntegrationService:
             self.price_retrieved_event.wait(timeout)
             return
 
-        def get_usdt_pairs_and_clear_event(self):
-            usdt_pairs = self.get_usdt_pairs_dictionary()
+        def get_pairs_and_clear_event(self):
+            pairs = self.get_pairs_dictionary()
             self.clear_price_retrieved_event()
-            return usdt_pairs
+            return pairs
         
+        def _publish_price_update(self):
+            self.price_retrieved_event.set()
+            self.price_update_notifier.publish(Exchanges.KRAKEN.value)
+            return
+
+        def get_health_state(self):
+            # A connected stream keeps the prices flowing even while the REST circuit is open
+            if self.is_streaming():
+                return CircuitStates.HEALTHY
+            return self.circuit_breaker.get_state()
+
+        def get_price_data_age_in_seconds(self):
+            return self.clock.monotonic() - self.last_price_update_time
+
         def set_sleep_duration(self, sleep_duration: int):
             self.price_retrieved_event_sleep_time = sleep_duration
             return
         
+        def set_base_url(self, base_url: str):
+            # REST base URL, e.g. a local exchange simulator, must be set before the price retrieval thread starts
+            self.base_url = base_url
+            return
+        
+        def _load_rulebook(self):
+            # Warm start from the cached rulebook, the exchange is only asked up front when there is no cache yet
+            cached_symbol_index = self.rulebook_cache.load()
+            if cached_symbol_index is not None:
+                self._load_symbol_index(cached_symbol_index)
+            else:
+                self.fetch_spot_symbols_info()
+            self.rulebook_cache.start_refresh_thread(self.fetch_spot_symbols_info)
+            return
+
         def _price_data_retrieval(self):
-            self.fetch_spot_symbols_info()
+            self._load_rulebook()
+            self._start_stream_if_enabled()
             while self.price_retrieval_thread_running:
                 current_time_in_ms = int(round(time.time() * 1000))
-                price_data_fetched = self.fetch_latest_prices()
-                if price_data_fetched:
-                    self.price_retrieved_event.set()
+                if not self.is_streaming():
+                    price_data_fetched = self._fetch_prices_through_circuit_breaker()
+                    if price_data_fetched:
+                        self._publish_price_update()
                 end_time_in_ms = int(round(time.time() * 1000))
                 time_diff = end_time_in_ms - current_time_in_ms
-                sleep_time = self.price_retrieved_event_sleep_time - (time_diff / 1000)
+                polling_interval = max(self.price_retrieved_event_sleep_time, self.rate_limiter.get_polling_interval(KrakenEndpoints._TICKER_WEIGHT))
+                sleep_time = polling_interval - (time_diff / 1000)
                 if sleep_time > 0:
                     time.sleep(sleep_time)
             return
+
+        def _fetch_prices_through_circuit_breaker(self):
+            if not self.circuit_breaker.allow_request():
+                return False
+            if self.symbol_index is None:
+                # The warm start found no rulebook and the first fetch failed, prices can't be mapped without it
+                self.fetch_spot_symbols_info()
+            price_data_fetched = self.symbol_index is not None and self.fetch_latest_prices()
+            if price_data_fetched:
+                self.circuit_breaker.record_success()
+            else:
+                self.circuit_breaker.record_failure()
+            return price_data_fetched
+        
+        '''   STREAM MANAGEMENT   '''
+        def _initialize_stream_params(self):
+            self.stream_service = None
+            self.stream_url = KrakenEndpoints._STREAM_URL
+            self.stream_symbols = {}
+            return
+
+        def enable_streaming(self, stream_url: str = None):
+            if stream_url is not None:
+                self.stream_url = stream_url
+            self.stream_service = WebSocketStreamService(
+                Exchanges.KRAKEN.value,
+                self._get_stream_url,
+                self._build_stream_subscription_messages,
+                self._handle_stream_message,
+                ping_message=json.dumps({"event": "ping"}),
+                ping_interval_in_seconds=KrakenEndpoints._STREAM_PING_INTERVAL_IN_SECONDS
+            )
+            return
+
+        def is_streaming(self):
+            return self.stream_service is not None and self.stream_service.is_streaming()
+
+        def _start_stream_if_enabled(self):
+            if self.stream_service is not None:
+                self.stream_service.start()
+            return
+
+        def _get_stream_url(self):
+            return self.stream_url
+
+        def _build_stream_subscription_messages(self):
+            # The websocket feed names pairs by wsname (XBT/USDT) while REST uses the pair key (XBTUSDT)
+            self.stream_symbols = {}
+            for symbol, rule in self.symbol_index.items():
+                if symbol in self.trading_symbol_ids:
+                    self.stream_symbols[rule.stream_symbol] = symbol
+            ws_names = list(self.stream_symbols.keys())
+            subscription_messages = []
+            for i in range(0, len(ws_names), KrakenEndpoints._STREAM_MAX_PAIRS_PER_SUBSCRIPTION):
+                subscription_messages.append(json.dumps({
+                    "event": "subscribe",
+                    "pair": ws_names[i:i + KrakenEndpoints._STREAM_MAX_PAIRS_PER_SUBSCRIPTION],
+                    "subscription": {"name": KrakenEndpoints._STREAM_TICKER_CHANNEL}
+                }))
+            return subscription_messages
+
+        def _handle_stream_message(self, message: str):
+            data = orjson.loads(message)
+            if not isinstance(data, list) or len(data) < 4 or data[-2] != KrakenEndpoints._STREAM_TICKER_CHANNEL:
+                return
+            symbol = self.stream_symbols.get(data[-1])
+            if symbol is not None:
+                updated_pairs = {}
+                self._process_ticker(symbol, self.trading_symbol_ids[symbol], data[1], updated_pairs)
+                self._publish_pairs(updated_pairs)
+                self._publish_stream_tickers(updated_pairs)
+                self._publish_price_update()
+            return
         
         def _generic_exception_handler(self, e: Exception, log: str):
             self.logger.log_critical(log + str(e) + str(traceback.format_exc()))
             return
         
         def get_spot_symbol_rules(self):
-            return self.spot_rules
+            return self.symbol_index
         
         def is_symbol_trading(self, symbol: str):
-            if self.spot_rules is None:
+            if self.symbol_index is None:
                 raise RuntimeError("Spot rules not loaded yet")
-            if symbol in self.spot_rules:
-                return self.spot_rules[symbol]['status'] == 'online'
-            return False   
+            return symbol in self.trading_symbols
         
-        def save_spot_rules(self):
-            if self.spot_rules is None:
-                raise RuntimeError("Spot rules not loaded yet")
-            FileUtils.write_json_to_file(self.rulebook_path, self.spot_rules)
+        def save_spot_rules(self, symbol_index: dict):
+            self.rulebook_cache.save_if_changed(symbol_index)
             return
         
-        def _update_usdt_pairs_dictionary(self, symbol: str, price_data_model: PriceDataModel):
-            self.usdt_pairs_dictionary_lock.acquire()
-            self.usdt_pairs_dictionary[symbol] = price_data_model
-            self.usdt_pairs_dictionary_lock.release()
+        def build_symbol_index(self, spot_rules: dict):
+            symbol_index = {}
+            for symbol, rule in spot_rules.items():
+                # fees holds [volume, percent] taker tiers, the first tier applies without trading volume
+                taker_fee = rule["fees"][0][1] / 100 if rule.get("fees") else 0.0
+                symbol_index[symbol] = SymbolRuleModel(
+                    symbol,
+                    rule["status"] == "online",
+                    rule["base"],
+                    rule["quote"],
+                    float(rule.get("tick_size") or 0),
+                    taker_fee,
+                    rule.get("wsname")
+                )
+            return symbol_index
+
+        def _load_symbol_index(self, symbol_index: dict):
+            self.symbol_registry.register_symbol_rules(Exchanges.KRAKEN.value, symbol_index)
+            self.price_matrix.update_taker_fees(Exchanges.KRAKEN.value, symbol_index)
+            self.trading_symbol_ids = {symbol: rule.symbol_id for symbol, rule in symbol_index.items() if rule.trading}
+            self.trading_symbols = frozenset(symbol for symbol, rule in symbol_index.items() if rule.trading)
+            self.symbol_index = symbol_index
+            return
+        
+        def _publish_pairs(self, updated_pairs: dict):
+            self.snapshot_size_metric.observe(len(updated_pairs))
+            # A publish only touches the updated pairs, the snapshot is copied again once a reader asks for it
+            self.pairs_dictionary_lock.acquire()
+            self.pairs_dictionary.update(updated_pairs)
+            self.pairs_snapshot = None
+            self.last_price_update_time = self.clock.monotonic()
+            self.pairs_dictionary_lock.release()
+            self.price_matrix.update(Exchanges.KRAKEN.value, updated_pairs)
+            self.tick_history.append(Exchanges.KRAKEN.value, updated_pairs)
+            return
+        
+        def get_pairs_dictionary(self):
+            # Readers keep the snapshot they fetched, it is copied at most once per publish
+            pairs_snapshot = self.pairs_snapshot
+            if pairs_snapshot is None:
+                self.pairs_dictionary_lock.acquire()
+                if self.pairs_snapshot is None:
+                    self.pairs_snapshot = MappingProxyType(dict(self.pairs_dictionary))
+                pairs_snapshot = self.pairs_snapshot
+                self.pairs_dictionary_lock.release()
+            return pairs_snapshot
+
+        def get_pair_count(self):
+            return len(self.pairs_dictionary)
+        
+        def add_ticker_listener(self, listener):
+            # listener is called from the retrieval thread with the (symbol_id, symbol, price, volume) records of the
+            # trading pairs in a ticker response
+            self.ticker_listeners.append(listener)
+            return
+        
+        def _publish_tickers(self, tickers: list):
+            for listener in self.ticker_listeners:
+                listener(tickers)
             return
+
+        def _publish_stream_tickers(self, updated_pairs: dict):
+            # Stream updates reach the ticker listeners as the same records the ticker decoder produces
+            if len(self.ticker_listeners) > 0:
+                self._publish_tickers([(symbol_id, price_data.symbol, price_data.price, price_data.volume) for symbol_id, price_data in updated_pairs.items()])
+            return
+        
+        def fetch_order_book(self, symbol_id: int, depth: int = KrakenEndpoints._DEPTH_LIMIT):
+            # Top levels of the L2 book of a canonical symbol, None when the symbol is not listed or the request failed
+            symbol = self.symbol_registry.get_native_symbol(Exchanges.KRAKEN.value, symbol_id)
+            if symbol is None:
+                return None
+            end_point = self.base_url + KrakenEndpoints._DEPTH
+            params = {"pair": symbol, "count": depth}
+            try:
+                response = self.http_transport.get(end_point, params=params, label=Exchanges.KRAKEN.value, weight=KrakenEndpoints._DEPTH_WEIGHT)
+                bids, asks = OrderBookDecoders.decode_kraken_order_book(response.content)
+                return OrderBookModel(symbol, Exchanges.KRAKEN.value, bids, asks, self.clock.timestamp_in_ms())
+            except HttpRequestFailedException as e:
+                self.logger.log_critical("Failed Kraken API Call: " + str(e) + str(traceback.format_exc()))
+                return None
+            except Exception as e:
+                self._generic_exception_handler(e, "Error in fetch_order_book: ")
+                return None
         
-        def get_usdt_pairs_dictionary(self):
-            copied_dict = {}
-            self.usdt_pairs_dictionary_lock.acquire()
-            copied_dict = self.usdt_pairs_dictionary.copy()
-            self.usdt_pairs_dictionary_lock.release()
-            return copied_dict
+        def get_order_book_weight(self):
+            return KrakenEndpoints._DEPTH_WEIGHT
         
         def fetch_ticker_info(self):
-            if self.spot_rules is None:
+            if self.symbol_index is None:
                 self.fetch_spot_symbols_info()
 
             return self.fetch_latest_prices()
         
+        def _process_ticker_payload(self, content: bytes):
+            # Kraken's tickers carry no server time, the quotes are as old as their receive timestamps
+            data_retrieval_time = self.clock.timestamp_in_ms()
+            parse_start_time = time.perf_counter()
+            tickers, server_timestamp = TickerDecoders.decode_kraken_tickers(content, self.trading_symbol_ids)
+            updated_pairs = {}
+            for symbol_id, symbol, price, volume in tickers:
+                price_data = PriceDataModel(
+                    symbol,
+                    price,
+                    Exchanges.KRAKEN.value,
+                    data_retrieval_time,
+                    volume,
+                    server_timestamp
+                )
+                updated_pairs[symbol_id] = price_data
+            self.parse_duration_metric.observe(time.perf_counter() - parse_start_time)
+            self._publish_pairs(updated_pairs)
+            self._publish_tickers(tickers)
+            return
+        
+        def _process_symbol_rules_payload(self, content: bytes):
+            symbol_index = self.build_symbol_index(json.loads(content).get('result', {}))
+            self._load_symbol_index(symbol_index)
+            return symbol_index
+        
+        '''   REPLAY   '''
+        def process_recorded_response(self, url: str, content: bytes):
+            # Recorded responses go through the same parsing as live ones, other endpoints (e.g. order books) are skipped
+            if url.endswith(KrakenEndpoints._TICKER):
+                self._process_ticker_payload(content)
+                self._publish_price_update()
+            elif url.endswith(KrakenEndpoints._ASSET_PAIRS):
+                self._process_symbol_rules_payload(content)
+            return
+        
+        def load_cached_rulebook(self):
+            # Replays start from the cached rulebook, a symbol rules response in the recording replaces it later on
+            cached_symbol_index = self.rulebook_cache.load()
+            if cached_symbol_index is not None:
+                self._load_symbol_index(cached_symbol_index)
+            return cached_symbol_index is not None
+        
+        def process_recorded_stream_message(self, message: str):
+            if len(self.stream_symbols) == 0 and self.symbol_index is not None:
+                self._build_stream_subscription_messages()
+            self._handle_stream_message(message)
+            return
+        
         def fetch_latest_prices(self):
-            if self.spot_rules is None:
+            if self.symbol_index is None:
                 raise RuntimeError("Spot rules not loaded yet")
-            end_point = KrakenEndpoints._BASE_URL + KrakenEndpoints._TICKER
+            end_point = self.base_url + KrakenEndpoints._TICKER
             try:
-                response = requests.get(end_point)
-                response.raise_for_status()
-                json_data = json.loads(response.text)
-                result = json_data["result"]
-                for symbol in result:
-                    try:
-                        index_of_usdt = symbol.index("USDT")
-                        if self.is_symbol_trading(symbol):
-                            price_data = PriceDataModel(
-                                symbol,
-                                float(result[symbol]["c"][0]),
-                                Exchanges.KRAKEN.value,
-                                int(round(time.time() * 1000)),
-                                float(result[symbol]["v"][0])
-                            )
-                            self._update_usdt_pairs_dictionary(symbol, price_data)
-                    except ValueError:
-                        continue
+                response = self.http_transport.get(end_point, label=Exchanges.KRAKEN.value, weight=KrakenEndpoints._TICKER_WEIGHT)
+                self._process_ticker_payload(response.content)
                 return True
-            except requests.exceptions.RequestException as e:
-                self.logger.log_critical("Failed Kraken API Call: " + str(e), str(traceback.format_exc()))
+            except HttpRequestFailedException as e:
+                self.logger.log_critical("Failed Kraken API Call: " + str(e) + str(traceback.format_exc()))
                 return False
             except Exception as e:
                 self._generic_exception_handler(e, "Failed Kraken API Call: ")
                 return False
         
+        def _process_ticker(self, symbol: str, symbol_id: int, ticker: dict, updated_pairs: dict):
+            price_data = PriceDataModel(
+                symbol,
+                float(ticker["c"][0]),
+                Exchanges.KRAKEN.value,
+                self.clock.timestamp_in_ms(),
+                float(ticker["v"][0])
+            )
+            updated_pairs[symbol_id] = price_data
+            return
+        
         def fetch_spot_symbols_info(self):
-            end_point = KrakenEndpoints._BASE_URL + KrakenEndpoints._ASSET_PAIRS
+            end_point = self.base_url + KrakenEndpoints._ASSET_PAIRS
             try:
-                response = requests.get(end_point)
-                response.raise_for_status()
-                data = response.json().get('result', {})
-                self.spot_rules = data
-                self.spot_rules_update_time = int(round(time.time() * 1000))
-                self.save_spot_rules()
+                response = self.http_transport.get(end_point, label=Exchanges.KRAKEN.value, weight=KrakenEndpoints._ASSET_PAIRS_WEIGHT)
+                symbol_index = self._process_symbol_rules_payload(response.content)
+                self.spot_rules_update_time = self.clock.timestamp_in_ms()
+                self.save_spot_rules(symbol_index)
                 return True
-            except requests.exceptions.RequestException as e:
-                self.logger.log_critical("Failed Kraken API Call: " + str(e), str(traceback.format_exc()))
+            except HttpRequestFailedException as e:
+                self.logger.log_critical("Failed Kraken API Call: " + str(e) + str(traceback.format_exc()))
                 return False
             except Exception as e:
                 self._generic_exception_handler(e, "Failed Kraken API Call: ")
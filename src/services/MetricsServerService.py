@@ -0,0 +1,66 @@
+import socket
+import threading
+from flask import Flask, Response
+from werkzeug.serving import make_server, WSGIRequestHandler
+from src.utils.logger import SingletonLogger
+from src.utils.metrics import SingletonMetricsRegistry, MetricsRegistry
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    # Scrapes would otherwise print an access log line into the console status output every few seconds
+    def log_request(self, code="-", size="-"):
+        return
+
+class MetricsServerService:
+
+    DEFAULT_HOST = "127.0.0.1"
+    DEFAULT_PORT = 9108
+    METRICS_PATH = "/metrics"
+
+    # Serves the metrics registry in the Prometheus text format from a small Flask app on a background thread.
+    # It binds to localhost by default, every scrape renders the registry at that moment.
+    def __init__(self):
+        self.logger = SingletonLogger.getInstance()
+        self.metrics_registry = SingletonMetricsRegistry.getInstance()
+        self.app = Flask(__name__)
+        self.app.add_url_rule(self.METRICS_PATH, "metrics", self._render_metrics)
+        self.server = None
+        self.thread = None
+        return
+
+    def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        if self.thread is not None:
+            return
+        # The endpoint is optional, a taken port (e.g. a second instance) leaves the bot running without it. The
+        # socket is bound here because werkzeug exits the process when it cannot bind one itself.
+        try:
+            listen_socket = socket.create_server((host, port), family=socket.AF_INET6 if ":" in host else socket.AF_INET)
+        except OSError as e:
+            self.logger.log_warning("Metrics endpoint could not listen on " + host + ":" + str(port) + ", continuing without it: " + str(e))
+            return
+        try:
+            self.server = make_server(host, port, self.app, threaded=True, request_handler=QuietRequestHandler, fd=listen_socket.fileno())
+        finally:
+            # werkzeug serves on a duplicate of the descriptor
+            listen_socket.close()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.log_info("Metrics endpoint listening on http://" + host + ":" + str(self.server.server_address[1]) + self.METRICS_PATH)
+        return
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.server = None
+        self.thread = None
+        return
+
+    def get_port(self):
+        # The bound port, useful when started on port 0
+        return self.server.server_address[1] if self.server is not None else None
+
+    def _render_metrics(self):
+        return Response(self.metrics_registry.render(), content_type=MetricsRegistry.CONTENT_TYPE)
@@ -0,0 +1,167 @@
+import threading
+import numpy as np
+from src.data.Exchanges import Exchanges
+from src.utils.clock import SingletonClock
+
+class SingletonPriceMatrix:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonPriceMatrix.__instance is None:
+            SingletonPriceMatrix()
+        return SingletonPriceMatrix.__instance
+
+    def __init__(self):
+        if SingletonPriceMatrix.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonPriceMatrix.__instance = PriceMatrix()
+        return
+
+class PriceMatrix:
+
+    DEFAULT_SYMBOL_CAPACITY = 4096
+
+    # Columnar store of the whole market, rows are canonical symbol ids from the symbol registry and
+    # columns are exchanges. Missing prices are NaN. Writers update their own column in place and the
+    # arrays are only reallocated when a new symbol id outgrows the capacity, views taken before a
+    # reallocation keep pointing at the previous arrays.
+    #
+    # Every write also marks the symbols whose price or quote volume actually changed, so the analyzer
+    # can recompute only those rows instead of the whole market.
+    #
+    # Taker fees are kept in the same layout, set from the rulebooks when they load so the spread calculation
+    # can work on net spreads without looking into the rules.
+    #
+    # Next to the local receive timestamps every quote has a quote timestamp on the local clock, the exchange's
+    # server timestamp moved by the exchange's estimated clock offset where it sends one and the receive timestamp
+    # otherwise, so the two legs of a comparison can be checked for how far apart in time they were quoted.
+    def __init__(self,
+                    exchanges: list = None,
+                    symbol_capacity: int = DEFAULT_SYMBOL_CAPACITY):
+        self.exchanges = list(exchanges) if exchanges is not None else [exchange.value for exchange in Exchanges]
+        self.exchange_indices = {exchange: index for index, exchange in enumerate(self.exchanges)}
+        self.matrix_lock = threading.Lock()
+
+        self.symbol_count = 0
+        self.prices = np.full((symbol_capacity, len(self.exchanges)), np.nan)
+        self.quote_volumes = np.zeros((symbol_capacity, len(self.exchanges)))
+        self.timestamps = np.zeros((symbol_capacity, len(self.exchanges)), dtype=np.int64)
+        self.quote_timestamps = np.zeros((symbol_capacity, len(self.exchanges)), dtype=np.int64)
+        self.taker_fees = np.zeros((symbol_capacity, len(self.exchanges)))
+        self.dirty_mask = np.zeros(symbol_capacity, dtype=bool)
+        self.clock = SingletonClock.getInstance()
+        return
+
+    def get_exchange_index(self, exchange: str):
+        return self.exchange_indices[exchange]
+
+    def update(self, exchange: str, price_data_models: dict):
+        # price_data_models maps symbol ids to PriceDataModel, as published by the integration services
+        count = len(price_data_models)
+        if count == 0:
+            return
+        symbol_ids = np.fromiter(price_data_models.keys(), dtype=np.int64, count=count)
+        prices = np.fromiter((model.price for model in price_data_models.values()), dtype=np.float64, count=count)
+        quote_volumes = np.fromiter((model.volume_in_quote_currency() for model in price_data_models.values()), dtype=np.float64, count=count)
+        timestamps = np.fromiter((model.timestamp for model in price_data_models.values()), dtype=np.int64, count=count)
+        server_timestamps = np.fromiter((model.server_timestamp or 0 for model in price_data_models.values()), dtype=np.int64, count=count)
+        offset_in_ms = self.clock.get_offset_estimator(exchange).get_offset_in_ms() or 0
+        quote_timestamps = np.where(server_timestamps > 0, server_timestamps - offset_in_ms, timestamps)
+        self.update_columns(exchange, symbol_ids, prices, quote_volumes, timestamps, quote_timestamps)
+        return
+
+    def update_columns(self,
+                        exchange: str,
+                        symbol_ids: np.ndarray,
+                        prices: np.ndarray,
+                        quote_volumes: np.ndarray,
+                        timestamps: np.ndarray,
+                        quote_timestamps: np.ndarray = None):
+        # Without quote_timestamps the quotes are taken to be as old as their receive timestamps
+        column = self.exchange_indices[exchange]
+        self.matrix_lock.acquire()
+        self._ensure_capacity(int(symbol_ids.max()) + 1)
+        changed_mask = (self.prices[symbol_ids, column] != prices) | (self.quote_volumes[symbol_ids, column] != quote_volumes)
+        self.dirty_mask[symbol_ids[changed_mask]] = True
+        self.prices[symbol_ids, column] = prices
+        self.quote_volumes[symbol_ids, column] = quote_volumes
+        self.timestamps[symbol_ids, column] = timestamps
+        self.quote_timestamps[symbol_ids, column] = timestamps if quote_timestamps is None else quote_timestamps
+        self.matrix_lock.release()
+        return
+
+    def update_taker_fees(self, exchange: str, symbol_index: dict):
+        # symbol_index maps native symbols to SymbolRuleModel entries already registered with the symbol registry
+        count = len(symbol_index)
+        if count == 0:
+            return
+        symbol_ids = np.fromiter((rule.symbol_id for rule in symbol_index.values()), dtype=np.int64, count=count)
+        taker_fees = np.fromiter((rule.taker_fee for rule in symbol_index.values()), dtype=np.float64, count=count)
+        column = self.exchange_indices[exchange]
+        self.matrix_lock.acquire()
+        self._ensure_capacity(int(symbol_ids.max()) + 1)
+        changed_mask = self.taker_fees[symbol_ids, column] != taker_fees
+        self.dirty_mask[symbol_ids[changed_mask]] = True
+        self.taker_fees[symbol_ids, column] = taker_fees
+        self.matrix_lock.release()
+        return
+
+    def clear_exchange(self, exchange: str):
+        column = self.exchange_indices[exchange]
+        self.matrix_lock.acquire()
+        self.dirty_mask[:self.symbol_count] |= ~np.isnan(self.prices[:self.symbol_count, column])
+        self.prices[:, column] = np.nan
+        self.quote_volumes[:, column] = 0
+        self.timestamps[:, column] = 0
+        self.quote_timestamps[:, column] = 0
+        self.matrix_lock.release()
+        return
+
+    def take_dirty_symbol_ids(self):
+        # Symbol ids changed on any exchange since the previous call, the marks are cleared on return
+        self.matrix_lock.acquire()
+        dirty_symbol_ids = np.flatnonzero(self.dirty_mask[:self.symbol_count])
+        self.dirty_mask[dirty_symbol_ids] = False
+        self.matrix_lock.release()
+        return dirty_symbol_ids
+
+    def get_view(self):
+        # Zero-copy views of the rows in use, in (prices, quote_volumes, timestamps) order
+        symbol_count = self.symbol_count
+        return self.prices[:symbol_count], self.quote_volumes[:symbol_count], self.timestamps[:symbol_count]
+
+    def get_taker_fees(self):
+        return self.taker_fees[:self.symbol_count]
+
+    def get_quote_timestamps(self):
+        return self.quote_timestamps[:self.symbol_count]
+
+    def get_symbol_count(self):
+        return self.symbol_count
+
+    def get_exchanges(self):
+        return self.exchanges
+
+    def _ensure_capacity(self, symbol_count: int):
+        # Called with the matrix lock held
+        if symbol_count > self.prices.shape[0]:
+            symbol_capacity = self.prices.shape[0]
+            while symbol_capacity < symbol_count:
+                symbol_capacity *= 2
+            prices = np.full((symbol_capacity, len(self.exchanges)), np.nan)
+            quote_volumes = np.zeros((symbol_capacity, len(self.exchanges)))
+            timestamps = np.zeros((symbol_capacity, len(self.exchanges)), dtype=np.int64)
+            quote_timestamps = np.zeros((symbol_capacity, len(self.exchanges)), dtype=np.int64)
+            taker_fees = np.zeros((symbol_capacity, len(self.exchanges)))
+            dirty_mask = np.zeros(symbol_capacity, dtype=bool)
+            prices[:self.symbol_count] = self.prices[:self.symbol_count]
+            quote_volumes[:self.symbol_count] = self.quote_volumes[:self.symbol_count]
+            timestamps[:self.symbol_count] = self.timestamps[:self.symbol_count]
+            quote_timestamps[:self.symbol_count] = self.quote_timestamps[:self.symbol_count]
+            taker_fees[:self.symbol_count] = self.taker_fees[:self.symbol_count]
+            dirty_mask[:self.symbol_count] = self.dirty_mask[:self.symbol_count]
+            self.prices, self.quote_volumes, self.timestamps, self.quote_timestamps, self.taker_fees, self.dirty_mask = prices, quote_volumes, timestamps, quote_timestamps, taker_fees, dirty_mask
+        self.symbol_count = max(self.symbol_count, symbol_count)
+        return
@@ -0,0 +1,48 @@
+import threading
+
+class SingletonPriceUpdateNotifier:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonPriceUpdateNotifier.__instance is None:
+            SingletonPriceUpdateNotifier()
+        return SingletonPriceUpdateNotifier.__instance
+
+    def __init__(self):
+        if SingletonPriceUpdateNotifier.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonPriceUpdateNotifier.__instance = PriceUpdateNotifier()
+        return
+
+class PriceUpdateNotifier:
+
+    # A single generation counter bumped by every exchange publish. Readers remember the last generation
+    # they handled, so updates published while they were busy are picked up on the next wait instead of
+    # being lost between clearing and setting an event.
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.exchange_generations = {}
+        return
+
+    def publish(self, exchange: str):
+        self.condition.acquire()
+        self.generation += 1
+        self.exchange_generations[exchange] = self.generation
+        self.condition.notify_all()
+        self.condition.release()
+        return self.generation
+
+    def get_generation(self):
+        return self.generation
+
+    def wait_for_update(self, last_seen_generation: int, timeout: float = None):
+        # Returns the current generation and the exchanges that published after last_seen_generation
+        self.condition.acquire()
+        self.condition.wait_for(lambda: self.generation > last_seen_generation, timeout)
+        generation = self.generation
+        updated_exchanges = [exchange for exchange, exchange_generation in self.exchange_generations.items() if exchange_generation > last_seen_generation]
+        self.condition.release()
+        return generation, updated_exchanges
@@ -0,0 +1,101 @@
+import sys
+import threading
+from src.data.Exchanges import Exchanges
+
+class SingletonSymbolRegistry:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonSymbolRegistry.__instance is None:
+            SingletonSymbolRegistry()
+        return SingletonSymbolRegistry.__instance
+
+    def __init__(self):
+        if SingletonSymbolRegistry.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonSymbolRegistry.__instance = SymbolRegistry()
+        return
+
+class SymbolRegistry:
+
+    # Exchange specific asset codes that differ from the names every other exchange uses
+    ASSET_ALIASES = {
+        Exchanges.KRAKEN.value: {
+            "XBT": "BTC",
+            "XXBT": "BTC",
+            "XDG": "DOGE",
+            "XXDG": "DOGE",
+            "XETH": "ETH",
+            "XETC": "ETC",
+            "XLTC": "LTC",
+            "XMLN": "MLN",
+            "XREP": "REP",
+            "XXLM": "XLM",
+            "XXMR": "XMR",
+            "XXRP": "XRP",
+            "XZEC": "ZEC",
+            "ZAUD": "AUD",
+            "ZCAD": "CAD",
+            "ZEUR": "EUR",
+            "ZGBP": "GBP",
+            "ZJPY": "JPY",
+            "ZUSD": "USD"
+        }
+    }
+
+    def __init__(self):
+        self.registry_lock = threading.Lock()
+
+        # Canonical symbol ids are dense integers so they can also be used as array indices
+        self.canonical_pairs = []
+        self.canonical_symbols = []
+        self.canonical_pair_ids = {}
+
+        self.native_symbol_ids = {}
+        self.native_symbols = {}
+        return
+
+    def normalize_asset(self, exchange: str, asset: str):
+        asset = asset.upper()
+        return self.ASSET_ALIASES.get(exchange, {}).get(asset, asset)
+
+    def register_symbol(self, exchange: str, native_symbol: str, base: str, quote: str):
+        canonical_pair = (sys.intern(self.normalize_asset(exchange, base)), sys.intern(self.normalize_asset(exchange, quote)))
+        self.registry_lock.acquire()
+        symbol_id = self.canonical_pair_ids.get(canonical_pair)
+        if symbol_id is None:
+            symbol_id = len(self.canonical_pairs)
+            self.canonical_pairs.append(canonical_pair)
+            self.canonical_symbols.append(sys.intern(canonical_pair[0] + canonical_pair[1]))
+            self.canonical_pair_ids[canonical_pair] = symbol_id
+        self.native_symbol_ids.setdefault(exchange, {})[native_symbol] = symbol_id
+        self.native_symbols.setdefault(exchange, {})[symbol_id] = native_symbol
+        self.registry_lock.release()
+        return symbol_id
+
+    def register_symbol_rules(self, exchange: str, symbol_index: dict):
+        # Rewrites the SymbolRuleModel entries in place with their canonical id, base and quote
+        for native_symbol, rule in symbol_index.items():
+            rule.symbol_id = self.register_symbol(exchange, native_symbol, rule.base, rule.quote)
+            rule.base, rule.quote = self.canonical_pairs[rule.symbol_id]
+        return
+
+    def get_symbol_id(self, exchange: str, native_symbol: str):
+        return self.native_symbol_ids.get(exchange, {}).get(native_symbol)
+
+    def get_symbol_id_for_pair(self, base: str, quote: str):
+        return self.canonical_pair_ids.get((base, quote))
+
+    def get_native_symbol(self, exchange: str, symbol_id: int):
+        return self.native_symbols.get(exchange, {}).get(symbol_id)
+
+    def get_canonical_symbol(self, symbol_id: int):
+        return self.canonical_symbols[symbol_id]
+
+    def get_canonical_pair(self, symbol_id: int):
+        return self.canonical_pairs[symbol_id]
+
+    def get_symbol_count(self):
+        return len(self.canonical_pairs)
@@ -1,5 +1,6 @@
 from telegram import Bot
 from src.utils.logger import SingletonLogger
+from src.utils.metrics import PipelineMetrics
 import traceback
 import asyncio
 import threading
@@ -21,6 +22,8 @@ class TelegramConnectionService:
         self.users_subsribed = False
         self.logger = SingletonLogger.getInstance()
         self.stop_event = threading.Event()
+        self.send_duration_metric = PipelineMetrics.telegram_send_duration().labels()
+        self.queue_depth_metric = PipelineMetrics.telegram_queue_depth().labels()
         self.thread.start()
         self.logger.log_info("Telegram connection service started")
         self.is_sleeping_for_retry_after = False
@@ -36,12 +39,10 @@ class TelegramConnectionService:
             raise UsersNotSubscribedException("Users not subscribed yet")
         for user_id in self.subscribed_user_ids:
             try:
+                send_start_time = time.perf_counter()
                 self.bot.send_message(chat_id=user_id, text=message)
+                self.send_duration_metric.observe(time.perf_counter() - send_start_time)
             except Exception as e:
-                # Prints the type of the exception in red using ansi escape codes
-                print("\033[91m" + str(type(e)) + "\033[0m")
-                print (user_id)
-
                 if type(e) == BadRequest:
                     self.logger.log_warning(f"Bad request for user {user_id}: {str(e)}")
                 elif type(e) == RetryAfter:
@@ -52,13 +53,15 @@ class TelegramConnectionService:
                 elif type(e) == Unauthorized:
                     self.logger.log_warning(f"Unauthorized to send message to user {user_id}: {str(e)}")
                 else:
-                    self.logger.log_critical(f"Error sending message to user {user_id}: {str(e)}")
-                    traceback.print_exc()
+                    self.logger.log_critical(f"Error sending message to user {user_id}: {type(e).__name__}: {str(e)}" + str(traceback.format_exc()))
 
         return
     
     def send_message(self, message: str):
-        asyncio.run_coroutine_threadsafe(self.send_message_async(message), self.loop)
+        # The queue depth counts the messages handed to the event loop until their sends are done
+        self.queue_depth_metric.inc()
+        future = asyncio.run_coroutine_threadsafe(self.send_message_async(message), self.loop)
+        future.add_done_callback(lambda _: self.queue_depth_metric.dec())
         return
     
     def stop(self):
@@ -75,25 +78,28 @@ class TelegramConnectionService:
     
     def send_message_to_all_users(self, message: str):
         if not self.is_sleeping_for_retry_after:
-            for user_id in self.subscribed_user_ids:
-                try:
-                    self.bot.send_message(chat_id=user_id, text=message)
-                except Exception as e:
-                    # Prints the type of the exception in red using ansi escape codes
-                    print("\033[91m" + str(type(e)) + "\033[0m")
-
-                    if type(e) == BadRequest:
-                        self.logger.log_warning(f"Bad request for user {user_id}: {str(e)}")
-                    elif type(e) == RetryAfter:
-                        self.logger.log_warning(f"Rate limit exceeded. Retry after {e.retry_after} seconds")
-                        self.is_sleeping_for_retry_after = True
-                        time.sleep(e.retry_after)
-                        self.is_sleeping_for_retry_after = False
-                    elif type(e) == Unauthorized:
-                        self.logger.log_warning(f"Unauthorized to send message to user {user_id}: {str(e)}")
-                    else:
-                        self.logger.log_critical(f"Error sending message to user {user_id}: {str(e)}")
-                    traceback.print_exc()
+            # Counted in the queue depth like the messages of send_message while its sends are in progress
+            self.queue_depth_metric.inc()
+            try:
+                for user_id in self.subscribed_user_ids:
+                    try:
+                        send_start_time = time.perf_counter()
+                        self.bot.send_message(chat_id=user_id, text=message)
+                        self.send_duration_metric.observe(time.perf_counter() - send_start_time)
+                    except Exception as e:
+                        if type(e) == BadRequest:
+                            self.logger.log_warning(f"Bad request for user {user_id}: {str(e)}")
+                        elif type(e) == RetryAfter:
+                            self.logger.log_warning(f"Rate limit exceeded. Retry after {e.retry_after} seconds")
+                            self.is_sleeping_for_retry_after = True
+                            time.sleep(e.retry_after)
+                            self.is_sleeping_for_retry_after = False
+                        elif type(e) == Unauthorized:
+                            self.logger.log_warning(f"Unauthorized to send message to user {user_id}: {str(e)}")
+                        else:
+                            self.logger.log_critical(f"Error sending message to user {user_id}: {type(e).__name__}: {str(e)}" + str(traceback.format_exc()))
+            finally:
+                self.queue_depth_metric.dec()
 
         '''
         try:
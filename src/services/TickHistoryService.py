@@ -0,0 +1,350 @@
+import calendar
+import gzip
+import json
+import threading
+import time
+import traceback
+import numpy as np
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.utils.fileutils import FileUtils
+from src.utils.logger import SingletonLogger
+
+class SingletonTickHistory:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonTickHistory.__instance is None:
+            SingletonTickHistory()
+        return SingletonTickHistory.__instance
+
+    def __init__(self):
+        if SingletonTickHistory.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonTickHistory.__instance = TickHistory()
+        return
+
+class TickHistory:
+
+    DEFAULT_FOLDER_NAME = "tick_history"
+    DEFAULT_BATCH_SIZE = 50000
+    DEFAULT_FLUSH_INTERVAL_IN_SECONDS = 5
+    DAY_IN_MILLISECONDS = 86400000
+
+    # Fixed-width columns, one file per column under <folder>/<exchange>/<day>/
+    COLUMN_DTYPES = {
+        "timestamp": np.dtype("<i8"),
+        "symbol_id": np.dtype("<i4"),
+        "price": np.dtype("<f8"),
+        "volume": np.dtype("<f8")
+    }
+    COLUMN_FILE_EXTENSION = ".bin"
+    COMPRESSED_FILE_EXTENSION = ".gz"
+    # One JSON [base, quote] line per symbol of a day, the line number is the symbol id stored in its columns
+    SYMBOLS_FILE_NAME = "symbols.jsonl"
+
+    # Append-only store of every price snapshot the integration services publish. Publishes are buffered and a
+    # writer thread appends them in batches to per-exchange, per-day columnar files, so a day of one exchange is
+    # four flat arrays that can be memory mapped. Days are UTC days of the record timestamps, and the days before
+    # the one being written can be gzipped once the writer moves on to the next day.
+    #
+    # Symbol registry ids depend on the order the rulebooks were loaded in, so they only hold within one process.
+    # Every day folder keeps its own dense symbol ids with a dictionary of their canonical pairs, the writer
+    # translates registry ids into them and queries translate them back into the registry ids of the reading process.
+    #
+    # Appending does nothing until start() is called, so the services can always hand their snapshots over.
+    def __init__(self):
+        self.logger = SingletonLogger.getInstance()
+        self.symbol_registry = SingletonSymbolRegistry.getInstance()
+        self.folder_path = FileUtils.join_paths(FileUtils.current_directory(), self.DEFAULT_FOLDER_NAME)
+        self.batch_size = self.DEFAULT_BATCH_SIZE
+        self.flush_interval_in_seconds = self.DEFAULT_FLUSH_INTERVAL_IN_SECONDS
+        self.compress_rotated_days = False
+
+        self.pending_batches = {}
+        self.pending_row_count = 0
+        self.pending_batches_condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.latest_days = {}
+        # (exchange, day) -> ({canonical pair: day symbol id}, day symbol ids indexed by registry id, -1 if unseen)
+        self.day_symbols = {}
+        # day folder path -> (dictionary file size, registry symbol count, day pairs, registry ids) for the queries
+        self.day_dictionaries = {}
+        self.day_dictionaries_lock = threading.Lock()
+        self.recording = False
+        self.writer_thread = None
+        return
+
+    def start(self,
+                folder_path: str = None,
+                compress_rotated_days: bool = False,
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                flush_interval_in_seconds: float = DEFAULT_FLUSH_INTERVAL_IN_SECONDS):
+        if self.writer_thread is not None:
+            return
+        if folder_path is not None:
+            self.folder_path = folder_path
+        self.compress_rotated_days = compress_rotated_days
+        self.batch_size = batch_size
+        self.flush_interval_in_seconds = flush_interval_in_seconds
+        FileUtils.create_directory_if_not_exists(self.folder_path)
+        self._load_latest_days()
+        self.recording = True
+        self.writer_thread = threading.Thread(target=self._write_pending_batches, daemon=True)
+        self.writer_thread.start()
+        return
+
+    def stop(self):
+        # Whatever is still buffered is written before the writer exits
+        if self.writer_thread is None:
+            return
+        self.pending_batches_condition.acquire()
+        self.recording = False
+        self.pending_batches_condition.notify_all()
+        self.pending_batches_condition.release()
+        self.writer_thread.join()
+        self.writer_thread = None
+        return
+
+    def is_recording(self):
+        return self.recording
+
+    def append(self, exchange: str, price_data_models: dict):
+        # price_data_models maps symbol ids to PriceDataModel, as published by the integration services
+        count = len(price_data_models)
+        if not self.recording or count == 0:
+            return
+        batch = (
+            np.fromiter((model.timestamp for model in price_data_models.values()), dtype=np.int64, count=count),
+            np.fromiter(price_data_models.keys(), dtype=np.int32, count=count),
+            np.fromiter((model.price for model in price_data_models.values()), dtype=np.float64, count=count),
+            np.fromiter((model.volume for model in price_data_models.values()), dtype=np.float64, count=count)
+        )
+        self.pending_batches_condition.acquire()
+        self.pending_batches.setdefault(exchange, []).append(batch)
+        self.pending_row_count += count
+        if self.pending_row_count >= self.batch_size:
+            self.pending_batches_condition.notify_all()
+        self.pending_batches_condition.release()
+        return
+
+    def flush(self):
+        # Writes the buffered snapshots right away, e.g. before querying the latest ticks
+        self.pending_batches_condition.acquire()
+        pending_batches = self.pending_batches
+        self.pending_batches = {}
+        self.pending_row_count = 0
+        self.pending_batches_condition.release()
+        self.write_lock.acquire()
+        try:
+            for exchange, batches in pending_batches.items():
+                self._write_exchange_batches(exchange, batches)
+        finally:
+            self.write_lock.release()
+        return
+
+    def query(self, exchange: str, start_time: int, end_time: int):
+        # Ticks of one exchange with start_time <= timestamp < end_time (milliseconds), as one
+        # (timestamps, symbol_ids, prices, volumes) tuple per day. Uncompressed days are memory mapped and their
+        # arrays are read-only views into the files, gzipped days are decompressed into memory. Every written batch
+        # is sorted by timestamp, the range lookup expects a day's batches to follow each other in time as well.
+        # The symbol ids are the exception, they are translated into a copy holding the registry ids of this
+        # process, -1 for pairs the registry does not know.
+        ranges = []
+        for day_folder_path, (timestamps, day_symbol_ids, prices, volumes) in self._query_day_ranges(exchange, start_time, end_time):
+            registry_symbol_ids = self._get_day_dictionary(day_folder_path)[1]
+            if registry_symbol_ids is not None:
+                day_symbol_ids = registry_symbol_ids[day_symbol_ids]
+            ranges.append((timestamps, day_symbol_ids, prices, volumes))
+        return ranges
+
+    def query_symbol(self, exchange: str, symbol_id: int, start_time: int, end_time: int):
+        # Ticks of a single symbol over the range as one (timestamps, prices, volumes) tuple, only the matching
+        # rows are copied out of the day files
+        timestamps = [np.zeros(0, dtype=np.int64)]
+        prices = [np.zeros(0)]
+        volumes = [np.zeros(0)]
+        canonical_pair = self.symbol_registry.get_canonical_pair(symbol_id)
+        for day_folder_path, (day_timestamps, day_symbol_ids, day_prices, day_volumes) in self._query_day_ranges(exchange, start_time, end_time):
+            day_pairs = self._get_day_dictionary(day_folder_path)[0]
+            if day_pairs is None:
+                symbol_mask = day_symbol_ids == symbol_id
+            elif canonical_pair in day_pairs:
+                symbol_mask = day_symbol_ids == day_pairs.index(canonical_pair)
+            else:
+                continue
+            timestamps.append(day_timestamps[symbol_mask])
+            prices.append(day_prices[symbol_mask])
+            volumes.append(day_volumes[symbol_mask])
+        return np.concatenate(timestamps), np.concatenate(prices), np.concatenate(volumes)
+
+    def _query_day_ranges(self, exchange: str, start_time: int, end_time: int):
+        # (day folder path, columns) of every day with rows in the range, the symbol ids are still the day's own
+        day_ranges = []
+        exchange_folder_path = FileUtils.join_paths(self.folder_path, exchange)
+        for day in range(start_time // self.DAY_IN_MILLISECONDS, (end_time - 1) // self.DAY_IN_MILLISECONDS + 1):
+            day_folder_path = FileUtils.join_paths(exchange_folder_path, self._get_day_folder_name(day))
+            columns = self._read_day_columns(day_folder_path)
+            if columns is None:
+                continue
+            timestamps = columns[0]
+            first_row = np.searchsorted(timestamps, start_time, side="left")
+            last_row = np.searchsorted(timestamps, end_time, side="left")
+            if last_row > first_row:
+                day_ranges.append((day_folder_path, tuple(column[first_row:last_row] for column in columns)))
+        return day_ranges
+
+    def _write_pending_batches(self):
+        while True:
+            self.pending_batches_condition.acquire()
+            self.pending_batches_condition.wait_for(lambda: self.pending_row_count >= self.batch_size or not self.recording, self.flush_interval_in_seconds)
+            recording = self.recording
+            self.pending_batches_condition.release()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.log_critical("Tick history write failed: " + str(e) + str(traceback.format_exc()))
+            if not recording:
+                return
+
+    def _write_exchange_batches(self, exchange: str, batches: list):
+        # Called with the write lock held
+        timestamps, symbol_ids, prices, volumes = (np.concatenate(column) for column in zip(*batches))
+        order = np.argsort(timestamps, kind="stable")
+        columns = (timestamps[order], symbol_ids[order], prices[order], volumes[order])
+        days = columns[0] // self.DAY_IN_MILLISECONDS
+        exchange_folder_path = FileUtils.join_paths(self.folder_path, exchange)
+        FileUtils.create_directory_if_not_exists(exchange_folder_path)
+        for day in np.unique(days).tolist():
+            day_mask = days == day
+            day_folder_path = FileUtils.join_paths(exchange_folder_path, self._get_day_folder_name(day))
+            FileUtils.create_directory_if_not_exists(day_folder_path)
+            # The dictionary is written before the columns, so every stored id can be decoded
+            day_columns = list(column[day_mask] for column in columns)
+            day_columns[1] = self._to_day_symbol_ids(exchange, day, day_folder_path, day_columns[1])
+            for column_name, column in zip(self.COLUMN_DTYPES, day_columns):
+                with open(FileUtils.join_paths(day_folder_path, column_name + self.COLUMN_FILE_EXTENSION), "ab") as file:
+                    file.write(column.astype(self.COLUMN_DTYPES[column_name], copy=False).tobytes())
+            if day > self.latest_days.get(exchange, day):
+                self._rotate_days(exchange_folder_path, day)
+            self.latest_days[exchange] = max(self.latest_days.get(exchange, day), day)
+            for day_key in [day_key for day_key in self.day_symbols if day_key[0] == exchange and day_key[1] < self.latest_days[exchange]]:
+                del self.day_symbols[day_key]
+        return
+
+    def _to_day_symbol_ids(self, exchange: str, day: int, day_folder_path: str, symbol_ids: np.ndarray):
+        # Called with the write lock held, pairs the day has not seen yet get the next day symbol ids and are
+        # appended to its dictionary
+        day_symbols = self.day_symbols.get((exchange, day))
+        if day_symbols is None:
+            day_pairs = self._read_day_symbols(day_folder_path) or []
+            day_symbols = ({pair: day_symbol_id for day_symbol_id, pair in enumerate(day_pairs)}, np.zeros(0, dtype=np.int32))
+        pair_day_symbol_ids, day_symbol_id_lookup = day_symbols
+        if len(day_symbol_id_lookup) <= symbol_ids.max():
+            lookup_size = max(self.symbol_registry.get_symbol_count(), int(symbol_ids.max()) + 1)
+            day_symbol_id_lookup = np.concatenate((day_symbol_id_lookup, np.full(lookup_size - len(day_symbol_id_lookup), -1, dtype=np.int32)))
+        day_symbol_ids = day_symbol_id_lookup[symbol_ids]
+        unseen_symbol_ids = np.unique(symbol_ids[day_symbol_ids < 0])
+        if len(unseen_symbol_ids) > 0:
+            lines = []
+            for symbol_id in unseen_symbol_ids.tolist():
+                pair = self.symbol_registry.get_canonical_pair(symbol_id)
+                day_symbol_id = pair_day_symbol_ids.get(pair)
+                if day_symbol_id is None:
+                    day_symbol_id = len(pair_day_symbol_ids)
+                    pair_day_symbol_ids[pair] = day_symbol_id
+                    lines.append(json.dumps(pair) + "\n")
+                day_symbol_id_lookup[symbol_id] = day_symbol_id
+            if len(lines) > 0:
+                with open(FileUtils.join_paths(day_folder_path, self.SYMBOLS_FILE_NAME), "a") as file:
+                    file.write("".join(lines))
+            day_symbol_ids = day_symbol_id_lookup[symbol_ids]
+        self.day_symbols[(exchange, day)] = (pair_day_symbol_ids, day_symbol_id_lookup)
+        return day_symbol_ids
+
+    def _read_day_symbols(self, day_folder_path: str):
+        # Canonical (base, quote) pairs indexed by day symbol id, None for days written before the dictionary existed
+        symbols_file_path = FileUtils.join_paths(day_folder_path, self.SYMBOLS_FILE_NAME)
+        if not FileUtils.path_file(symbols_file_path):
+            return None
+        with open(symbols_file_path, "r") as file:
+            return [tuple(json.loads(line)) for line in file if line.strip()]
+
+    def _get_day_dictionary(self, day_folder_path: str):
+        # The day's pairs and the registry ids indexed by day symbol id, (None, None) when the day has no dictionary
+        # and stores registry ids as is. Cached until the dictionary grows or the registry learns new pairs.
+        symbols_file_path = FileUtils.join_paths(day_folder_path, self.SYMBOLS_FILE_NAME)
+        if not FileUtils.path_file(symbols_file_path):
+            return None, None
+        file_size = FileUtils.file_size(symbols_file_path)
+        symbol_count = self.symbol_registry.get_symbol_count()
+        self.day_dictionaries_lock.acquire()
+        day_dictionary = self.day_dictionaries.get(day_folder_path)
+        self.day_dictionaries_lock.release()
+        if day_dictionary is None or day_dictionary[0] != file_size or day_dictionary[1] != symbol_count:
+            day_pairs = self._read_day_symbols(day_folder_path)
+            registry_symbol_ids = [self.symbol_registry.get_symbol_id_for_pair(base, quote) for base, quote in day_pairs]
+            registry_symbol_ids = np.array([-1 if symbol_id is None else symbol_id for symbol_id in registry_symbol_ids], dtype=np.int64)
+            day_dictionary = (file_size, symbol_count, day_pairs, registry_symbol_ids)
+            self.day_dictionaries_lock.acquire()
+            self.day_dictionaries[day_folder_path] = day_dictionary
+            self.day_dictionaries_lock.release()
+        return day_dictionary[2], day_dictionary[3]
+
+    def _load_latest_days(self):
+        # The newest day folder of every exchange on disk, so a restarted writer still rotates the day it was on
+        self.latest_days = {}
+        self.day_symbols = {}
+        for exchange in FileUtils.list_directory(self.folder_path):
+            exchange_folder_path = FileUtils.join_paths(self.folder_path, exchange)
+            if not FileUtils.path_directory(exchange_folder_path):
+                continue
+            days = [self._get_day(day_folder_name) for day_folder_name in FileUtils.list_directory(exchange_folder_path)]
+            days = [day for day in days if day is not None]
+            if len(days) > 0:
+                self.latest_days[exchange] = max(days)
+        return
+
+    def _rotate_days(self, exchange_folder_path: str, current_day: int):
+        if not self.compress_rotated_days:
+            return
+        current_day_folder_name = self._get_day_folder_name(current_day)
+        for day_folder_name in FileUtils.list_directory(exchange_folder_path):
+            if day_folder_name >= current_day_folder_name:
+                continue
+            day_folder_path = FileUtils.join_paths(exchange_folder_path, day_folder_name)
+            for column_name in self.COLUMN_DTYPES:
+                column_file_path = FileUtils.join_paths(day_folder_path, column_name + self.COLUMN_FILE_EXTENSION)
+                if FileUtils.path_file(column_file_path):
+                    with open(column_file_path, "rb") as file:
+                        FileUtils.write_bytes_to_file(column_file_path + self.COMPRESSED_FILE_EXTENSION, gzip.compress(file.read()))
+                    FileUtils.remove_file(column_file_path)
+        return
+
+    def _read_day_columns(self, day_folder_path: str):
+        if not FileUtils.path_directory(day_folder_path):
+            return None
+        columns = []
+        for column_name, dtype in self.COLUMN_DTYPES.items():
+            column_file_path = FileUtils.join_paths(day_folder_path, column_name + self.COLUMN_FILE_EXTENSION)
+            if FileUtils.path_file(column_file_path):
+                row_count = FileUtils.file_size(column_file_path) // dtype.itemsize
+                columns.append(np.memmap(column_file_path, dtype=dtype, mode="r", shape=(row_count,)) if row_count > 0 else np.zeros(0, dtype=dtype))
+            elif FileUtils.path_file(column_file_path + self.COMPRESSED_FILE_EXTENSION):
+                with open(column_file_path + self.COMPRESSED_FILE_EXTENSION, "rb") as file:
+                    columns.append(np.frombuffer(gzip.decompress(file.read()), dtype=dtype))
+            else:
+                return None
+        # A column written ahead of the others by a concurrent flush is cut back to the common length
+        row_count = min(len(column) for column in columns)
+        return tuple(column[:row_count] for column in columns)
+
+    def _get_day_folder_name(self, day: int):
+        return time.strftime("%Y%m%d", time.gmtime(day * self.DAY_IN_MILLISECONDS // 1000))
+
+    def _get_day(self, day_folder_name: str):
+        try:
+            return calendar.timegm(time.strptime(day_folder_name, "%Y%m%d")) * 1000 // self.DAY_IN_MILLISECONDS
+        except ValueError:
+            return None
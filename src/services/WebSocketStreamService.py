@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import traceback
+from tornado.websocket import websocket_connect
+from src.utils.logger import SingletonLogger
+from src.utils.responserecorder import SingletonResponseRecorder
+
+class WebSocketStreamService:
+
+    CONNECT_TIMEOUT_IN_SECONDS = 10
+    INITIAL_RECONNECT_DELAY_IN_SECONDS = 1
+    MAX_RECONNECT_DELAY_IN_SECONDS = 30
+    DEFAULT_PING_INTERVAL_IN_SECONDS = 20
+    DEFAULT_STALE_TIMEOUT_IN_SECONDS = 60
+    MAX_MESSAGE_SIZE_IN_BYTES = 64 * 1024 * 1024
+
+    # url_provider and subscription_messages_provider are called on every (re)connect so
+    # tokens and subscriptions are always rebuilt from the latest rulebook
+    def __init__(self,
+                    name: str,
+                    url_provider,
+                    subscription_messages_provider,
+                    message_handler,
+                    ping_message: str = None,
+                    ping_interval_in_seconds: float = DEFAULT_PING_INTERVAL_IN_SECONDS,
+                    stale_timeout_in_seconds: float = DEFAULT_STALE_TIMEOUT_IN_SECONDS):
+        self.logger = SingletonLogger.getInstance()
+        self.response_recorder = SingletonResponseRecorder.getInstance()
+        self.name = name
+        self.url_provider = url_provider
+        self.subscription_messages_provider = subscription_messages_provider
+        self.message_handler = message_handler
+        self.ping_message = ping_message
+        self.ping_interval_in_seconds = ping_interval_in_seconds
+        self.stale_timeout_in_seconds = stale_timeout_in_seconds
+
+        self.loop = None
+        self.thread = None
+        self.running = False
+        self.connection = None
+        self.connection_closed_event = None
+        self.stop_requested_event = None
+        self.streaming = False
+        self.last_message_time = 0
+        self.connection_count = 0
+        return
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_event_loop, daemon=True)
+        self.thread.start()
+        return
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.running = False
+        self.loop.call_soon_threadsafe(self._request_stop)
+        self.thread.join()
+        self.thread = None
+        self.loop.close()
+        self.loop = None
+        return
+
+    def is_streaming(self):
+        return self.streaming
+
+    def set_ping_message(self, ping_message: str, ping_interval_in_seconds: float):
+        self.ping_message = ping_message
+        self.ping_interval_in_seconds = ping_interval_in_seconds
+        return
+
+    def _run_event_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.stop_requested_event = asyncio.Event()
+        self.loop.run_until_complete(self._stream_with_reconnect())
+        return
+
+    async def _stream_with_reconnect(self):
+        reconnect_delay = self.INITIAL_RECONNECT_DELAY_IN_SECONDS
+        while self.running:
+            try:
+                await self._stream_once()
+                reconnect_delay = self.INITIAL_RECONNECT_DELAY_IN_SECONDS
+            except Exception as e:
+                self.logger.log_warning(f"{self.name} stream error: {str(e)}\n{traceback.format_exc()}")
+            self.streaming = False
+            if self.running:
+                await self._wait_for_stop_request(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, self.MAX_RECONNECT_DELAY_IN_SECONDS)
+        return
+
+    async def _stream_once(self):
+        url = self.url_provider()
+        self.connection_closed_event = asyncio.Event()
+        self.connection = await websocket_connect(url,
+                                                  connect_timeout=self.CONNECT_TIMEOUT_IN_SECONDS,
+                                                  on_message_callback=self._on_message,
+                                                  max_message_size=self.MAX_MESSAGE_SIZE_IN_BYTES)
+        self.connection_count += 1
+        try:
+            for subscription_message in self.subscription_messages_provider():
+                await self.connection.write_message(subscription_message)
+            self.last_message_time = time.monotonic()
+            self.streaming = True
+            self.logger.log_info(f"{self.name} stream connected to {url}")
+            while self.running and not self.connection_closed_event.is_set():
+                try:
+                    await asyncio.wait_for(self.connection_closed_event.wait(), self.ping_interval_in_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                if self.connection_closed_event.is_set():
+                    break
+                if time.monotonic() - self.last_message_time > self.stale_timeout_in_seconds:
+                    self.logger.log_warning(f"{self.name} stream is stale, reconnecting")
+                    break
+                if self.ping_message is not None:
+                    await self.connection.write_message(self.ping_message)
+        finally:
+            self.streaming = False
+            self._close_connection()
+        return
+
+    def _on_message(self, message):
+        if message is None:
+            self.connection_closed_event.set()
+            return
+        self.last_message_time = time.monotonic()
+        self.response_recorder.record_stream_message(self.name, message)
+        try:
+            self.message_handler(message)
+        except Exception as e:
+            self.logger.log_critical(f"{self.name} stream message handling failed: {str(e)}\n{traceback.format_exc()}")
+        return
+
+    async def _wait_for_stop_request(self, timeout_in_seconds: float):
+        try:
+            await asyncio.wait_for(self.stop_requested_event.wait(), timeout_in_seconds)
+        except asyncio.TimeoutError:
+            pass
+        return
+
+    def _request_stop(self):
+        self.stop_requested_event.set()
+        self._close_connection()
+        return
+
+    def _close_connection(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.connection_closed_event is not None:
+            self.connection_closed_event.set()
+        return
@@ -0,0 +1,63 @@
+import threading
+import time
+from src.data.CircuitStates import CircuitStates
+
+class CircuitBreaker:
+
+    DEFAULT_FAILURE_THRESHOLD = 3
+    DEFAULT_INITIAL_BACKOFF_IN_SECONDS = 5
+    DEFAULT_MAX_BACKOFF_IN_SECONDS = 300
+
+    # HEALTHY until a request fails, DEGRADED while failures are below the threshold and OPEN after that.
+    # An open circuit lets a single trial request through once its backoff has passed, the backoff doubles
+    # every time that trial fails and everything resets on the first success.
+    def __init__(self,
+                    name: str,
+                    failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                    initial_backoff_in_seconds: float = DEFAULT_INITIAL_BACKOFF_IN_SECONDS,
+                    max_backoff_in_seconds: float = DEFAULT_MAX_BACKOFF_IN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.initial_backoff_in_seconds = initial_backoff_in_seconds
+        self.max_backoff_in_seconds = max_backoff_in_seconds
+
+        self.state = CircuitStates.HEALTHY
+        self.consecutive_failures = 0
+        self.backoff_in_seconds = initial_backoff_in_seconds
+        self.open_until = 0
+        self.lock = threading.Lock()
+        return
+
+    def allow_request(self):
+        self.lock.acquire()
+        allowed = self.state != CircuitStates.OPEN or time.monotonic() >= self.open_until
+        self.lock.release()
+        return allowed
+
+    def record_success(self):
+        self.lock.acquire()
+        self.state = CircuitStates.HEALTHY
+        self.consecutive_failures = 0
+        self.backoff_in_seconds = self.initial_backoff_in_seconds
+        self.lock.release()
+        return
+
+    def record_failure(self):
+        self.lock.acquire()
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.state = CircuitStates.OPEN
+            self.open_until = time.monotonic() + self.backoff_in_seconds
+            self.backoff_in_seconds = min(self.backoff_in_seconds * 2, self.max_backoff_in_seconds)
+        else:
+            self.state = CircuitStates.DEGRADED
+        self.lock.release()
+        return
+
+    def get_state(self):
+        return self.state
+
+    def get_seconds_until_retry(self):
+        if self.state != CircuitStates.OPEN:
+            return 0
+        return max(0, self.open_until - time.monotonic())
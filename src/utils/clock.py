@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+
+class SingletonClock:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonClock.__instance is None:
+            SingletonClock()
+        return SingletonClock.__instance
+
+    def __init__(self):
+        if SingletonClock.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonClock.__instance = Clock()
+        return
+
+class ClockOffsetEstimator:
+
+    DEFAULT_SAMPLE_COUNT = 64
+
+    # Estimates how far an exchange's clock runs ahead of the local one from the server timestamps of its
+    # responses and the local timestamps they were received at. Every sample is the true offset minus the time the
+    # data spent in the exchange's pipeline and on the wire, both only make it smaller, so like NTP keeping the
+    # sample with the smallest delay the estimate is the largest of the recent samples.
+    def __init__(self, sample_count: int = DEFAULT_SAMPLE_COUNT):
+        self.samples = deque(maxlen=sample_count)
+        self.samples_lock = threading.Lock()
+        self.offset_in_ms = None
+        return
+
+    def add_sample(self, server_timestamp: int, receive_timestamp: int):
+        # Responses without a server timestamp pass None and are skipped
+        if server_timestamp is None:
+            return
+        self.samples_lock.acquire()
+        self.samples.append(server_timestamp - receive_timestamp)
+        self.offset_in_ms = max(self.samples)
+        self.samples_lock.release()
+        return
+
+    def get_offset_in_ms(self):
+        # None until the first sample
+        return self.offset_in_ms
+
+    def to_local_timestamp(self, server_timestamp: int):
+        offset_in_ms = self.offset_in_ms
+        return server_timestamp if offset_in_ms is None else server_timestamp - offset_in_ms
+
+class Clock:
+
+    # Time source of the price data and the freshness checks. Live runs read the system clocks, a replay switches
+    # it to a simulated time that only moves when the replay advances it, so timestamps and data ages follow the
+    # recording instead of the wall clock.
+    #
+    # Record timestamps come from timestamp_in_ms(), epoch milliseconds that only move forward: the wall clock at
+    # start-up advanced by the monotonic clock, so a stepped system clock cannot reorder records or make two
+    # exchanges' quotes look further apart than they are. The exchanges' own clocks are related to it by one
+    # offset estimator per exchange.
+    def __init__(self):
+        self.simulated_time = None
+        self.epoch_anchor = time.time()
+        self.monotonic_anchor = time.monotonic()
+        self.offset_estimators = {}
+        self.offset_estimators_lock = threading.Lock()
+        return
+
+    def time(self):
+        simulated_time = self.simulated_time
+        return time.time() if simulated_time is None else simulated_time
+
+    def monotonic(self):
+        simulated_time = self.simulated_time
+        return time.monotonic() if simulated_time is None else simulated_time
+
+    def timestamp_in_ms(self):
+        simulated_time = self.simulated_time
+        if simulated_time is not None:
+            return int(round(simulated_time * 1000))
+        return int(round((self.epoch_anchor + time.monotonic() - self.monotonic_anchor) * 1000))
+
+    def get_offset_estimator(self, exchange: str):
+        self.offset_estimators_lock.acquire()
+        offset_estimator = self.offset_estimators.get(exchange)
+        if offset_estimator is None:
+            offset_estimator = ClockOffsetEstimator()
+            self.offset_estimators[exchange] = offset_estimator
+        self.offset_estimators_lock.release()
+        return offset_estimator
+
+    def get_offsets_in_ms(self):
+        # Estimated offset of every exchange's clock to the local one, None for exchanges without server timestamps
+        return {exchange: offset_estimator.get_offset_in_ms() for exchange, offset_estimator in list(self.offset_estimators.items())}
+
+    def set_simulated_time(self, simulated_time: float):
+        self.simulated_time = simulated_time
+        return
+
+    def use_system_time(self):
+        self.simulated_time = None
+        return
+
+    def is_simulated(self):
+        return self.simulated_time is not None
@@ -30,6 +30,28 @@ class FileUtils:
             FileUtils.create_directory(path)
         return
     
+    @staticmethod
+    def file_modification_time(path):
+        return os.path.getmtime(path)
+
+    @staticmethod
+    def file_size(path):
+        return os.path.getsize(path)
+
+    @staticmethod
+    def list_directory(path):
+        return sorted(os.listdir(path))
+
+    @staticmethod
+    def remove_file(path):
+        os.remove(path)
+        return
+
+    @staticmethod
+    def touch_file(path):
+        os.utime(path, None)
+        return
+    
     @staticmethod
     def join_paths(path1, path2):
         return os.path.join(path1, path2)
@@ -40,6 +62,15 @@ class FileUtils:
             json.dump(data, file, indent=4)
         return
     
+    @staticmethod
+    def write_bytes_to_file(file_path, data):
+        # Written next to the target and swapped in, so readers never see a half written file
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, 'wb') as file:
+            file.write(data)
+        os.replace(temporary_file_path, file_path)
+        return
+    
     @staticmethod
     def read_json_from_file(file_path):
         with open(file_path, 'r') as file:
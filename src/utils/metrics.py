@@ -0,0 +1,276 @@
+import math
+import threading
+from collections import deque
+import numpy as np
+
+class SingletonMetricsRegistry:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonMetricsRegistry.__instance is None:
+            SingletonMetricsRegistry()
+        return SingletonMetricsRegistry.__instance
+
+    def __init__(self):
+        if SingletonMetricsRegistry.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonMetricsRegistry.__instance = MetricsRegistry()
+        return
+
+class MetricTypes:
+    COUNTER = "counter"
+    GAUGE = "gauge"
+    HISTOGRAM = "histogram"
+
+class Histogram:
+
+    FOLD_THRESHOLD = 4096
+
+    # One labeled series of a histogram family. Observations only go onto a deque, appending to it is atomic and
+    # keeps observe() at a fraction of a microsecond without taking a lock (benchmarks/metrics.py). Every
+    # FOLD_THRESHOLD observations, and whenever the registry is rendered, the pending values are drained and
+    # counted into their buckets in one vectorized pass. The bucket counts are per bucket, the cumulative counts
+    # Prometheus expects are summed up when rendering.
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = np.array(upper_bounds, dtype=np.float64)
+        self.bucket_counts = np.zeros(len(upper_bounds) + 1, dtype=np.int64)
+        self.sum = 0.0
+        self.pending_values = deque()
+        self.fold_lock = threading.Lock()
+        return
+
+    def observe(self, value: float):
+        pending_values = self.pending_values
+        pending_values.append(value)
+        # Whoever crosses the threshold while another thread is folding leaves the values to that thread
+        if len(pending_values) >= self.FOLD_THRESHOLD and self.fold_lock.acquire(blocking=False):
+            self._fold_pending_values()
+            self.fold_lock.release()
+        return
+
+    def get_samples(self):
+        # (upper bound, cumulative count) tuples ending with +Inf, the sum and the count
+        self.fold_lock.acquire()
+        self._fold_pending_values()
+        cumulative_counts = np.cumsum(self.bucket_counts).tolist()
+        value_sum = self.sum
+        self.fold_lock.release()
+        return list(zip(self.upper_bounds.tolist() + [math.inf], cumulative_counts)), value_sum, cumulative_counts[-1]
+
+    def _fold_pending_values(self):
+        # Called with the fold lock held, values appended while folding stay pending for the next fold
+        pending_values = self.pending_values
+        count = len(pending_values)
+        if count == 0:
+            return
+        values = np.fromiter((pending_values.popleft() for _ in range(count)), dtype=np.float64, count=count)
+        self.bucket_counts += np.bincount(np.searchsorted(self.upper_bounds, values, side="left"), minlength=len(self.bucket_counts))
+        self.sum += float(values.sum())
+        return
+
+class Counter:
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+        return
+
+    def inc(self, amount: float = 1):
+        self.lock.acquire()
+        self.value += amount
+        self.lock.release()
+        return
+
+    def get_value(self):
+        return self.value
+
+class Gauge:
+
+    # Either set by its owner or read from a function when the registry is rendered, e.g. for queue depths that
+    # are cheaper to look at on a scrape than to track on every change
+    def __init__(self):
+        self.value = 0
+        self.value_function = None
+        self.lock = threading.Lock()
+        return
+
+    def set(self, value: float):
+        self.value = value
+        return
+
+    def inc(self, amount: float = 1):
+        self.lock.acquire()
+        self.value += amount
+        self.lock.release()
+        return
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+        return
+
+    def set_function(self, value_function):
+        self.value_function = value_function
+        return
+
+    def get_value(self):
+        value_function = self.value_function
+        return self.value if value_function is None else value_function()
+
+class MetricFamily:
+
+    # A named metric with its labeled series, labels() hands out the series of a set of label values and creates
+    # it on first use. Hot paths keep the series they record into instead of looking it up every time.
+    def __init__(self, name: str, documentation: str, metric_type: str, label_names: tuple, series_factory):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = label_names
+        self.series_factory = series_factory
+        self.series = {}
+        self.series_lock = threading.Lock()
+        return
+
+    def labels(self, *label_values):
+        # Label values are strings, e.g. Exchanges values
+        series = self.series.get(label_values)
+        if series is None:
+            if len(label_values) != len(self.label_names):
+                raise ValueError(self.name + " expects the labels " + ", ".join(self.label_names))
+            self.series_lock.acquire()
+            series = self.series.setdefault(label_values, self.series_factory())
+            self.series_lock.release()
+        return series
+
+    def get_series(self):
+        self.series_lock.acquire()
+        series = dict(self.series)
+        self.series_lock.release()
+        return series
+
+class MetricsRegistry:
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    # Upper bounds in seconds for request and processing durations
+    LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    # Upper bounds in seconds for the age of the price data
+    STALENESS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 300)
+    # Upper bounds for item counts such as the pairs in a snapshot
+    SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    # Process-wide registry of the pipeline metrics. The services register their families once and keep the
+    # series they record into, render() writes everything out in the Prometheus text exposition format for the
+    # MetricsServerService.
+    def __init__(self):
+        self.families = {}
+        self.families_lock = threading.Lock()
+        return
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()):
+        return self._get_or_create_family(name, documentation, MetricTypes.COUNTER, label_names, Counter)
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()):
+        return self._get_or_create_family(name, documentation, MetricTypes.GAUGE, label_names, Gauge)
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS, label_names: tuple = ()):
+        upper_bounds = tuple(sorted(float(bucket) for bucket in buckets))
+        return self._get_or_create_family(name, documentation, MetricTypes.HISTOGRAM, label_names, lambda: Histogram(upper_bounds))
+
+    def _get_or_create_family(self, name: str, documentation: str, metric_type: str, label_names: tuple, series_factory):
+        # Services created more than once, e.g. by the benchmarks, share the family registered first
+        self.families_lock.acquire()
+        family = self.families.get(name)
+        if family is None:
+            family = MetricFamily(name, documentation, metric_type, tuple(label_names), series_factory)
+            self.families[name] = family
+        self.families_lock.release()
+        if family.metric_type != metric_type or family.label_names != tuple(label_names):
+            raise ValueError(name + " is already registered as a " + family.metric_type + " with the labels " + ", ".join(family.label_names))
+        return family
+
+    def render(self):
+        self.families_lock.acquire()
+        families = list(self.families.values())
+        self.families_lock.release()
+        lines = []
+        for family in families:
+            lines.append("# HELP " + family.name + " " + family.documentation.replace("\\", "\\\\").replace("\n", "\\n"))
+            lines.append("# TYPE " + family.name + " " + family.metric_type)
+            for label_values, series in family.get_series().items():
+                labels = list(zip(family.label_names, label_values))
+                if family.metric_type == MetricTypes.HISTOGRAM:
+                    cumulative_counts, value_sum, count = series.get_samples()
+                    for upper_bound, cumulative_count in cumulative_counts:
+                        lines.append(family.name + "_bucket" + self._format_labels(labels + [("le", self._format_value(upper_bound))]) + " " + str(cumulative_count))
+                    lines.append(family.name + "_sum" + self._format_labels(labels) + " " + self._format_value(value_sum))
+                    lines.append(family.name + "_count" + self._format_labels(labels) + " " + str(count))
+                else:
+                    lines.append(family.name + self._format_labels(labels) + " " + self._format_value(series.get_value()))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_labels(labels: list):
+        if len(labels) == 0:
+            return ""
+        return "{" + ",".join(name + "=\"" + value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") + "\"" for name, value in labels) + "}"
+
+    @staticmethod
+    def _format_value(value: float):
+        # Gauges read from a function render a None as NaN
+        if value is None or value != value:
+            return "NaN"
+        if value == math.inf:
+            return "+Inf"
+        if value == -math.inf:
+            return "-Inf"
+        return repr(value)
+
+class PipelineMetrics:
+
+    # The metric families of the price pipeline, registered on first use so every recorder shares them. Durations
+    # are in seconds, the recorders keep the labeled series they observe into.
+    @staticmethod
+    def fetch_duration():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_fetch_duration_seconds", "Duration of the REST requests to the exchanges", MetricsRegistry.LATENCY_BUCKETS, ("exchange",))
+
+    @staticmethod
+    def fetch_failures():
+        return SingletonMetricsRegistry.getInstance().counter("klerosai_fetch_failures_total", "REST requests to the exchanges that failed or returned an error status", ("exchange",))
+
+    @staticmethod
+    def parse_duration():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_ticker_parse_duration_seconds", "Time to decode a ticker response into price data", MetricsRegistry.LATENCY_BUCKETS, ("exchange",))
+
+    @staticmethod
+    def snapshot_size():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_snapshot_size_pairs", "Pairs in a price snapshot published by an exchange service", MetricsRegistry.SIZE_BUCKETS, ("exchange",))
+
+    @staticmethod
+    def quote_staleness():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_quote_staleness_seconds", "Age of an exchange's price data at each analysis pass", MetricsRegistry.STALENESS_BUCKETS, ("exchange",))
+
+    @staticmethod
+    def analysis_cycle_duration():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_analysis_cycle_duration_seconds", "Duration of an ArbiSense analysis pass", MetricsRegistry.LATENCY_BUCKETS)
+
+    @staticmethod
+    def opportunities_per_cycle():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_opportunities_per_cycle", "Open cross exchange opportunities after an analysis pass", MetricsRegistry.SIZE_BUCKETS)
+
+    @staticmethod
+    def telegram_send_duration():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_telegram_send_duration_seconds", "Duration of a successful Telegram message send to one user", MetricsRegistry.LATENCY_BUCKETS)
+
+    @staticmethod
+    def telegram_queue_depth():
+        return SingletonMetricsRegistry.getInstance().gauge("klerosai_telegram_queue_depth", "Telegram messages queued or being sent to the subscribed users")
+
+    @staticmethod
+    def gpt_request_duration():
+        return SingletonMetricsRegistry.getInstance().histogram("klerosai_gpt_request_duration_seconds", "Duration of the successful GPT chat completion requests", MetricsRegistry.LATENCY_BUCKETS)
+
+    @staticmethod
+    def clock_offset():
+        return SingletonMetricsRegistry.getInstance().gauge("klerosai_exchange_clock_offset_milliseconds", "Estimated offset of an exchange's clock to the local clock", ("exchange",))
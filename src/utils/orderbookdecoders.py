@@ -0,0 +1,49 @@
+import orjson
+
+class OrderBookDecodeFailedException(Exception):
+    pass
+
+class OrderBookDecoders:
+
+    # Every decoder takes the raw response body of one L2 order book request and returns (bids, asks),
+    # each a list of (price, quantity) float tuples ordered from the best level outwards.
+
+    @staticmethod
+    def _levels(levels: list):
+        return [(float(level[0]), float(level[1])) for level in levels]
+
+    @staticmethod
+    def decode_binance_order_book(content: bytes):
+        data = orjson.loads(content)
+        return OrderBookDecoders._levels(data["bids"]), OrderBookDecoders._levels(data["asks"])
+
+    @staticmethod
+    def decode_bybit_order_book(content: bytes):
+        data = orjson.loads(content)
+        if data["retCode"] != 0:
+            raise OrderBookDecodeFailedException(str(data))
+        return OrderBookDecoders._levels(data["result"]["b"]), OrderBookDecoders._levels(data["result"]["a"])
+
+    @staticmethod
+    def decode_kraken_order_book(content: bytes):
+        data = orjson.loads(content)
+        if data.get("error"):
+            raise OrderBookDecodeFailedException(str(data["error"]))
+        # The result is keyed by Kraken's own name of the pair, which is not always the requested one
+        for order_book in data["result"].values():
+            return OrderBookDecoders._levels(order_book["bids"]), OrderBookDecoders._levels(order_book["asks"])
+        raise OrderBookDecodeFailedException("Empty Kraken order book result")
+
+    @staticmethod
+    def decode_kucoin_order_book(content: bytes):
+        data = orjson.loads(content)
+        if data.get("code") != "200000":
+            raise OrderBookDecodeFailedException(str(data))
+        return OrderBookDecoders._levels(data["data"]["bids"] or []), OrderBookDecoders._levels(data["data"]["asks"] or [])
+
+    @staticmethod
+    def decode_okx_order_book(content: bytes):
+        data = orjson.loads(content)
+        if data.get("code") != "0" or len(data.get("data", [])) == 0:
+            raise OrderBookDecodeFailedException(str(data))
+        return OrderBookDecoders._levels(data["data"][0]["bids"]), OrderBookDecoders._levels(data["data"][0]["asks"])
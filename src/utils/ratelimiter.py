@@ -0,0 +1,106 @@
+import threading
+import time
+
+class RateLimiter:
+
+    # Part of the budget the polling loop may plan with, the rest stays free for rulebook, depth and stream token requests
+    DEFAULT_POLLING_BUDGET_SHARE = 0.5
+    DEFAULT_RETRY_AFTER_IN_SECONDS = 60
+
+    # Token bucket holding one exchange's request weight budget. Every request made under the exchange's
+    # transport label takes its weight from the same bucket, and the exchange's rate limit headers pull
+    # the bucket down whenever the server reports less budget left than the local count.
+    #
+    # used_weight_header: header with the weight used in the current window (Binance)
+    # remaining_header / limit_header: headers with the remaining and total budget of the window (KuCoin, ByBit)
+    def __init__(self,
+                    name: str,
+                    capacity: float,
+                    window_in_seconds: float,
+                    used_weight_header: str = None,
+                    remaining_header: str = None,
+                    limit_header: str = None,
+                    polling_budget_share: float = DEFAULT_POLLING_BUDGET_SHARE):
+        self.name = name
+        self.capacity = capacity
+        self.window_in_seconds = window_in_seconds
+        self.refill_rate_per_second = capacity / window_in_seconds
+        self.used_weight_header = used_weight_header
+        self.remaining_header = remaining_header
+        self.limit_header = limit_header
+        self.polling_budget_share = polling_budget_share
+
+        self.tokens = capacity
+        self.last_refill_time = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        return
+
+    def acquire(self, weight: float = 1):
+        # Returns False without taking any weight when the limiter was stopped while waiting for the budget
+        while True:
+            self.lock.acquire()
+            self._refill()
+            now = time.monotonic()
+            if now >= self.blocked_until and self.tokens >= weight:
+                self.tokens -= weight
+                self.lock.release()
+                return True
+            if now < self.blocked_until:
+                wait_time = self.blocked_until - now
+            else:
+                wait_time = (weight - self.tokens) / self.refill_rate_per_second
+            self.lock.release()
+            if self.stop_event.wait(wait_time):
+                return False
+
+    def stop(self):
+        # Wakes up the requests waiting out a Retry-After or an empty bucket, so a shutdown does not wait for them
+        self.stop_event.set()
+        return
+
+    def update_from_headers(self, headers):
+        available_tokens = None
+        if self.used_weight_header is not None and self.used_weight_header in headers:
+            available_tokens = self.capacity - float(headers[self.used_weight_header])
+        elif self.remaining_header is not None and self.remaining_header in headers:
+            remaining = float(headers[self.remaining_header])
+            limit = float(headers[self.limit_header]) if self.limit_header is not None and self.limit_header in headers else self.capacity
+            available_tokens = remaining * self.capacity / limit if limit > 0 else 0
+        if available_tokens is None:
+            return
+        self.lock.acquire()
+        self._refill()
+        self.tokens = max(0, min(self.tokens, available_tokens))
+        self.lock.release()
+        return
+
+    def block(self, retry_after_in_seconds: float = None):
+        # Called on 429/418 responses, nothing is sent under this label until the exchange's Retry-After has passed
+        if retry_after_in_seconds is None:
+            retry_after_in_seconds = self.DEFAULT_RETRY_AFTER_IN_SECONDS
+        self.lock.acquire()
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after_in_seconds)
+        self.tokens = 0
+        self.last_refill_time = max(self.last_refill_time, self.blocked_until)
+        self.lock.release()
+        return
+
+    def get_polling_interval(self, weight: float):
+        # Fastest interval at which a request of this weight fits into the polling share of the budget
+        return weight / (self.refill_rate_per_second * self.polling_budget_share)
+
+    def get_available_tokens(self):
+        self.lock.acquire()
+        self._refill()
+        tokens = self.tokens
+        self.lock.release()
+        return tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self.last_refill_time:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill_time) * self.refill_rate_per_second)
+            self.last_refill_time = now
+        return
@@ -0,0 +1,94 @@
+import gzip
+import heapq
+import threading
+import orjson
+from src.utils.clock import SingletonClock
+
+class SingletonResponseRecorder:
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        if SingletonResponseRecorder.__instance is None:
+            SingletonResponseRecorder()
+        return SingletonResponseRecorder.__instance
+
+    def __init__(self):
+        if SingletonResponseRecorder.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            SingletonResponseRecorder.__instance = ResponseRecorder()
+        return
+
+class ResponseRecorder:
+
+    RESPONSE = "response"
+    STREAM_MESSAGE = "stream_message"
+
+    # Captures the raw exchange responses and stream messages into a gzipped JSON lines fixture, one record per
+    # line with the clock time it arrived at. The HTTP transport and the stream services hand everything over,
+    # recording does nothing until start() is called.
+    def __init__(self):
+        self.clock = SingletonClock.getInstance()
+        self.file = None
+        self.file_lock = threading.Lock()
+        self.record_count = 0
+        return
+
+    def start(self, recording_path: str):
+        self.file_lock.acquire()
+        if self.file is None:
+            self.file = gzip.open(recording_path, "ab")
+        self.file_lock.release()
+        return
+
+    def stop(self):
+        self.file_lock.acquire()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.file_lock.release()
+        return
+
+    def is_recording(self):
+        return self.file is not None
+
+    def get_record_count(self):
+        return self.record_count
+
+    def record_response(self, exchange: str, url: str, params: dict, content: bytes):
+        if self.file is None:
+            return
+        self._write({"time": self.clock.time(), "kind": self.RESPONSE, "exchange": exchange, "url": url, "params": params, "body": content.decode("utf-8")})
+        return
+
+    def record_stream_message(self, exchange: str, message):
+        if self.file is None:
+            return
+        self._write({"time": self.clock.time(), "kind": self.STREAM_MESSAGE, "exchange": exchange, "body": message if isinstance(message, str) else message.decode("utf-8")})
+        return
+
+    def _write(self, record: dict):
+        line = orjson.dumps(record) + b"\n"
+        self.file_lock.acquire()
+        if self.file is not None:
+            self.file.write(line)
+            self.record_count += 1
+        self.file_lock.release()
+        return
+
+    @staticmethod
+    def read_records(recording_path: str):
+        # A recording cut off by a crash ends at its last complete record
+        with gzip.open(recording_path, "rb") as file:
+            try:
+                for line in file:
+                    if line.endswith(b"\n"):
+                        yield orjson.loads(line)
+            except EOFError:
+                return
+
+    @staticmethod
+    def read_merged_records(recording_paths: list):
+        # Records of several recordings in time order, each recording is already ordered by time
+        return heapq.merge(*(ResponseRecorder.read_records(recording_path) for recording_path in recording_paths), key=lambda record: record["time"])
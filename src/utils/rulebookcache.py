@@ -0,0 +1,86 @@
+import threading
+import time
+import traceback
+from src.utils.fileutils import FileUtils
+from src.utils.logger import SingletonLogger
+from src.utils.rulebookformat import RulebookFormat
+
+class RulebookCache:
+
+    DEFAULT_TIME_TO_LIVE_IN_SECONDS = 3600
+
+    # rulebook_path points at the binary rulebook, the JSON rulebooks written by older versions
+    # are still read through legacy_rules_parser until the first refresh replaces them
+    def __init__(self,
+                    rulebook_path: str,
+                    legacy_rulebook_path: str = None,
+                    legacy_rules_parser = None,
+                    time_to_live_in_seconds: float = DEFAULT_TIME_TO_LIVE_IN_SECONDS):
+        self.logger = SingletonLogger.getInstance()
+        self.rulebook_path = rulebook_path
+        self.legacy_rulebook_path = legacy_rulebook_path
+        self.legacy_rules_parser = legacy_rules_parser
+        self.time_to_live_in_seconds = time_to_live_in_seconds
+        self.content_hash = None
+
+        self.refresh_thread = None
+        self.refresh_stop_event = threading.Event()
+        return
+
+    def set_time_to_live(self, time_to_live_in_seconds: float):
+        self.time_to_live_in_seconds = time_to_live_in_seconds
+        return
+
+    def load(self):
+        try:
+            if FileUtils.path_file(self.rulebook_path):
+                symbol_index, self.content_hash = RulebookFormat.read(self.rulebook_path)
+                return symbol_index
+            if self.legacy_rulebook_path is not None and self.legacy_rules_parser is not None and FileUtils.path_file(self.legacy_rulebook_path):
+                return self.legacy_rules_parser(FileUtils.read_json_from_file(self.legacy_rulebook_path))
+        except Exception as e:
+            self.logger.log_warning("Cached rulebook could not be read " + self.rulebook_path + ": " + str(e))
+        return None
+
+    def save_if_changed(self, symbol_index: dict):
+        columns = RulebookFormat.build_columns(symbol_index)
+        content_hash = RulebookFormat.calculate_content_hash(columns)
+        if content_hash == self.content_hash and FileUtils.path_file(self.rulebook_path):
+            # Only the modification time is refreshed so the next start knows the cache is still fresh
+            FileUtils.touch_file(self.rulebook_path)
+            return False
+        RulebookFormat.write(self.rulebook_path, columns, content_hash)
+        self.content_hash = content_hash
+        return True
+
+    def get_seconds_until_stale(self):
+        if not FileUtils.path_file(self.rulebook_path):
+            return 0
+        age_in_seconds = time.time() - FileUtils.file_modification_time(self.rulebook_path)
+        return max(0, self.time_to_live_in_seconds - age_in_seconds)
+
+    def start_refresh_thread(self, refresh_function):
+        if self.refresh_thread is not None:
+            return
+        self.refresh_stop_event.clear()
+        self.refresh_thread = threading.Thread(target=self._refresh_loop, args=(refresh_function,), daemon=True)
+        self.refresh_thread.start()
+        return
+
+    def stop_refresh_thread(self):
+        if self.refresh_thread is None:
+            return
+        self.refresh_stop_event.set()
+        self.refresh_thread.join()
+        self.refresh_thread = None
+        return
+
+    def _refresh_loop(self, refresh_function):
+        wait_time = self.get_seconds_until_stale()
+        while not self.refresh_stop_event.wait(wait_time):
+            try:
+                refresh_function()
+            except Exception as e:
+                self.logger.log_critical("Rulebook refresh failed for " + self.rulebook_path + ": " + str(e) + str(traceback.format_exc()))
+            wait_time = self.time_to_live_in_seconds
+        return
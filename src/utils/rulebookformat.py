@@ -0,0 +1,74 @@
+import hashlib
+import sys
+import msgpack
+from array import array
+from src.models.SymbolRuleModel import SymbolRuleModel
+from src.utils.fileutils import FileUtils
+
+class RulebookFormatException(Exception):
+    pass
+
+class RulebookFormat:
+
+    FORMAT_VERSION = 2
+    FILE_EXTENSION = ".rulebook"
+
+    # Columnar msgpack layout: one list or packed array per SymbolRuleModel field, rows sorted by symbol.
+    # trading is one byte per symbol, tick_size and taker_fee packed float64 arrays, so loading needs no per-field parsing.
+    # Files of an older version are rejected, which makes the services fetch and rewrite the rules.
+    @staticmethod
+    def build_columns(symbol_index: dict):
+        symbols = sorted(symbol_index)
+        rules = [symbol_index[symbol] for symbol in symbols]
+        return {
+            "symbol": symbols,
+            "trading": bytes(rule.trading for rule in rules),
+            "base": [rule.base for rule in rules],
+            "quote": [rule.quote for rule in rules],
+            "tick_size": array('d', (rule.tick_size for rule in rules)).tobytes(),
+            "taker_fee": array('d', (rule.taker_fee for rule in rules)).tobytes(),
+            "stream_symbol": [rule.stream_symbol if rule.stream_symbol != rule.symbol else None for rule in rules]
+        }
+
+    @staticmethod
+    def calculate_content_hash(columns: dict):
+        return hashlib.sha256(msgpack.packb(columns, use_bin_type=True)).hexdigest()
+
+    @staticmethod
+    def write(file_path: str, columns: dict, content_hash: str):
+        rulebook = {
+            "version": RulebookFormat.FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "content_hash": content_hash,
+            "columns": columns
+        }
+        FileUtils.write_bytes_to_file(file_path, msgpack.packb(rulebook, use_bin_type=True))
+        return
+
+    @staticmethod
+    def read(file_path: str):
+        with open(file_path, 'rb') as file:
+            rulebook = msgpack.unpackb(file.read(), raw=False)
+        if rulebook.get("version") != RulebookFormat.FORMAT_VERSION:
+            raise RulebookFormatException("Unsupported rulebook version in " + file_path + ": " + str(rulebook.get("version")))
+        return RulebookFormat.build_symbol_index(rulebook["columns"], rulebook["byteorder"]), rulebook["content_hash"]
+
+    @staticmethod
+    def build_symbol_index(columns: dict, byteorder: str = sys.byteorder):
+        tick_sizes = array('d')
+        tick_sizes.frombytes(columns["tick_size"])
+        taker_fees = array('d')
+        taker_fees.frombytes(columns["taker_fee"])
+        if byteorder != sys.byteorder:
+            tick_sizes.byteswap()
+            taker_fees.byteswap()
+        symbol_index = {}
+        for symbol, trading, base, quote, tick_size, taker_fee, stream_symbol in zip(columns["symbol"],
+                                                                                     columns["trading"],
+                                                                                     columns["base"],
+                                                                                     columns["quote"],
+                                                                                     tick_sizes,
+                                                                                     taker_fees,
+                                                                                     columns["stream_symbol"]):
+            symbol_index[symbol] = SymbolRuleModel(symbol, trading == 1, base, quote, tick_size, taker_fee, stream_symbol)
+        return symbol_index
@@ -0,0 +1,73 @@
+import orjson
+
+class TickerDecodeFailedException(Exception):
+    pass
+
+class TickerDecoders:
+
+    # Every decoder takes the raw response body and the native symbol -> symbol id map of the symbols
+    # the service tracks, and returns (symbol_id, symbol, price, volume) records for those symbols only.
+    # Untracked tickers are skipped before any of their fields are converted.
+    #
+    # The records come with the exchange's server timestamp of the response in epoch milliseconds, the latest
+    # ticker timestamp where the exchange stamps every ticker, or None when the response carries none (Kraken).
+
+    @staticmethod
+    def decode_binance_tickers(content: bytes, symbol_ids: dict):
+        records = []
+        server_timestamp = 0
+        for ticker in orjson.loads(content):
+            symbol_id = symbol_ids.get(ticker["symbol"])
+            if symbol_id is not None:
+                records.append((symbol_id, ticker["symbol"], float(ticker["lastPrice"]), float(ticker["volume"])))
+                close_time = ticker.get("closeTime", 0)
+                if close_time > server_timestamp:
+                    server_timestamp = close_time
+        return records, server_timestamp or None
+
+    @staticmethod
+    def decode_bybit_tickers(content: bytes, symbol_ids: dict):
+        data = orjson.loads(content)
+        if data["retCode"] != 0:
+            raise TickerDecodeFailedException(str(data))
+        records = []
+        for ticker in data["result"]["list"]:
+            symbol_id = symbol_ids.get(ticker["symbol"])
+            if symbol_id is not None:
+                records.append((symbol_id, ticker["symbol"], float(ticker.get("lastPrice") or 0), float(ticker.get("volume24h") or 0)))
+        return records, data.get("time")
+
+    @staticmethod
+    def decode_kraken_tickers(content: bytes, symbol_ids: dict):
+        data = orjson.loads(content)
+        if data.get("error"):
+            raise TickerDecodeFailedException(str(data["error"]))
+        records = []
+        for symbol, ticker in data["result"].items():
+            symbol_id = symbol_ids.get(symbol)
+            if symbol_id is not None:
+                records.append((symbol_id, symbol, float(ticker["c"][0]), float(ticker["v"][0])))
+        return records, None
+
+    @staticmethod
+    def decode_kucoin_tickers(content: bytes, symbol_ids: dict):
+        records = []
+        data = orjson.loads(content)["data"]
+        for ticker in data["ticker"]:
+            symbol_id = symbol_ids.get(ticker["symbol"])
+            if symbol_id is not None:
+                records.append((symbol_id, ticker["symbol"], float(ticker["last"] or 0), float(ticker["vol"] or 0)))
+        return records, data.get("time")
+
+    @staticmethod
+    def decode_okx_tickers(content: bytes, symbol_ids: dict):
+        records = []
+        server_timestamp = 0
+        for ticker in orjson.loads(content).get("data", []):
+            symbol_id = symbol_ids.get(ticker["instId"])
+            if symbol_id is not None:
+                records.append((symbol_id, ticker["instId"], float(ticker["last"] or 0), float(ticker["vol24h"] or 0)))
+                ticker_timestamp = int(ticker.get("ts") or 0)
+                if ticker_timestamp > server_timestamp:
+                    server_timestamp = ticker_timestamp
+        return records, server_timestamp or None
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+import orjson
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+from benchmarks.suite import build_rules_payload
+from src.data.Exchanges import Exchanges
+from src.services.BinanceIntegrationService import BinanceEndpoints
+from src.services.ByBitIntegrationService import ByBitEndpoints
+from src.services.KrakenIntegrationService import KrakenEndpoints
+from src.services.KuCoinIntegrationService import KuCoinEndpoints
+from src.services.OKXIntegrationService import OKXEndpoints
+
+# Local stand-in for the REST endpoints the integration services poll: tickers, symbol rules and order books of all
+# five exchanges, served from one simulated universe whose prices follow a geometric random walk. Every exchange
+# lists a share of the pairs at its own small price offsets, and a share of its pairs is dislocated by a few percent
+# so the analyzer has opportunities to find. Responses can be delayed by a lognormal latency, fail with 5xx errors
+# or be rate limited with 429 and Retry-After at configurable rates.
+#
+# The services are pointed at the simulator with ArbiSense.set_exchange_base_urls(simulator.get_base_urls()).
+# --run-arbisense starts the analyzer against the simulator for the given number of seconds in a scratch working
+# directory, so no cached rulebook hides the simulated symbols, and reports the analysis pass latency.
+#
+# python -m tools.exchange_simulator --symbols 3000 --port 8080
+# python -m tools.exchange_simulator --symbols 30000 --latency-ms 80 --error-rate 0.01 --run-arbisense 60
+
+ENDPOINTS = {
+    Exchanges.BINANCE.value: (BinanceEndpoints._BASE_URL, BinanceEndpoints._24HR_TICKER_PRICE_CHANGE, BinanceEndpoints._EXCHANGE_INFO, BinanceEndpoints._DEPTH),
+    Exchanges.BYBIT.value: (ByBitEndpoints._BASE_URL, ByBitEndpoints._TICKERS, ByBitEndpoints._INSTRUMENTS_INFO, ByBitEndpoints._ORDER_BOOK),
+    Exchanges.KRAKEN.value: (KrakenEndpoints._BASE_URL, KrakenEndpoints._TICKER, KrakenEndpoints._ASSET_PAIRS, KrakenEndpoints._DEPTH),
+    Exchanges.KUCOIN.value: (KuCoinEndpoints._BASE_URL, KuCoinEndpoints._ALL_TICKERS, KuCoinEndpoints._EXCHANGE_INFO, KuCoinEndpoints._ORDER_BOOK),
+    Exchanges.OKX.value: (OKXEndpoints._BASE_URL, OKXEndpoints._TICKERS, OKXEndpoints._SPOT_INTRSUMENTS_INFO, OKXEndpoints._BOOKS)
+}
+ORDER_BOOK_SYMBOL_PARAMETERS = {
+    Exchanges.BINANCE.value: "symbol",
+    Exchanges.BYBIT.value: "symbol",
+    Exchanges.KRAKEN.value: "pair",
+    Exchanges.KUCOIN.value: "symbol",
+    Exchanges.OKX.value: "instId"
+}
+DASHED_EXCHANGES = [Exchanges.KUCOIN.value, Exchanges.OKX.value]
+QUOTES = ["USDT", "USDT", "USDT", "USDC", "BTC", "ETH", "EUR"]
+REFERENCE_VALUES = {"USDT": 1.0, "USDC": 1.0, "BTC": 100000.0, "ETH": 3000.0, "EUR": 1.08}
+TICKER = "ticker"
+RULES = "rules"
+ORDER_BOOK = "order_book"
+
+class SimulatedMarket:
+
+    # Universe of (base, quote) pairs with reference prices in the quote, moved by a geometric random walk whenever
+    # prices are asked for. Exchanges see the reference prices through fixed per-pair offsets plus a little noise
+    # per request.
+    def __init__(self,
+                    symbol_count: int,
+                    listing_share: float,
+                    volatility: float,
+                    dislocation_share: float,
+                    seed: int):
+        self.random_generator = np.random.default_rng(seed)
+        self.volatility = volatility
+        self.pairs = [("SIM" + str(index), QUOTES[index % len(QUOTES)]) for index in range(symbol_count)]
+        self.pairs += [(quote, "USDT") for quote in REFERENCE_VALUES if quote != "USDT"]
+        usd_values = np.exp(self.random_generator.uniform(math.log(0.0001), math.log(5000), len(self.pairs)))
+        for index, (base, quote) in enumerate(self.pairs):
+            if base in REFERENCE_VALUES:
+                usd_values[index] = REFERENCE_VALUES[base]
+        self.quote_usd_values = np.array([REFERENCE_VALUES[quote] for base, quote in self.pairs])
+        self.log_prices = np.log(usd_values / self.quote_usd_values)
+        self.usd_volumes = np.exp(self.random_generator.uniform(math.log(1e4), math.log(1e8), len(self.pairs)))
+        self.last_move_time = time.monotonic()
+        self.market_lock = threading.Lock()
+
+        # Per exchange: listed pair indices, their native symbols and fixed log price offsets
+        self.listings = {}
+        conversion_indices = np.arange(symbol_count, len(self.pairs))
+        for exchange in ENDPOINTS:
+            listed_mask = self.random_generator.random(symbol_count) < listing_share
+            indices = np.concatenate((np.flatnonzero(listed_mask), conversion_indices))
+            offsets = self.random_generator.normal(0, 0.001, len(indices))
+            dislocated_mask = self.random_generator.random(len(indices)) < dislocation_share
+            offsets[dislocated_mask] += self.random_generator.choice([-1, 1], dislocated_mask.sum()) * self.random_generator.uniform(0.02, 0.05, dislocated_mask.sum())
+            separator = "-" if exchange in DASHED_EXCHANGES else ""
+            symbols = [self.pairs[index][0] + separator + self.pairs[index][1] for index in indices.tolist()]
+            self.listings[exchange] = (indices, symbols, offsets, {symbol: position for position, symbol in enumerate(symbols)})
+        return
+
+    def get_listed_pairs(self, exchange: str):
+        return [self.pairs[index] for index in self.listings[exchange][0].tolist()]
+
+    def get_prices(self, exchange: str):
+        # (symbols, prices, base volumes) of the exchange's listed pairs at the current time
+        self.market_lock.acquire()
+        current_time = time.monotonic()
+        elapsed_time = current_time - self.last_move_time
+        if elapsed_time > 0:
+            self.log_prices = self.log_prices + self.random_generator.normal(0, self.volatility * math.sqrt(elapsed_time), len(self.log_prices))
+            self.last_move_time = current_time
+        log_prices = self.log_prices
+        noise = self.random_generator.normal(0, 0.0001, len(self.listings[exchange][0]))
+        self.market_lock.release()
+        indices, symbols, offsets, positions = self.listings[exchange]
+        prices = np.exp(log_prices[indices] + offsets + noise)
+        return symbols, prices, self.usd_volumes[indices] / (np.exp(log_prices[indices]) * self.quote_usd_values[indices])
+
+    def get_price(self, exchange: str, symbol: str):
+        symbols, prices, volumes = self.get_prices(exchange)
+        position = self.listings[exchange][3].get(symbol)
+        return None if position is None else float(prices[position])
+
+class SimulatedEndpointHandler(RequestHandler):
+
+    def initialize(self, simulator, exchange: str, kind: str):
+        self.simulator = simulator
+        self.exchange = exchange
+        self.kind = kind
+        return
+
+    async def get(self):
+        await self._respond()
+        return
+
+    async def post(self):
+        await self._respond()
+        return
+
+    async def _respond(self):
+        simulator = self.simulator
+        latency = simulator.sample_latency()
+        if latency > 0:
+            await asyncio.sleep(latency)
+        simulator.count_request(self.exchange, self.kind)
+        fault = simulator.sample_fault()
+        if fault == 429:
+            self.set_status(429)
+            self.set_header("Retry-After", str(simulator.retry_after_in_seconds))
+            self.finish(b'{"msg": "Too many requests"}')
+            return
+        if fault is not None:
+            self.set_status(fault)
+            self.finish(b'{"msg": "Simulated server error"}')
+            return
+        if self.kind == TICKER:
+            content = simulator.build_ticker_payload(self.exchange)
+        elif self.kind == RULES:
+            content = simulator.get_rules_payload(self.exchange)
+        else:
+            content = simulator.build_order_book_payload(self.exchange, self.get_argument(ORDER_BOOK_SYMBOL_PARAMETERS[self.exchange], ""))
+        self.set_header("Content-Type", "application/json")
+        self.finish(content)
+        return
+
+class ExchangeSimulator:
+
+    DEFAULT_SYMBOL_COUNT = 3000
+    DEFAULT_LISTING_SHARE = 0.8
+    DEFAULT_VOLATILITY = 0.0005
+    DEFAULT_DISLOCATION_SHARE = 0.01
+    DEFAULT_RETRY_AFTER_IN_SECONDS = 1
+
+    def __init__(self,
+                    port: int = 0,
+                    symbol_count: int = DEFAULT_SYMBOL_COUNT,
+                    listing_share: float = DEFAULT_LISTING_SHARE,
+                    volatility: float = DEFAULT_VOLATILITY,
+                    dislocation_share: float = DEFAULT_DISLOCATION_SHARE,
+                    latency_in_ms: float = 0,
+                    latency_sigma: float = 0.5,
+                    error_rate: float = 0,
+                    rate_limit_rate: float = 0,
+                    retry_after_in_seconds: int = DEFAULT_RETRY_AFTER_IN_SECONDS,
+                    seed: int = 7):
+        self.port = port
+        self.market = SimulatedMarket(symbol_count, listing_share, volatility, dislocation_share, seed)
+        # Lognormal latency with the given median, sigma 0 makes it constant
+        self.latency_in_ms = latency_in_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_in_seconds = retry_after_in_seconds
+        self.random_generator = random.Random(seed)
+        self.rules_payloads = {exchange: build_rules_payload(exchange, self.market.get_listed_pairs(exchange)) for exchange in ENDPOINTS}
+        self.request_counts = {}
+
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started_event = threading.Event()
+        return
+
+    def get_base_urls(self):
+        # The base URL of every exchange service, the live base URL's path served under /<exchange>
+        return {exchange: f"http://127.0.0.1:{self.port}/{exchange.lower()}{urlparse(endpoints[0]).path}" for exchange, endpoints in ENDPOINTS.items()}
+
+    def get_request_counts(self):
+        return dict(self.request_counts)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run_event_loop, daemon=True)
+        self.thread.start()
+        self.started_event.wait()
+        return self.get_base_urls()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+        return
+
+    def sample_latency(self):
+        if self.latency_in_ms <= 0:
+            return 0
+        return self.latency_in_ms * math.exp(self.random_generator.gauss(0, self.latency_sigma)) / 1000
+
+    def sample_fault(self):
+        # None, 429 or a 5xx status
+        draw = self.random_generator.random()
+        if draw < self.rate_limit_rate:
+            return 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            return self.random_generator.choice([500, 502, 503])
+        return None
+
+    def count_request(self, exchange: str, kind: str):
+        key = (exchange, kind)
+        self.request_counts[key] = self.request_counts.get(key, 0) + 1
+        return
+
+    def get_rules_payload(self, exchange: str):
+        return self.rules_payloads[exchange]
+
+    def build_ticker_payload(self, exchange: str):
+        symbols, prices, volumes = self.market.get_prices(exchange)
+        rows = zip(symbols, prices.tolist(), volumes.tolist())
+        server_time = int(time.time() * 1000)
+        if exchange == Exchanges.BINANCE.value:
+            payload = [{"symbol": symbol, "lastPrice": f"{price:.10g}", "volume": f"{volume:.8g}", "quoteVolume": f"{price * volume:.8g}", "closeTime": server_time, "count": 1000} for symbol, price, volume in rows]
+        elif exchange == Exchanges.BYBIT.value:
+            payload = {"retCode": 0, "retMsg": "OK", "result": {"category": "spot", "list": [{"symbol": symbol, "lastPrice": f"{price:.10g}", "volume24h": f"{volume:.8g}", "turnover24h": f"{price * volume:.8g}"} for symbol, price, volume in rows]}, "time": server_time}
+        elif exchange == Exchanges.KRAKEN.value:
+            payload = {"error": [], "result": {symbol: {"c": [f"{price:.10g}", "1.0"], "v": [f"{volume:.8g}", f"{volume:.8g}"]} for symbol, price, volume in rows}}
+        elif exchange == Exchanges.KUCOIN.value:
+            payload = {"code": "200000", "data": {"time": server_time, "ticker": [{"symbol": symbol, "last": f"{price:.10g}", "vol": f"{volume:.8g}", "volValue": f"{price * volume:.8g}"} for symbol, price, volume in rows]}}
+        else:
+            payload = {"code": "0", "msg": "", "data": [{"instType": "SPOT", "instId": symbol, "last": f"{price:.10g}", "vol24h": f"{volume:.8g}", "ts": str(server_time)} for symbol, price, volume in rows]}
+        return orjson.dumps(payload)
+
+    def build_order_book_payload(self, exchange: str, symbol: str):
+        price = self.market.get_price(exchange, symbol)
+        if price is None:
+            price = 1.0
+        bids = [[f"{price * (1 - 0.0005 * level):.10g}", f"{self.random_generator.uniform(0.1, 50) / price * 1000:.8g}"] for level in range(1, 21)]
+        asks = [[f"{price * (1 + 0.0005 * level):.10g}", f"{self.random_generator.uniform(0.1, 50) / price * 1000:.8g}"] for level in range(1, 21)]
+        if exchange == Exchanges.BINANCE.value:
+            payload = {"lastUpdateId": 1, "bids": bids, "asks": asks}
+        elif exchange == Exchanges.BYBIT.value:
+            payload = {"retCode": 0, "retMsg": "OK", "result": {"s": symbol, "b": bids, "a": asks}}
+        elif exchange == Exchanges.KRAKEN.value:
+            payload = {"error": [], "result": {symbol: {"bids": [level + [0] for level in bids], "asks": [level + [0] for level in asks]}}}
+        elif exchange == Exchanges.KUCOIN.value:
+            payload = {"code": "200000", "data": {"bids": bids, "asks": asks}}
+        else:
+            payload = {"code": "0", "data": [{"bids": [level + ["0", "1"] for level in bids], "asks": [level + ["0", "1"] for level in asks]}]}
+        return orjson.dumps(payload)
+
+    def _run_event_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        sockets = bind_sockets(self.port, "127.0.0.1")
+        self.port = sockets[0].getsockname()[1]
+        routes = []
+        for exchange, (base_url, ticker_path, rules_path, order_book_path) in ENDPOINTS.items():
+            prefix = "/" + exchange.lower() + urlparse(base_url).path
+            for path, kind in ((ticker_path, TICKER), (rules_path, RULES), (order_book_path, ORDER_BOOK)):
+                routes.append((prefix + path, SimulatedEndpointHandler, {"simulator": self, "exchange": exchange, "kind": kind}))
+        self.server = HTTPServer(Application(routes))
+        self.server.add_sockets(sockets)
+        self.started_event.set()
+        self.loop.run_forever()
+        self.server.stop()
+        self.loop.close()
+        return
+
+def run_arbisense(simulator: ExchangeSimulator, duration_in_seconds: float):
+    # Runs the analyzer in a scratch working directory so the services fetch the simulated rulebooks
+    os.chdir(tempfile.mkdtemp(prefix="exchange_simulator_"))
+    from src.logic.ArbiSense import ArbiSense
+    arbisense = ArbiSense()
+    arbisense.set_exchange_base_urls(simulator.get_base_urls())
+    pass_durations = []
+    analyze = arbisense.analyze
+
+    def timed_analyze(updated_exchanges: list, print_status: bool = True):
+        start_time = time.perf_counter()
+        analyze(updated_exchanges, print_status)
+        pass_durations.append((time.perf_counter() - start_time) * 1000)
+        return
+
+    # The analyzer thread looks analyze up on the instance, so every pass is timed
+    arbisense.analyze = timed_analyze
+    arbisense.start()
+    time.sleep(duration_in_seconds)
+    arbisense.stop()
+
+    snapshot = arbisense.get_arbitrage_snapshot()
+    print(f"{len(pass_durations)} analysis passes in {duration_in_seconds:.0f} s, {arbisense.price_matrix.get_symbol_count()} symbols, {len(snapshot.opportunities)} open opportunities")
+    if len(pass_durations) > 1:
+        sorted_durations = sorted(pass_durations)
+        print(f"analysis pass: median {statistics.median(sorted_durations):.2f} ms  p95 {sorted_durations[int(len(sorted_durations) * 0.95)]:.2f} ms  max {sorted_durations[-1]:.2f} ms")
+    for exchange, state in arbisense.get_exchange_health_states().items():
+        ticker_requests = simulator.get_request_counts().get((exchange, TICKER), 0)
+        print(f"{exchange:<8} {state.value:<9} {ticker_requests / duration_in_seconds:6.2f} ticker requests/s")
+    return
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local simulator of the exchange REST endpoints")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--symbols", type=int, default=ExchangeSimulator.DEFAULT_SYMBOL_COUNT, help="Pairs in the simulated universe")
+    parser.add_argument("--listing-share", type=float, default=ExchangeSimulator.DEFAULT_LISTING_SHARE, help="Share of the pairs every exchange lists")
+    parser.add_argument("--volatility", type=float, default=ExchangeSimulator.DEFAULT_VOLATILITY, help="Price drift per square root of a second")
+    parser.add_argument("--dislocation-share", type=float, default=ExchangeSimulator.DEFAULT_DISLOCATION_SHARE, help="Share of an exchange's pairs priced 2-5%% off")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Median response latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma of the lognormal latency, 0 for a constant latency")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of the requests answered with 500, 502 or 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="Share of the requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=ExchangeSimulator.DEFAULT_RETRY_AFTER_IN_SECONDS)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--run-arbisense", type=float, default=None, metavar="SECONDS", help="Runs the analyzer against the simulator and reports its latency")
+    args = parser.parse_args()
+
+    simulator = ExchangeSimulator(args.port, args.symbols, args.listing_share, args.volatility, args.dislocation_share,
+                                  args.latency_ms, args.latency_sigma, args.error_rate, args.rate_limit_rate, args.retry_after, args.seed)
+    for exchange, base_url in simulator.start().items():
+        print(f"{exchange:<8} {base_url}")
+    try:
+        if args.run_arbisense is not None:
+            run_arbisense(simulator, args.run_arbisense)
+        else:
+            simulator.thread.join()
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
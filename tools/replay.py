@@ -0,0 +1,68 @@
+import argparse
+import time
+from datetime import datetime, timezone
+from src.logic.ArbiSense import ArbiSense
+from src.logic.ReplayEngine import ReplayEngine
+
+# Replays recordings of ArbiSense.enable_response_recording through the integration services and the analyzer on
+# a simulated clock, printing every opportunity event with the recording time it happened at. Symbol rules come
+# from the cached rulebooks in rulebooks/ unless the recording has a symbol rules response.
+#
+# python -m tools.replay session.jsonl.gz
+# python -m tools.replay binance.jsonl.gz okx.jsonl.gz --speed 50 --arbitrage-threshold 0.5 --triangular
+
+def print_opportunity_events(opportunity_events: list, clock_time: float, triangular: bool):
+    timestamp = datetime.fromtimestamp(clock_time, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    for event, opportunity in opportunity_events:
+        if triangular:
+            print(f"{timestamp} {event.value:<8} {opportunity['exchange']} {' -> '.join(opportunity['path'])} {opportunity['net_profit_percentage']:.3f}%")
+        else:
+            print(f"{timestamp} {event.value:<8} {opportunity['symbol']} {opportunity['first_market']} {opportunity['first_market_price']} {opportunity['second_market']} {opportunity['second_market_price']} {opportunity['arbitrage_percentage']:.2f}%")
+    return
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays recorded exchange responses through ArbiSense")
+    parser.add_argument("recording_paths", nargs="+")
+    parser.add_argument("--speed", type=float, default=None, help="Times real speed, as fast as possible when omitted")
+    parser.add_argument("--start-time", type=float, default=None, help="Recording time in epoch seconds to start at")
+    parser.add_argument("--end-time", type=float, default=None, help="Recording time in epoch seconds to stop at")
+    parser.add_argument("--arbitrage-threshold", type=float, default=ArbiSense.DEFAULT_ARBITRAGE_PERCENTAGE_THRESHOLD)
+    parser.add_argument("--volume-threshold", type=float, default=ArbiSense.DEFAULT_VOLUME_THRESHOLD)
+    parser.add_argument("--max-quote-skew", type=float, default=ArbiSense.DEFAULT_MAX_QUOTE_SKEW_IN_SECONDS, help="Seconds the two legs may be quoted apart, 0 or less compares every pair of quotes")
+    parser.add_argument("--triangular", action="store_true", help="Also runs the triangular arbitrage engines")
+    parser.add_argument("--quiet", action="store_true", help="Prints the summary only")
+    args = parser.parse_args()
+
+    arbisense = ArbiSense()
+    arbisense.arbitrage_percentage_threshold = args.arbitrage_threshold
+    arbisense.volume_threshold = args.volume_threshold
+    arbisense.max_quote_skew_in_seconds = args.max_quote_skew if args.max_quote_skew > 0 else None
+    if args.triangular:
+        arbisense.enable_triangular_arbitrage()
+    event_counts = {"cross": 0, "triangular": 0}
+
+    def on_opportunity_events(opportunity_events: list):
+        event_counts["cross"] += len(opportunity_events)
+        if not args.quiet:
+            print_opportunity_events(opportunity_events, arbisense.clock.time(), False)
+        return
+
+    def on_triangular_opportunity_events(opportunity_events: list):
+        event_counts["triangular"] += len(opportunity_events)
+        if not args.quiet:
+            print_opportunity_events(opportunity_events, arbisense.clock.time(), True)
+        return
+
+    arbisense.add_opportunity_listener(on_opportunity_events)
+    arbisense.add_triangular_opportunity_listener(on_triangular_opportunity_events)
+
+    replay_engine = ReplayEngine(arbisense, args.recording_paths, args.speed)
+    start_time = time.perf_counter()
+    record_count = replay_engine.run(args.start_time, args.end_time)
+    replay_time = time.perf_counter() - start_time
+
+    snapshot = arbisense.get_arbitrage_snapshot()
+    print(f"{record_count} records replayed in {replay_time:.2f} s, {replay_engine.get_failed_record_count()} failed")
+    print(f"{event_counts['cross']} cross exchange events, {len(snapshot.opportunities)} open opportunities at the end of the recording")
+    if args.triangular:
+        print(f"{event_counts['triangular']} triangular events, {len(arbisense.get_triangular_opportunities())} open opportunities at the end of the recording")
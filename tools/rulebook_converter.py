@@ -0,0 +1,64 @@
+import argparse
+import time
+import traceback
+from src.data.Exchanges import Exchanges
+from src.services.BinanceIntegrationService import BinanceIntegrationService
+from src.services.ByBitIntegrationService import ByBitIntegrationService
+from src.services.KrakenIntegrationService import KrakenIntegrationService
+from src.services.KuCoinIntegrationService import KuCoinIntegrationService
+from src.services.OKXIntegrationService import OKXIntegrationService
+from src.services.SymbolRegistryService import SingletonSymbolRegistry
+from src.utils.fileutils import FileUtils
+from src.utils.rulebookformat import RulebookFormat
+
+# Converts the JSON rulebooks in rulebooks/ into the binary rulebook format, parsing them with the
+# same legacy rules parser the integration services' rulebook caches use so both formats load to the same
+# symbol index.
+#
+# python -m tools.rulebook_converter
+# python -m tools.rulebook_converter --exchange KRAKEN --exchange KUCOIN
+
+def create_services():
+    return {
+        Exchanges.BINANCE.value: BinanceIntegrationService(),
+        Exchanges.BYBIT.value: ByBitIntegrationService(),
+        Exchanges.KRAKEN.value: KrakenIntegrationService(),
+        Exchanges.KUCOIN.value: KuCoinIntegrationService(),
+        Exchanges.OKX.value: OKXIntegrationService()
+    }
+
+def convert_rulebook(exchange: str, service):
+    if not FileUtils.path_file(service.legacy_rulebook_path):
+        print(exchange + ": no JSON rulebook at " + service.legacy_rulebook_path)
+        return False
+    legacy_rules_parser = service.rulebook_cache.legacy_rules_parser
+    symbol_index = legacy_rules_parser(FileUtils.read_json_from_file(service.legacy_rulebook_path))
+    SingletonSymbolRegistry.getInstance().register_symbol_rules(exchange, symbol_index)
+    columns = RulebookFormat.build_columns(symbol_index)
+    RulebookFormat.write(service.rulebook_path, columns, RulebookFormat.calculate_content_hash(columns))
+
+    json_load_start_time = time.perf_counter()
+    legacy_rules_parser(FileUtils.read_json_from_file(service.legacy_rulebook_path))
+    json_load_time_in_ms = (time.perf_counter() - json_load_start_time) * 1000
+    binary_load_start_time = time.perf_counter()
+    RulebookFormat.read(service.rulebook_path)
+    binary_load_time_in_ms = (time.perf_counter() - binary_load_start_time) * 1000
+
+    print(f"{exchange}: {len(symbol_index)} symbols, "
+          f"{FileUtils.file_size(service.legacy_rulebook_path)} -> {FileUtils.file_size(service.rulebook_path)} bytes, "
+          f"load {json_load_time_in_ms:.2f} ms -> {binary_load_time_in_ms:.2f} ms")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts the JSON exchange rulebooks into the binary rulebook format")
+    parser.add_argument("--exchange", action="append", choices=[exchange.value for exchange in Exchanges], default=None)
+    args = parser.parse_args()
+
+    services = create_services()
+    for exchange in args.exchange or services.keys():
+        # One unreadable rulebook does not stop the conversion of the others
+        try:
+            convert_rulebook(exchange, services[exchange])
+        except Exception as e:
+            print(exchange + ": conversion failed, " + type(e).__name__ + ": " + str(e))
+            traceback.print_exc()
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import threading
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+
+# Stand-in for the exchange websocket feeds. Every connected client gets the recorded frames
+# replayed in order, which lets the streaming mode of the integration services run offline.
+#
+# Frame files hold one frame per line, either the raw message text or a JSON object of the form
+# {"delay": <seconds before sending>, "message": <str or JSON value>}.
+#
+# python -m tools.websocket_replay_server binance_frames.jsonl --port 9443 --interval 0.5 --loop
+
+class ReplayWebSocketHandler(WebSocketHandler):
+
+    def initialize(self, replay_server):
+        self.replay_server = replay_server
+        self.playback_task = None
+        return
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self, *args):
+        self.replay_server.connection_count += 1
+        if not self.replay_server.wait_for_subscription:
+            self._start_playback()
+        return
+
+    def on_message(self, message):
+        self.replay_server.received_messages.append(message)
+        if self.replay_server.wait_for_subscription and self.playback_task is None:
+            self._start_playback()
+        return
+
+    def on_close(self):
+        if self.playback_task is not None:
+            self.playback_task.cancel()
+        return
+
+    def _start_playback(self):
+        self.playback_task = asyncio.ensure_future(self._play_frames())
+        return
+
+    async def _play_frames(self):
+        sent_frame_count = 0
+        while True:
+            for delay, message in self.replay_server.frames:
+                await asyncio.sleep(delay)
+                try:
+                    await self.write_message(message)
+                except WebSocketClosedError:
+                    return
+                sent_frame_count += 1
+                if self.replay_server.drop_after_frames is not None and sent_frame_count >= self.replay_server.drop_after_frames:
+                    # Simulates an exchange dropping the connection so clients have to reconnect and resubscribe
+                    self.close()
+                    return
+            if not self.replay_server.loop_frames:
+                return
+
+class WebSocketReplayServer:
+
+    DEFAULT_INTERVAL_IN_SECONDS = 0.1
+
+    def __init__(self,
+                    frames: list,
+                    port: int = 0,
+                    interval_in_seconds: float = DEFAULT_INTERVAL_IN_SECONDS,
+                    wait_for_subscription: bool = True,
+                    drop_after_frames: int = None,
+                    loop_frames: bool = False):
+        self.frames = [self._normalize_frame(frame, interval_in_seconds) for frame in frames]
+        self.port = port
+        self.wait_for_subscription = wait_for_subscription
+        self.drop_after_frames = drop_after_frames
+        self.loop_frames = loop_frames
+
+        self.received_messages = []
+        self.connection_count = 0
+
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started_event = threading.Event()
+        return
+
+    @staticmethod
+    def load_frames(file_path: str):
+        frames = []
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                try:
+                    frame = json.loads(line)
+                except ValueError:
+                    frame = line
+                if not (isinstance(frame, dict) and "message" in frame):
+                    frame = line
+                frames.append(frame)
+        return frames
+
+    def get_url(self):
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run_event_loop, daemon=True)
+        self.thread.start()
+        self.started_event.wait()
+        return self.get_url()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+        return
+
+    def _run_event_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        sockets = bind_sockets(self.port, "127.0.0.1")
+        self.port = sockets[0].getsockname()[1]
+        application = Application([(r"/.*", ReplayWebSocketHandler, {"replay_server": self})])
+        self.server = HTTPServer(application)
+        self.server.add_sockets(sockets)
+        self.started_event.set()
+        self.loop.run_forever()
+        self.server.stop()
+        self.loop.close()
+        return
+
+    def _normalize_frame(self, frame, interval_in_seconds: float):
+        if isinstance(frame, dict) and "message" in frame:
+            message = frame["message"]
+            delay = frame.get("delay", interval_in_seconds)
+        else:
+            message = frame
+            delay = interval_in_seconds
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        return (delay, message)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays recorded exchange websocket frames to any connected client")
+    parser.add_argument("frames_file")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=WebSocketReplayServer.DEFAULT_INTERVAL_IN_SECONDS)
+    parser.add_argument("--no-wait-for-subscription", action="store_true")
+    parser.add_argument("--drop-after", type=int, default=None)
+    parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args()
+
+    replay_server = WebSocketReplayServer(WebSocketReplayServer.load_frames(args.frames_file),
+                                          port=args.port,
+                                          interval_in_seconds=args.interval,
+                                          wait_for_subscription=not args.no_wait_for_subscription,
+                                          drop_after_frames=args.drop_after,
+                                          loop_frames=args.loop)
+    print("Replaying " + str(len(replay_server.frames)) + " frames on " + replay_server.start())
+    try:
+        replay_server.thread.join()
+    except KeyboardInterrupt:
+        replay_server.stop()